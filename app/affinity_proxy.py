@@ -0,0 +1,162 @@
+# app/affinity_proxy.py
+"""
+Multi-worker deployment with call affinity.
+
+    python -m app.affinity_proxy --workers 4 --port 8000
+
+Starts N uvicorn processes of app.main:app on 127.0.0.1 (ports --base-port .. --base-port+N-1), each with
+WORKER_INDEX / WORKER_COUNT set and the shared SQLite session store enabled, and listens on --port itself.
+Requests that name a call (/respond/{call_id}, /respond-audio/{call_id}, /conversation/{call_id}, the voice
+WebSocket) are forwarded to the worker that started the call, where its KV-cache lives; /start-call and
+everything else is spread round-robin. Routing is per connection, by its first request line: later requests
+on a keep-alive connection stay on that worker even when they name another call, and a call whose worker
+is down is served by the next one. Such a worker loads the call from the shared store, without the KV-cache
+locality, and turns of one call that reach different workers are run one at a time through the call's turn
+lease in the store (SESSION_TURN_LEASE_SECONDS).
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import re
+import signal
+import subprocess
+import sys
+from typing import List, Optional, Tuple
+
+from app.core.call_affinity import worker_for_call_id
+from app.core.config import logger
+
+CALL_ID_REQUEST_RE = re.compile(
+    rb"^[A-Z]+ /api/v1/sales/(?:respond|respond-audio|conversation|ws/voice-chat)/([^/?\s]+)"
+)
+_MAX_REQUEST_LINE = 8192
+_PIPE_CHUNK = 64 * 1024
+
+
+class AffinityProxy:
+    """TCP proxy that picks a backend from the HTTP request line and then relays bytes both ways."""
+    def __init__(self, backends: List[Tuple[str, int]]):
+        self.backends = backends
+        self._round_robin = itertools.cycle(range(len(backends)))
+        self.routed_by_call = 0
+        self.routed_round_robin = 0
+        self.failovers = 0
+
+    def pick_backend(self, request_line: bytes) -> int:
+        match = CALL_ID_REQUEST_RE.match(request_line)
+        if match:
+            self.routed_by_call += 1
+            return worker_for_call_id(match.group(1).decode("utf-8", "replace"), len(self.backends))
+        self.routed_round_robin += 1
+        return next(self._round_robin)
+
+    async def _open_backend(self, preferred: int) -> Optional[Tuple[asyncio.StreamReader, asyncio.StreamWriter]]:
+        for offset in range(len(self.backends)):
+            host, port = self.backends[(preferred + offset) % len(self.backends)]
+            try:
+                connection = await asyncio.open_connection(host, port)
+            except OSError as e:
+                logger.warning(f"Affinity proxy: worker at {host}:{port} unreachable ({e}); trying the next one.")
+                continue
+            if offset:
+                self.failovers += 1
+            return connection
+        return None
+
+    @staticmethod
+    async def _pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                data = await reader.read(_PIPE_CHUNK)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            try:
+                writer.close()
+            except Exception:
+                pass
+
+    async def handle_client(self, client_reader: asyncio.StreamReader, client_writer: asyncio.StreamWriter):
+        try:
+            request_line = await client_reader.readuntil(b"\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            client_writer.close()
+            return
+        backend = await self._open_backend(self.pick_backend(request_line))
+        if backend is None:
+            client_writer.write(b"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            await client_writer.drain()
+            client_writer.close()
+            return
+        backend_reader, backend_writer = backend
+        backend_writer.write(request_line)
+        await asyncio.gather(
+            self._pipe(client_reader, backend_writer),
+            self._pipe(backend_reader, client_writer),
+        )
+
+    async def serve(self, host: str, port: int):
+        server = await asyncio.start_server(self.handle_client, host, port, limit=_MAX_REQUEST_LINE)
+        logger.info(f"Affinity proxy listening on {host}:{port} for {len(self.backends)} worker(s).")
+        async with server:
+            await server.serve_forever()
+
+
+def start_workers(num_workers: int, base_port: int, extra_uvicorn_args: List[str]) -> List[subprocess.Popen]:
+    processes = []
+    for index in range(num_workers):
+        env = dict(os.environ)
+        env.update({
+            "WORKER_INDEX": str(index),
+            "WORKER_COUNT": str(num_workers),
+            "SESSION_STORE_BACKEND": "sqlite",
+            "SESSION_SHARED": "true",
+        })
+        command = [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--host", "127.0.0.1", "--port", str(base_port + index), *extra_uvicorn_args,
+        ]
+        processes.append(subprocess.Popen(command, env=env))
+        logger.info(f"Started API worker {index} on 127.0.0.1:{base_port + index} (pid {processes[-1].pid}).")
+    return processes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run several API workers behind a call-affinity proxy.")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--base-port", type=int, default=None, help="First worker port (default: --port + 1)")
+    parser.add_argument("--no-spawn", action="store_true", help="Only run the proxy; workers are started elsewhere")
+    args, extra_uvicorn_args = parser.parse_known_args()
+
+    base_port = args.base_port or args.port + 1
+    backends = [("127.0.0.1", base_port + i) for i in range(args.workers)]
+    processes = [] if args.no_spawn else start_workers(args.workers, base_port, extra_uvicorn_args)
+
+    def stop_workers(*_):
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        asyncio.run(AffinityProxy(backends).serve(args.host, args.port))
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        stop_workers()
+
+
+if __name__ == "__main__":
+    main()
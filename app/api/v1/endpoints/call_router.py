@@ -3,6 +3,7 @@ from fastapi import (
     WebSocket, WebSocketDisconnect, WebSocketException
 )
 from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from starlette.websockets import WebSocketState # For checking state if needed
 
 from app.models.call_models import (
@@ -11,17 +12,105 @@ from app.models.call_models import (
     ConversationHistoryResponse
 )
 from app.core.conversation_manager import ConversationManager, get_conversation_manager
+from app.core.admission import AdmissionRejected, get_admission_controller
+from app.core.tracing import get_tracer
+from app.core.metrics import (
+    HANDLER_SECONDS, WS_SEND_SECONDS, WS_TURN_SECONDS, THREADPOOL_WAIT_SECONDS, WEBSOCKET_CONNECTIONS, timed_call,
+)
 from app.services.stt_service import STTService, get_stt_service
 from app.services.tts_service import TTSService, get_tts_service
-from app.core.config import logger
+from app.services.speech_pipeline import synthesize_sentences_as_generated
+from app.services.streaming_stt import StreamingTranscriber
+from app.services.greeting_cache import get_greeting_cache
+from app.services.audio_utils import wav_duration_seconds
+from app.core.config import settings, logger
+from app.prompts.sales_prompts import REPROMPT_MESSAGE, BUSY_MESSAGE
 from app.schemas.conversation import CallSession
-from typing import Optional
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, AsyncIterator, TypeVar
+from contextlib import AsyncExitStack, contextmanager
 import asyncio
+import functools
+import json
+import time
 
 router = APIRouter()
 
+_Handler = TypeVar("_Handler", bound=Callable[..., Awaitable[Any]])
+
+def _timed_handler(name: str) -> Callable[[_Handler], _Handler]:
+    """Observes the handler's latency in http_handler_seconds{handler=name}. FastAPI still sees the original signature."""
+    histogram = HANDLER_SECONDS.labels(name)
+    def decorate(handler: _Handler) -> _Handler:
+        @functools.wraps(handler)
+        async def timed(*args: Any, **kwargs: Any) -> Any:
+            with histogram.time():
+                return await handler(*args, **kwargs)
+        return timed # type: ignore[return-value]
+    return decorate
+
+async def _send_json(websocket: WebSocket, payload: Dict[str, Any]):
+    with WS_SEND_SECONDS.labels("json").time():
+        await websocket.send_json(payload)
+
+async def _send_bytes(websocket: WebSocket, data: bytes):
+    with WS_SEND_SECONDS.labels("audio").time():
+        await websocket.send_bytes(data)
+
+async def _transcribe_in_threadpool(stt: STTService, audio_bytes: bytes) -> Optional[str]:
+    return await run_in_threadpool(timed_call(THREADPOOL_WAIT_SECONDS.labels("anyio"), stt.transcribe_audio), audio_bytes)
+
+async def _transcribe_upload(stt: STTService, audio_bytes: bytes) -> Optional[str]:
+    """Transcribes a complete recorded utterance through the STT admission stage, traced as the turn's STT stage."""
+    with get_tracer().span("stt.transcribe", audio_bytes=len(audio_bytes)) as stt_span:
+        if stt_span.recording:
+            stt_span.set(audio_s=wav_duration_seconds(audio_bytes))
+        async with get_admission_controller().stage("stt").admit():
+            return await _transcribe_in_threadpool(stt, audio_bytes)
+
+@contextmanager
+def _streamed_turn_trace(call_id: str, transcriber: StreamingTranscriber) -> Iterator[Any]:
+    """Turn span of a VAD-streamed utterance. It starts at the end of speech; finishing the transcription is its first stage."""
+    tracer = get_tracer()
+    with tracer.turn("ws.turn", start_ns=transcriber.last_turn_end_ns, call_id=call_id, input="pcm_stream") as turn_span:
+        tracer.start_span(
+            "stt.finalize", start_ns=transcriber.last_turn_end_ns, audio_s=round(transcriber.last_turn_audio_s, 3)
+        ).end(transcriber.last_turn_transcribed_ns)
+        yield turn_span
+
+async def _admit_turn(call_id: str) -> AsyncExitStack:
+    """
+    Admits one LLM turn of a call (per-call cap, then an LLM stage slot). Raises AdmissionRejected, which
+    the app turns into 503/429 + Retry-After; the caller closes the returned stack when the turn is done.
+    """
+    admission = get_admission_controller()
+    stack = AsyncExitStack()
+    try:
+        with get_tracer().span("admission.wait", stage="llm"):
+            await stack.enter_async_context(admission.call_turn(call_id))
+            await stack.enter_async_context(admission.stage("llm").admit())
+    except BaseException:
+        await stack.aclose()
+        raise
+    return stack
+
+class _AdmittedStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse holding a turn admission from _admit_turn. The admission is released however the
+    response ends, including a client that disconnects before the body generator ever runs.
+    """
+    def __init__(self, content: AsyncIterator[str], turn_admission: AsyncExitStack, **kwargs: Any):
+        super().__init__(content, **kwargs)
+        self.turn_admission = turn_admission
+
+    async def __call__(self, scope: Any, receive: Any, send: Any) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.turn_admission.aclose() # No-op if the stream already released it
+
 # --- HTTP Endpoints (remain the same as your last correct version) ---
 @router.post("/start-call", response_model=StartCallResponse, status_code=status.HTTP_201_CREATED)
+@_timed_handler("start_call")
 async def start_call(
     request: StartCallRequest,
     manager: ConversationManager = Depends(get_conversation_manager),
@@ -33,14 +122,17 @@ async def start_call(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="The AI Sales Agent is currently unavailable due to an LLM service issue. Please try again later."
         )
-    call_id, first_message = await run_in_threadpool(
-        manager.start_new_call,
-        customer_name=request.customer_name,
-        phone_number=request.phone_number
-    )
+    admission = get_admission_controller()
+    admission.check_new_call()
+    if settings.GREETING_MODE == "template":
+        call_id, first_message = await manager.astart_new_call(request.customer_name, request.phone_number)
+    else:
+        async with admission.stage("llm").admit(): # The greeting is generated by the LLM
+            call_id, first_message = await manager.astart_new_call(request.customer_name, request.phone_number)
     return StartCallResponse(call_id=call_id, first_message=first_message)
 
 @router.post("/respond/{call_id}", response_model=RespondResponse)
+@_timed_handler("respond")
 async def respond_to_call(
     call_id: str,
     request: RespondRequest,
@@ -56,14 +148,56 @@ async def respond_to_call(
     customer_text = request.message
     if not customer_text:
          raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Message cannot be empty.")
-    reply_text, should_end_call = await run_in_threadpool(
-        manager.process_customer_response, call_id, customer_text
-    )
+    async with await _admit_turn(call_id):
+        reply_text, should_end_call = await manager.aprocess_customer_response(call_id, customer_text)
     if reply_text is None: 
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Call ID not found or call has ended.")
     return RespondResponse(reply=reply_text, should_end_call=should_end_call)
 
+@router.post("/respond/{call_id}/stream")
+async def respond_to_call_stream(
+    call_id: str,
+    request: RespondRequest,
+    manager: ConversationManager = Depends(get_conversation_manager),
+):
+    """Server-Sent Events variant of /respond: 'delta' events carry reply text as it is generated, then one 'done' event."""
+    started = time.perf_counter() # Observed when the stream ends, so the latency covers the whole reply
+    logger.info(f"Received /respond/stream request for call_id: {call_id}")
+    if not manager.llm_service or not manager.llm_service.is_ready():
+        logger.error("LLM Service not available or not initialized. Cannot respond to call.")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The AI Sales Agent is currently unavailable due to an LLM service issue."
+        )
+    customer_text = request.message
+    if not customer_text:
+         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Message cannot be empty.")
+    session = await manager.aget_conversation_history(call_id)
+    if not session or not session.is_active:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Call ID not found or call has ended.")
+
+    turn_admission = await _admit_turn(call_id) # Rejected before the stream starts, so the client sees 503/429
+
+    async def event_stream() -> AsyncIterator[str]:
+        try:
+            async with turn_admission: # Released before the 'done' event; the response releases it otherwise
+                reply_parts = []
+                async for delta in manager.astream_customer_response(call_id, customer_text):
+                    reply_parts.append(delta)
+                    yield f"event: delta\ndata: {json.dumps({'text': delta})}\n\n"
+            session_now = await manager.aget_conversation_history(call_id)
+            done = RespondResponse(reply="".join(reply_parts).strip(), should_end_call=not session_now or not session_now.is_active)
+            yield f"event: done\ndata: {done.model_dump_json()}\n\n"
+        finally:
+            HANDLER_SECONDS.labels("respond_stream").observe(time.perf_counter() - started)
+
+    return _AdmittedStreamingResponse(
+        event_stream(), turn_admission, media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.post("/respond-audio/{call_id}", response_model=RespondResponse)
+@_timed_handler("respond_audio")
 async def respond_to_call_audio(
     call_id: str,
     audio_file: UploadFile = File(...),
@@ -71,7 +205,7 @@ async def respond_to_call_audio(
     stt: STTService = Depends(get_stt_service)
 ):
     logger.info(f"Received /respond-audio request for call_id: {call_id}, audio_file: {audio_file.filename}")
-    if not stt or not stt.model: # type: ignore
+    if not stt or not stt.is_ready(): # type: ignore
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="STT service unavailable.")
     if not manager.llm_service or not manager.llm_service.is_ready():
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="LLM service unavailable.")
@@ -82,24 +216,27 @@ async def respond_to_call_audio(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Could not read audio: {e}")
     finally: await audio_file.close()
 
-    customer_text = await run_in_threadpool(stt.transcribe_audio, audio_bytes) # type: ignore
-    if customer_text is None or "Error:" in customer_text:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"STT failed: {customer_text or 'Unknown'}")
-    stripped_customer_text = customer_text.strip()
-    if not stripped_customer_text:
-         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empty transcription.")
-    reply_text, should_end_call = await run_in_threadpool(manager.process_customer_response, call_id, stripped_customer_text)
+    with get_tracer().turn("respond_audio.turn", call_id=call_id, input="upload"):
+        customer_text = await _transcribe_upload(stt, audio_bytes) # type: ignore
+        if customer_text is None or "Error:" in customer_text:
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"STT failed: {customer_text or 'Unknown'}")
+        stripped_customer_text = customer_text.strip()
+        if not stripped_customer_text:
+             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empty transcription.")
+        async with await _admit_turn(call_id):
+            reply_text, should_end_call = await manager.aprocess_customer_response(call_id, stripped_customer_text)
     if reply_text is None: 
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Call ID not found or ended.")
     return RespondResponse(reply=reply_text, should_end_call=should_end_call)
 
 @router.get("/conversation/{call_id}", response_model=ConversationHistoryResponse)
+@_timed_handler("conversation")
 async def get_conversation(
     call_id: str,
     manager: ConversationManager = Depends(get_conversation_manager)
 ):
     logger.info(f"Received /conversation request for call_id: {call_id}")
-    session_data = await run_in_threadpool(manager.get_conversation_history, call_id)
+    session_data = await manager.aget_conversation_history(call_id)
     if not session_data:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found.")
     return ConversationHistoryResponse(
@@ -110,6 +247,81 @@ async def get_conversation(
     )
 
 # --- WebSocket Endpoint ---
+async def _handle_customer_turn(
+    websocket: WebSocket,
+    manager: ConversationManager,
+    tts_service: TTSService,
+    call_id: str,
+    customer_text: Optional[str],
+) -> bool:
+    """Answers one finished customer utterance over the socket. Returns True if the call has ended."""
+    with WS_TURN_SECONDS.time():
+        call_ended = await _answer_customer_turn(websocket, manager, tts_service, call_id, customer_text)
+    # Marks the end of the turn's messages, so clients (and the load generator) know the reply is complete.
+    await _send_json(websocket, {"type": "agent_turn_end", "call_ended": call_ended})
+    return call_ended
+
+async def _answer_customer_turn(
+    websocket: WebSocket,
+    manager: ConversationManager,
+    tts_service: TTSService,
+    call_id: str,
+    customer_text: Optional[str],
+) -> bool:
+    if customer_text is None or "Error:" in customer_text: # Broad error check
+        logger.error(f"WS: STT failed for {call_id}: {customer_text}")
+        await _send_json(websocket, {"type": "error", "message": f"STT failed: {customer_text or 'Unknown STT error'}"})
+        return False
+
+    customer_text = customer_text.strip()
+    # Send transcript back to client immediately for display
+    await _send_json(websocket, {"type": "user_text", "text": customer_text})
+    logger.info(f"WS: User ({call_id}) said: '{customer_text}'")
+
+    if not customer_text: # If transcription is empty after STT and stripping
+        logger.info(f"WS: Empty transcription for {call_id}.")
+        empty_response_text = REPROMPT_MESSAGE
+        empty_response_audio = await tts_service.asynthesize_to_wav_bytes(empty_response_text)
+        if empty_response_audio: await _send_bytes(websocket, empty_response_audio)
+        else: await _send_json(websocket, {"type": "agent_text", "text": empty_response_text})
+        return False
+
+    try:
+        turn_admission = await _admit_turn(call_id)
+    except AdmissionRejected as e:
+        # Overloaded: ask the caller to repeat (cached audio, no TTS work) rather than keep them waiting.
+        logger.warning(f"WS: Turn for {call_id} shed ({e.stage}: {e.reason}).")
+        await _send_json(websocket, {"type": "busy", "message": BUSY_MESSAGE, "retry_after": e.retry_after_s})
+        busy_audio = await tts_service.asynthesize_to_wav_bytes(BUSY_MESSAGE)
+        if busy_audio: await _send_bytes(websocket, busy_audio)
+        return False
+
+    # Stream the reply text as it is generated and speak each sentence as soon as it is complete.
+    reply_parts = []
+    async def forward_text_delta(delta: str):
+        reply_parts.append(delta)
+        await _send_json(websocket, {"type": "agent_text_delta", "text": delta})
+
+    async with turn_admission:
+        async for sentence, sentence_audio in synthesize_sentences_as_generated(
+            manager.astream_customer_response(call_id, customer_text),
+            tts_service, on_text_delta=forward_text_delta,
+        ):
+            if sentence_audio:
+                await _send_bytes(websocket, sentence_audio)
+            else:
+                logger.error(f"WS: TTS failed for a sentence on {call_id}. Sending text instead.")
+                await _send_json(websocket, {"type": "agent_text", "text": sentence})
+    agent_reply_text = "".join(reply_parts).strip()
+    call_session_now = await manager.aget_conversation_history(call_id)
+    should_end_call = not call_session_now or not call_session_now.is_active
+    logger.info(f"WS: Agent ({call_id}) replied: '{agent_reply_text}'")
+
+    if should_end_call:
+        logger.info(f"WS: Call for {call_id} ended by agent logic.")
+        await _send_json(websocket, {"type": "system", "message": "Call ended by agent."})
+    return should_end_call
+
 @router.websocket("/ws/voice-chat/{call_id}")
 async def websocket_voice_chat_endpoint(
     websocket: WebSocket,
@@ -123,31 +335,46 @@ async def websocket_voice_chat_endpoint(
     tts_service = get_tts_service()
 
     if not all([manager, stt_service, tts_service, 
-                stt_service.model, tts_service.engine, # type: ignore
+                stt_service.is_ready(), tts_service.is_ready(), # type: ignore
                 manager.llm_service, manager.llm_service.is_ready()]): # type: ignore
         error_msg = "A required backend service is unavailable."
         logger.error(f"WS Error for {call_id}: {error_msg}")
-        await websocket.send_json({"type": "error", "message": error_msg})
+        await _send_json(websocket, {"type": "error", "message": error_msg})
         await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
         return
 
-    call_session_initial = await run_in_threadpool(manager.get_conversation_history, call_id)
+    call_session_initial = await manager.aget_conversation_history(call_id)
     if not call_session_initial:
         error_msg = f"Invalid call_id '{call_id}'. Start call via HTTP POST /start-call."
         logger.error(f"WS Error for {call_id}: {error_msg}")
-        await websocket.send_json({"type": "error", "message": error_msg})
+        await _send_json(websocket, {"type": "error", "message": error_msg})
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return
 
+    streaming_transcriber: Optional[StreamingTranscriber] = None
+    WEBSOCKET_CONNECTIONS.inc()
     try:
         if call_session_initial.history and call_session_initial.history[0].speaker == "agent":
             initial_agent_text = call_session_initial.history[0].text
             logger.info(f"WS: Sending initial agent message for {call_id}: {initial_agent_text}")
-            agent_audio_bytes = await run_in_threadpool(tts_service.synthesize_to_wav_bytes, initial_agent_text) # type: ignore
+            agent_audio_bytes = None
+            if call_session_initial.greeting_template_index is not None and settings.GREETING_AUDIO_NAME_SLOT:
+                # Cached template audio around the name slot plus the (cached) name itself.
+                agent_audio_bytes = await get_greeting_cache().asynthesize_greeting(
+                    call_session_initial.greeting_template_index, call_session_initial.customer_name, # type: ignore
+                    initial_agent_text, tts_service, # type: ignore
+                )
+            if not agent_audio_bytes:
+                agent_audio_bytes = await tts_service.asynthesize_to_wav_bytes(initial_agent_text) # type: ignore
             if agent_audio_bytes:
-                await websocket.send_bytes(agent_audio_bytes)
+                await _send_bytes(websocket, agent_audio_bytes)
             else:
-                await websocket.send_json({"type": "agent_text", "text": initial_agent_text})
+                await _send_json(websocket, {"type": "agent_text", "text": initial_agent_text})
+
+        async def send_partial_transcript(text: str):
+            await _send_json(websocket, {"type": "user_text_partial", "text": text})
+
+        streaming_transcriber = StreamingTranscriber(stt_service, on_partial=send_partial_transcript) # type: ignore
 
         while True:
             # Explicitly try to receive bytes first, then text as a fallback for control messages
@@ -173,8 +400,16 @@ async def websocket_voice_chat_endpoint(
                 # For now, just log it if it's not a known command like "END_CONNECTION"
                 if client_text_command.upper() == "END_CONNECTION_REQUEST_BY_CLIENT": # Example command
                     logger.info(f"WS: Client for {call_id} explicitly requested to end connection via text.")
-                    await websocket.send_json({"type": "system", "message": "Connection termination acknowledged."})
+                    await _send_json(websocket, {"type": "system", "message": "Connection termination acknowledged."})
                     break 
+                if client_text_command.upper() == "END_OF_TURN":
+                    # Client-side end-of-speech signal (push-to-talk): finalize whatever has been streamed.
+                    customer_text = await streaming_transcriber.finish_turn()
+                    with _streamed_turn_trace(call_id, streaming_transcriber):
+                        call_ended = await _handle_customer_turn(websocket, manager, tts_service, call_id, customer_text) # type: ignore
+                    if call_ended:
+                        break
+                    continue
                 logger.info(f"WS: Received text from client for {call_id}: {client_text_command}")
                 # If text is not a command, we might ignore it or treat it as an error in a voice-only flow
                 continue # For now, only process bytes for audio
@@ -183,55 +418,25 @@ async def websocket_voice_chat_endpoint(
                 logger.warning(f"WS: Received message_data without bytes or text for {call_id}")
                 continue
 
-            if not audio_bytes_from_client:
-                logger.info(f"WS: Received empty audio payload from client for {call_id}.")
-                # Optionally, send a "didn't hear you" message back
-                # For now, let STT handle empty bytes (it should produce empty text)
-                # continue # Or proceed to STT
-
-            logger.info(f"WS: Received audio (len: {len(audio_bytes_from_client)}) from {call_id}. Transcribing...")
-
-            customer_text = await run_in_threadpool(stt_service.transcribe_audio, audio_bytes_from_client) # type: ignore
-            
-            if customer_text is None or "Error:" in customer_text: # Broad error check
-                logger.error(f"WS: STT failed for {call_id}: {customer_text}")
-                await websocket.send_json({"type": "error", "message": f"STT failed: {customer_text or 'Unknown STT error'}"})
-                continue
-            
-            customer_text = customer_text.strip()
-            # Send transcript back to client immediately for display
-            await websocket.send_json({"type": "user_text", "text": customer_text})
-            logger.info(f"WS: User ({call_id}) said: '{customer_text}'")
-
-            if not customer_text: # If transcription is empty after STT and stripping
-                logger.info(f"WS: Empty transcription for {call_id}.")
-                empty_response_text = "I'm sorry, I didn't quite catch that. Could you please repeat?"
-                empty_response_audio = await run_in_threadpool(tts_service.synthesize_to_wav_bytes, empty_response_text) # type: ignore
-                if empty_response_audio: await websocket.send_bytes(empty_response_audio)
-                else: await websocket.send_json({"type": "agent_text", "text": empty_response_text})
-                continue
-
-            agent_reply_text, should_end_call = await run_in_threadpool(
-                manager.process_customer_response, call_id, customer_text # type: ignore
-            )
-
-            if agent_reply_text is None:
-                logger.warning(f"WS: Agent reply is None for {call_id}. Ending.")
-                await websocket.send_json({"type": "system", "message": "Call ended by system."})
-                break
-
-            logger.info(f"WS: Agent ({call_id}) replies: '{agent_reply_text}'")
-            
-            agent_audio_bytes = await run_in_threadpool(tts_service.synthesize_to_wav_bytes, agent_reply_text) # type: ignore
-            if agent_audio_bytes:
-                await websocket.send_bytes(agent_audio_bytes)
+            if audio_bytes_from_client[:4] == b"RIFF":
+                # A complete recorded utterance (WAV) - transcribe it in one go.
+                logger.info(f"WS: Received audio (len: {len(audio_bytes_from_client)}) from {call_id}. Transcribing...")
+                with get_tracer().turn("ws.turn", call_id=call_id, input="wav"):
+                    try:
+                        customer_text = await _transcribe_upload(stt_service, audio_bytes_from_client) # type: ignore
+                    except AdmissionRejected as e:
+                        logger.warning(f"WS: Utterance from {call_id} shed, STT overloaded ({e.reason}).")
+                        customer_text = "" # Answered with the reprompt, like an utterance that was not understood
+                    call_ended = await _handle_customer_turn(websocket, manager, tts_service, call_id, customer_text) # type: ignore
             else:
-                logger.error(f"WS: TTS failed for {call_id}. Sending text reply.")
-                await websocket.send_json({"type": "agent_text", "text": agent_reply_text})
+                # Raw PCM16 frames of a continuous stream; the VAD decides when the turn is over.
+                customer_text = await streaming_transcriber.feed(audio_bytes_from_client)
+                if customer_text is None:
+                    continue
+                with _streamed_turn_trace(call_id, streaming_transcriber):
+                    call_ended = await _handle_customer_turn(websocket, manager, tts_service, call_id, customer_text) # type: ignore
 
-            if should_end_call:
-                logger.info(f"WS: Call for {call_id} ended by agent logic.")
-                await websocket.send_json({"type": "system", "message": "Call ended by agent."})
+            if call_ended:
                 break
 
     except WebSocketDisconnect as e: # Catch specific disconnect exception
@@ -242,10 +447,13 @@ async def websocket_voice_chat_endpoint(
         logger.error(f"WS: Unexpected error in WebSocket for call_id {call_id}: {e}", exc_info=True)
         if websocket.client_state != WebSocketState.DISCONNECTED: # type: ignore
             try:
-                await websocket.send_json({"type": "error", "message": "An unexpected server error occurred."})
+                await _send_json(websocket, {"type": "error", "message": "An unexpected server error occurred."})
             except Exception: pass # Ignore if sending error fails
     finally:
         logger.info(f"WS: Cleaning up WebSocket connection for call_id: {call_id}")
+        WEBSOCKET_CONNECTIONS.dec()
+        if streaming_transcriber is not None:
+            await streaming_transcriber.aclose()
         if websocket.client_state != WebSocketState.DISCONNECTED: # type: ignore
             await websocket.close(code=status.WS_1000_NORMAL_CLOSURE)
         logger.info(f"WS: WebSocket connection fully closed for call_id: {call_id}")
\ No newline at end of file
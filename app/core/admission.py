@@ -0,0 +1,210 @@
+# app/core/admission.py
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Optional
+
+from app.core.config import settings, logger
+
+_EWMA_ALPHA = 0.2 # Weight of the newest sample in the moving averages
+
+
+class AdmissionRejected(Exception):
+    """
+    Work the server will not start: the stage's queue is full or the request waited past its queue
+    deadline (503), or one call has too many turns in flight (429). Routes answer with Retry-After.
+    """
+    def __init__(self, stage: str, reason: str, retry_after_s: int, status_code: int = 503):
+        super().__init__(f"{stage}: {reason}")
+        self.stage = stage
+        self.reason = reason
+        self.retry_after_s = retry_after_s
+        self.status_code = status_code
+
+
+class StageGate:
+    """
+    Admission for one pipeline stage (STT, LLM or TTS): at most max_concurrency requests run at once and
+    up to max_queue more wait in FIFO order, each for at most queue_timeout_s. Beyond that requests are
+    rejected immediately instead of making every caller slower. Used from the event loop only.
+    """
+    def __init__(self, name: str, max_concurrency: int, max_queue: Optional[int], queue_timeout_s: Optional[float]):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max_queue           # None = unbounded
+        self.queue_timeout_s = queue_timeout_s # None = wait as long as it takes
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.rejected_full = 0
+        self.rejected_timeout = 0
+        self.skipped = 0 # Optional work dropped because the stage was busy (has_capacity() == False)
+        self.wait_ms_avg = 0.0
+        self.wait_ms_max = 0.0
+        self.service_ms_avg = 0.0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def has_capacity(self) -> bool:
+        """True if a request would start right away. Optional work (e.g. partial transcripts) checks this first."""
+        if self.in_flight < self.max_concurrency and not self._waiters:
+            return True
+        self.skipped += 1
+        return False
+
+    def is_saturated(self) -> bool:
+        return self.max_queue is not None and len(self._waiters) >= self.max_queue
+
+    def retry_after_s(self) -> int:
+        # Time for the current queue to drain at the observed service time (at least one second).
+        service_s = max(self.service_ms_avg, 100.0) / 1000.0
+        return max(1, math.ceil(service_s * (len(self._waiters) + 1) / self.max_concurrency))
+
+    async def _acquire(self):
+        if self.in_flight < self.max_concurrency and not self._waiters:
+            self.in_flight += 1
+            return
+        if self.is_saturated():
+            self.rejected_full += 1
+            raise AdmissionRejected(self.name, "queue full", self.retry_after_s())
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout_s)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                self._release() # The slot was handed over just as this request gave up
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self.rejected_timeout += 1
+                raise AdmissionRejected(self.name, "queue deadline exceeded", self.retry_after_s()) from None
+            raise
+
+    def _release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None) # Hand the slot to the next waiter; in_flight stays the same
+                return
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def admit(self):
+        """Holds one slot of the stage for the body. Raises AdmissionRejected instead of waiting too long."""
+        queued_at = time.monotonic()
+        await self._acquire()
+        started = time.monotonic()
+        wait_ms = (started - queued_at) * 1000
+        self.admitted += 1
+        self.wait_ms_avg += _EWMA_ALPHA * (wait_ms - self.wait_ms_avg)
+        self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+        try:
+            yield
+        finally:
+            self.service_ms_avg += _EWMA_ALPHA * ((time.monotonic() - started) * 1000 - self.service_ms_avg)
+            self._release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected_full": self.rejected_full,
+            "rejected_timeout": self.rejected_timeout,
+            "skipped": self.skipped,
+            "wait_ms_avg": round(self.wait_ms_avg, 1),
+            "wait_ms_max": round(self.wait_ms_max, 1),
+            "service_ms_avg": round(self.service_ms_avg, 1),
+        }
+
+
+def _model_workers_for(service: str) -> int:
+    services = {s.strip() for s in settings.MODEL_WORKER_SERVICES.split(",")}
+    return settings.MODEL_WORKERS if settings.MODEL_WORKERS > 0 and service in services else 0
+
+
+def _default_concurrency(stage: str) -> int:
+    if stage == "stt":
+        limit = settings.ADMISSION_STT_CONCURRENCY
+        return limit if limit > 0 else settings.STT_MAX_BATCH_SIZE * max(1, _model_workers_for("stt"))
+    if stage == "llm":
+        limit = settings.ADMISSION_LLM_CONCURRENCY
+        per_worker = settings.LLM_MAX_BATCH_SIZE if settings.LLM_BATCHING_ENABLED else settings.LLM_GENERATION_THREADS
+        return limit if limit > 0 else max(1, per_worker) * max(1, _model_workers_for("llm"))
+    # TTS keeps the TTS_MAX_CONCURRENCY semantics: 2 per TTS worker process, 1 in-process.
+    if settings.TTS_MAX_CONCURRENCY > 0:
+        return settings.TTS_MAX_CONCURRENCY
+    tts_workers = _model_workers_for("tts") or settings.TTS_WORKERS
+    return 2 * tts_workers if tts_workers > 0 else 1
+
+
+class AdmissionController:
+    """Stage gates for STT, LLM and TTS plus a per-call cap on turns in flight."""
+    STAGES = ("stt", "llm", "tts")
+
+    def __init__(self):
+        self.enabled = settings.ADMISSION_CONTROL_ENABLED
+        # Disabled: the gates still cap concurrency, but queue without bound or deadline (plain semaphores).
+        max_queue = max(0, settings.ADMISSION_MAX_QUEUE) if self.enabled else None
+        timeout_s = settings.ADMISSION_QUEUE_TIMEOUT_MS / 1000.0 if self.enabled and settings.ADMISSION_QUEUE_TIMEOUT_MS > 0 else None
+        self.stages: Dict[str, StageGate] = {
+            name: StageGate(name, _default_concurrency(name), max_queue, timeout_s) for name in self.STAGES
+        }
+        self.max_turns_per_call = settings.ADMISSION_MAX_TURNS_PER_CALL if self.enabled else 0
+        self._turns_per_call: Dict[str, int] = {}
+        self.rejected_call_turns = 0
+        self.rejected_new_calls = 0
+        logger.info(
+            "Admission control " + ("enabled" if self.enabled else "disabled") + ": "
+            + ", ".join(f"{name} x{gate.max_concurrency}" for name, gate in self.stages.items())
+            + f", queue {max_queue}, deadline {timeout_s}s."
+        )
+
+    def stage(self, name: str) -> StageGate:
+        return self.stages[name]
+
+    def check_new_call(self):
+        """New calls are refused first: while the LLM queue is full, starting more calls only adds turns to shed."""
+        gate = self.stages["llm"]
+        if self.enabled and gate.is_saturated():
+            self.rejected_new_calls += 1
+            raise AdmissionRejected("llm", "not accepting new calls", gate.retry_after_s())
+
+    @asynccontextmanager
+    async def call_turn(self, call_id: str):
+        """Counts the call's turns in flight; a client flooding one call beyond the cap gets 429."""
+        pending = self._turns_per_call.get(call_id, 0)
+        if self.max_turns_per_call > 0 and pending >= self.max_turns_per_call:
+            self.rejected_call_turns += 1
+            raise AdmissionRejected("call", "too many turns in flight for this call", 1, status_code=429)
+        self._turns_per_call[call_id] = pending + 1
+        try:
+            yield
+        finally:
+            remaining = self._turns_per_call[call_id] - 1
+            if remaining:
+                self._turns_per_call[call_id] = remaining
+            else:
+                del self._turns_per_call[call_id]
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {name: gate.stats() for name, gate in self.stages.items()}
+        stats["calls_with_turns_in_flight"] = len(self._turns_per_call)
+        stats["rejected_call_turns"] = self.rejected_call_turns
+        stats["rejected_new_calls"] = self.rejected_new_calls
+        return stats
+
+
+admission_controller_instance: Optional[AdmissionController] = None
+def get_admission_controller() -> AdmissionController:
+    global admission_controller_instance
+    if admission_controller_instance is None:
+        admission_controller_instance = AdmissionController()
+    return admission_controller_instance
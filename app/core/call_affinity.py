@@ -0,0 +1,24 @@
+# app/core/call_affinity.py
+import uuid
+import zlib
+
+from app.core.config import settings
+
+
+def worker_for_call_id(call_id: str, num_workers: int) -> int:
+    """The API worker that owns a call. Same crc32 scheme ModelWorkerPool uses to route calls to model workers."""
+    return zlib.crc32(call_id.encode("utf-8")) % max(1, num_workers)
+
+
+def new_call_id() -> str:
+    """
+    A fresh UUID call id. In a multi-worker deployment (WORKER_COUNT > 1) ids are drawn until one hashes
+    to this worker (WORKER_INDEX), so the affinity proxy sends every later turn of the call back here,
+    where its KV-cache lives, without any routing table. Takes WORKER_COUNT draws on average.
+    """
+    if settings.WORKER_COUNT <= 1:
+        return str(uuid.uuid4())
+    while True:
+        call_id = str(uuid.uuid4())
+        if worker_for_call_id(call_id, settings.WORKER_COUNT) == settings.WORKER_INDEX:
+            return call_id
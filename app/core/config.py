@@ -36,9 +36,81 @@ class Settings(BaseSettings):
     LOG_LEVEL: str = "INFO"
 
     HUGGINGFACEHUB_API_TOKEN: Optional[str] = None
+    BACKEND_MODE: str = "real"           # "real" models, or "fake": deterministic stand-ins for Qwen, Whisper and pyttsx3 (benchmarks)
     LLM_MODEL_REPO_ID: str = "Qwen/Qwen2-0.5B-Instruct" # <<< CHANGED BACK TO QWEN
+    LLM_BATCHING_ENABLED: bool = True    # Route all generations through the continuous-batching scheduler
+    LLM_MAX_BATCH_SIZE: int = 8          # Max sequences decoded together in one step
+    LLM_BATCH_MAX_WAIT_MS: float = 10.0  # How long an idle scheduler waits for more prompts to join a new batch
+    LLM_PREFIX_CACHE_ENABLED: bool = True # Encode the shared system prompt once at startup and reuse its KV-cache
+    LLM_CALL_KV_CACHE_MAX_MB: int = 512  # Memory budget for per-call KV-caches kept between turns (LRU); 0 disables
+    LLM_GENERATION_THREADS: int = 2      # Threads for async generations when batching is off (batched ones need none)
+    LLM_PROMPT_TOKEN_BUDGET: int = 1536  # Max prompt tokens per turn (system + summary + recent history); 0 = whole history
+    LLM_HISTORY_VERBATIM_TURNS: int = 4  # Most recent customer/agent exchanges always sent word for word
+    LLM_HISTORY_SUMMARY_EVERY_TURNS: int = 3 # Older exchanges are folded into the summary this many at a time
+    LLM_HISTORY_SUMMARY_MAX_TOKENS: int = 120 # Length limit of the rolling summary
+
+    MODEL_WORKERS: int = 0                   # >0 runs inference in this many worker processes instead of the API process
+    MODEL_WORKER_SERVICES: str = "llm,stt,tts" # Which services the worker processes take over
+    MODEL_WORKER_START_METHOD: str = "auto"  # "fork" (weights shared copy-on-write), "spawn" (shared memory) or "auto"
+    MODEL_WORKER_TORCH_THREADS: int = 0      # torch intra-op threads per worker; 0 = cores / MODEL_WORKERS
+    MODEL_WORKER_REQUEST_THREADS: int = 16   # Concurrent requests a worker accepts (feeds its batchers)
 
     WHISPER_MODEL_SIZE: str = "base"
+    STT_BATCHING_ENABLED: bool = True        # Batch utterances from concurrent calls into one Whisper pass
+    STT_MAX_BATCH_SIZE: int = 8              # Max utterances encoded/decoded together
+    STT_BATCH_MAX_WAIT_MS: float = 20.0      # How long the first queued utterance waits for others to join
+    STT_VAD_AGGRESSIVENESS: int = 2          # webrtcvad mode 0-3 (used when webrtcvad is installed)
+    STT_VAD_ENERGY_THRESHOLD: float = 0.01   # RMS gate for the fallback energy VAD (float samples in [-1, 1])
+    STT_VAD_MIN_SPEECH_MS: int = 200         # Shorter voiced bursts are treated as noise
+    STT_VAD_PRE_ROLL_MS: int = 150           # Audio kept from before speech onset so first syllables are not clipped
+    STT_VAD_SEGMENT_PAUSE_MS: int = 300      # Pause that closes a segment so it can be transcribed mid-turn
+    STT_VAD_END_OF_TURN_MS: int = 800        # Silence that ends the customer's turn
+    STT_PARTIAL_INTERVAL_MS: int = 600       # New audio needed before the next user_text_partial
+    TTS_WORKERS: int = 0                        # >0 runs pyttsx3 in this many processes so syntheses run in parallel
+    TTS_MAX_CONCURRENCY: int = 0                # Syntheses in flight at once; 0 = 2 per TTS worker (1 in-process)
+    TTS_CACHE_MAX_MB: int = 64                  # In-memory LRU budget for synthesized audio; 0 disables the cache
+    TTS_CACHE_DIR: str = ""                     # Optional on-disk tier for cached audio (empty = memory only)
+    TTS_CACHE_PREWARM: bool = True              # Synthesize the fixed agent phrases at startup
+    TTS_PIPELINE_MIN_SENTENCE_CHARS: int = 12   # Shorter sentences are merged with the next before synthesis
+    TTS_PIPELINE_MAX_PENDING_SENTENCES: int = 2 # Queue depth between generation, synthesis and sending
+    GREETING_MODE: str = "template"             # "template": fill pre-generated greetings; "generate": LLM per call
+    GREETING_TEMPLATE_POOL_SIZE: int = 4        # Distinct greeting templates generated per course configuration
+    GREETING_TEMPLATE_CACHE_PATH: str = ""      # Optional JSON file keeping templates across restarts
+    GREETING_AUDIO_NAME_SLOT: bool = True       # Stitch greeting audio from cached template pieces + the name
+    SESSION_STORE_BACKEND: str = "memory"       # Where call sessions are kept: "memory" or "sqlite"
+    SESSION_IDLE_TTL_SECONDS: float = 1800.0    # Active calls idle this long are dropped (0 = never)
+    SESSION_ENDED_TTL_SECONDS: float = 300.0    # Ended calls stay readable via /conversation this long (0 = until evicted)
+    SESSION_MAX_SESSIONS: int = 10000           # Hard cap; least recently used ended calls are evicted first
+    SESSION_SWEEP_INTERVAL_SECONDS: float = 30.0 # How often expired sessions are swept (0 = only on lookup)
+    SESSION_SQLITE_PATH: str = "data/sessions.db" # SQLite file for the "sqlite" backend (WAL mode)
+    SESSION_SQLITE_FLUSH_MS: float = 50.0       # Write-behind window: queued session updates are committed together
+    SESSION_SHARED: bool = False                # Several API processes share the SQLite store (set by app.affinity_proxy)
+    SESSION_TURN_LEASE_SECONDS: float = 120.0   # Shared store: a call's turn lease left by a crashed worker is taken over after this
+    WORKER_INDEX: int = 0                       # This API process's index in a multi-worker deployment
+    WORKER_COUNT: int = 1                       # API processes behind the affinity proxy; call ids hash to their owner
+    CALL_TURN_THREADS: int = 4                  # Threads for the blocking steps of async turns (session store, greetings)
+    ADMISSION_CONTROL_ENABLED: bool = True      # Bounded queues + deadlines per stage; overload is answered with 503/429
+    ADMISSION_STT_CONCURRENCY: int = 0          # Transcriptions running at once; 0 = STT_MAX_BATCH_SIZE per model worker
+    ADMISSION_LLM_CONCURRENCY: int = 0          # Generations running at once; 0 = LLM_MAX_BATCH_SIZE per model worker
+    ADMISSION_MAX_QUEUE: int = 32               # Requests that may wait per stage (STT/LLM/TTS); more are rejected at once
+    ADMISSION_QUEUE_TIMEOUT_MS: float = 3000.0  # Longest wait for a stage slot before a 503 (0 = no deadline)
+    ADMISSION_MAX_TURNS_PER_CALL: int = 2       # Turns of one call in flight (running + queued); more get 429
+    METRICS_ENABLED: bool = True                # Per-stage latency histograms, served in Prometheus format at /metrics
+    TRACING_ENABLED: bool = False               # Per-turn trace spans (STT, LLM, TTS stages) written to TRACING_EXPORT_DIR
+    TRACING_SAMPLE_RATE: float = 0.1            # Fraction of turns traced
+    TRACING_MAX_TRACES_PER_SECOND: int = 10     # Cap on traced turns per second, keeps tracing cheap under load (0 = no cap)
+    TRACING_EXPORT_FORMAT: str = "chrome"       # "chrome" (Chrome trace / Perfetto JSON) or "otlp" (OTLP JSON lines)
+    TRACING_EXPORT_DIR: str = "data/traces"     # One file per API process: turns-<pid>.trace.json / .otlp.jsonl
+    FAKE_LATENCY_SCALE: float = 1.0             # Multiplies every fake backend delay (0 = instant, 0.1 = ten times faster)
+    FAKE_LLM_PREFILL_TOKENS_PER_S: float = 1000.0 # Uncached prompt tokens the fake LLM processes per second
+    FAKE_LLM_DECODE_TOKENS_PER_S: float = 30.0  # Tokens the fake LLM generates per second and sequence
+    FAKE_LLM_REPLY_TOKENS: int = 40             # Approximate length of a fake reply (the generation limit still applies)
+    FAKE_LLM_CONCURRENCY: int = 0               # Fake generations running at once; 0 = LLM_MAX_BATCH_SIZE (LLM_GENERATION_THREADS unbatched)
+    FAKE_STT_BASE_MS: float = 40.0              # Fixed cost of one fake transcription
+    FAKE_STT_REAL_TIME_FACTOR: float = 0.1      # Plus this many seconds per second of audio
+    FAKE_TTS_BASE_MS: float = 30.0              # Fixed cost of one fake synthesis
+    FAKE_TTS_MS_PER_CHAR: float = 3.0           # Plus this much per character
+    FAKE_TTS_CHARS_PER_SECOND: float = 15.0     # Speaking rate that sets the length of the fake audio (a quiet 220 Hz tone)
     COURSE_NAME: str = "AI Mastery Bootcamp"
     COURSE_DURATION: str = "12 weeks"
     COURSE_PRICE_FULL: str = "$499"
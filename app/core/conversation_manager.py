@@ -82,51 +82,127 @@
 
 # app/core/conversation_manager.py
 
-from typing import Dict, Optional, Tuple, List, Any
+from typing import Dict, Optional, Set, Tuple, List, Any, AsyncIterator, Callable
 from app.schemas.conversation import CallSession, Utterance
 from app.services.llm_service import get_llm_service, LLMService
-from app.core.config import logger
+from app.services.greeting_cache import get_greeting_cache
+from app.core.config import settings, logger
+from app.core.session_store import SessionStore, create_session_store
+from app.core.call_affinity import new_call_id
+from app.core.prompt_cache import CallPromptCache
+from app.core.metrics import PROMPT_BUILD_SECONDS, THREADPOOL_WAIT_SECONDS, timed_call
+from app.core.tracing import get_tracer
+import asyncio
+import os
+import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from datetime import datetime
 
 from langchain_core.messages import HumanMessage, AIMessage, BaseMessage, SystemMessage
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnableLambda
-from langchain_core.prompt_values import ChatPromptValue # For type hinting
 
-from app.prompts.sales_prompts import MAIN_SALES_CHAT_PROMPT, format_lc_messages_to_qwen_prompt_string, QWEN_SYSTEM_PROMPT_CONTENT
+from app.prompts.sales_prompts import (
+    LLM_INITIALIZING_MESSAGE, LLM_UNAVAILABLE_MESSAGE, CALL_NOT_FOUND_MESSAGE, PROCESSING_ERROR_MESSAGE,
+    QWEN_SYSTEM_PROMPT_PREFIX, HISTORY_SUMMARY_MESSAGE_TEMPLATE, IM_START_TOKEN, ASSISTANT_ROLE, SYSTEM_ROLE,
+    format_qwen_message, qwen_role_for_speaker,
+)
+
+END_CALL_MARKER = "[END_CALL]"
+_SHARED_TURN_POLL_S = 0.02 # How often a turn waiting on another worker's lease retries
+
+class _EndCallMarkerFilter:
+    """Strips END_CALL_MARKER from a stream of text deltas, holding back a partial marker at the tail."""
+    def __init__(self):
+        self._buffer = ""
+        self._started = False
+
+    def feed(self, delta: str) -> str:
+        self._buffer = (self._buffer + delta).replace(END_CALL_MARKER, "")
+        if not self._started:
+            self._buffer = self._buffer.lstrip()
+            self._started = bool(self._buffer)
+        hold = 0
+        for n in range(min(len(END_CALL_MARKER) - 1, len(self._buffer)), 0, -1):
+            if self._buffer.endswith(END_CALL_MARKER[:n]):
+                hold = n
+                break
+        visible, self._buffer = self._buffer[:len(self._buffer) - hold], self._buffer[len(self._buffer) - hold:]
+        return visible
+
+    def flush(self) -> str:
+        remaining, self._buffer = self._buffer, ""
+        return remaining
+
+class _CallTurnLocks:
+    """
+    One asyncio.Lock per call with a turn running or waiting, so turns of a call run one at a time in
+    arrival order. A lock is dropped as soon as nothing holds or awaits it: idle calls cost nothing.
+    """
+    def __init__(self):
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._waiters: Dict[str, int] = {}
+
+    @asynccontextmanager
+    async def hold(self, call_id: str):
+        lock = self._locks.get(call_id)
+        if lock is None:
+            lock = self._locks[call_id] = asyncio.Lock()
+        self._waiters[call_id] = self._waiters.get(call_id, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._waiters[call_id] -= 1
+            if not self._waiters[call_id]:
+                del self._waiters[call_id]
+                del self._locks[call_id]
+
+    def __len__(self) -> int:
+        return len(self._locks)
 
 class ConversationManager:
     def __init__(self):
-        self.active_calls: Dict[str, CallSession] = {}
+        self.sessions: SessionStore = create_session_store(on_evict=self._on_session_evicted)
         self.llm_service: Optional[LLMService] = get_llm_service()
         self.sales_chain: Optional[Any] = None
+        # Rolling history summaries are generated off the turn path, one at a time.
+        self._summary_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-summary")
+        self._summaries_pending: Set[str] = set()
+        self._ready_summaries: Dict[str, Tuple[str, int]] = {} # call_id -> (summary, summary_upto) waiting for the next turn
+        self._summary_lock = threading.Lock()
+        self._fixed_prompt_tokens: Optional[int] = None
+        # Async API: per-call turn ordering, and a dedicated pool for the short blocking steps of a turn
+        # (session store, prompt bookkeeping). Generation itself is awaited without holding a thread.
+        self._turn_locks = _CallTurnLocks()
+        self._turn_executor = ThreadPoolExecutor(
+            max_workers=max(1, settings.CALL_TURN_THREADS), thread_name_prefix="call-turn"
+        )
 
         if not self.llm_service or not self.llm_service.is_ready():
             logger.error("LLM Service not available in ConversationManager. May not function correctly.")
         else:
             langchain_llm_instance = self.llm_service.get_langchain_llm_instance()
             if langchain_llm_instance:
-                
-                # This function takes the output of MAIN_SALES_CHAT_PROMPT (which is a list of BaseMessage after .format_messages())
-                # and converts it into the Qwen-specific string format.
-                def lc_messages_to_qwen_string_adapter(messages_list: List[BaseMessage]) -> str:
-                    # The `MAIN_SALES_CHAT_PROMPT` already includes the system message.
-                    # So, `messages_list` here should be the fully formed list including system, history, and current human.
-                    return format_lc_messages_to_qwen_prompt_string(messages_list)
-
+                # The Qwen prompt string comes from the call's CallPromptCache (built incrementally per turn),
+                # so the chain only runs the model and cleans its output.
                 self.sales_chain = (
-                    MAIN_SALES_CHAT_PROMPT # Input: {"chat_history": List[BaseMessage], "customer_input": str}
-                                           # Output: ChatPromptValue, which we'll convert to messages
-                    | RunnableLambda(lambda prompt_value: prompt_value.to_messages()) # Converts ChatPromptValue to List[BaseMessage]
-                    | RunnableLambda(lc_messages_to_qwen_string_adapter) # Converts List[BaseMessage] to Qwen string
-                    | langchain_llm_instance  # Input: Qwen-formatted string -> Output: Raw LLM response string
-                    | StrOutputParser()       # Input: Raw LLM response string -> Output: Cleaned string
+                    langchain_llm_instance  # Input: Qwen-formatted string -> Output: Raw LLM response string
+                    | StrOutputParser()     # Input: Raw LLM response string -> Output: Cleaned string
                 )
-                logger.info("ConversationManager: LCEL sales_chain initialized with corrected formatting steps.")
+                logger.info("ConversationManager: LCEL sales_chain initialized.")
             else:
                 logger.error("ConversationManager: Could not get LangChain LLM instance to build sales_chain.")
 
+    def _on_session_evicted(self, session: CallSession, reason: str):
+        # Calls dropped while still active never reached _finalize_turn's cleanup.
+        self._discard_ready_summary(session.call_id)
+        if session.is_active and self.llm_service:
+            self.llm_service.release_call_cache(session.kv_cache_key)
+        logger.info(f"Call ID {session.call_id} removed from the session store ({reason}).")
+
     def _convert_session_history_to_lc_messages(self, history: List[Utterance]) -> List[BaseMessage]:
         lc_messages: List[BaseMessage] = []
         for u in history:
@@ -136,51 +212,152 @@ class ConversationManager:
                 lc_messages.append(HumanMessage(content=u.text))
         return lc_messages
 
+    def _utterance_token_ids(self, utterance: Utterance) -> Optional[List[int]]:
+        """Token ids of the utterance's Qwen message; tokenized once, then kept on the utterance."""
+        if utterance._token_ids is None:
+            message = format_qwen_message(qwen_role_for_speaker(utterance.speaker), utterance.text)
+            utterance._token_ids = self.llm_service.encode(message)
+        return utterance._token_ids
+
+    def _utterance_tokens(self, utterance: Utterance) -> int:
+        if utterance._token_count is None: # Counted once per utterance, then cached on it
+            token_ids = self._utterance_token_ids(utterance)
+            if token_ids is not None:
+                utterance._token_count = len(token_ids)
+            else:
+                message = format_qwen_message(qwen_role_for_speaker(utterance.speaker), utterance.text)
+                utterance._token_count = self.llm_service.count_tokens(message)
+        return utterance._token_count
+
+    def _history_window(self, session: CallSession, customer_utterance: Utterance) -> Tuple[Optional[str], int]:
+        """
+        The part of the history sent to the LLM: the rolling summary (if any) plus the utterances from the returned index on,
+        trimmed from the front to fit LLM_PROMPT_TOKEN_BUDGET. Between summary refreshes the prompt only grows
+        at the end, so the call's KV-cache from the previous turn stays reusable.
+        """
+        budget = settings.LLM_PROMPT_TOKEN_BUDGET
+        history = session.history
+        if budget <= 0:
+            return None, 0
+        if self._fixed_prompt_tokens is None:
+            self._fixed_prompt_tokens = self.llm_service.count_tokens(f"{QWEN_SYSTEM_PROMPT_PREFIX}{IM_START_TOKEN}{ASSISTANT_ROLE}\n")
+        start = min(session.summary_upto, len(history))
+        summary = session.history_summary if start > 0 else None
+        available = budget - self._fixed_prompt_tokens - self._utterance_tokens(customer_utterance)
+        if summary:
+            available -= self.llm_service.count_tokens(format_qwen_message(SYSTEM_ROLE, HISTORY_SUMMARY_MESSAGE_TEMPLATE.format(summary=summary)))
+        window_tokens = sum(self._utterance_tokens(u) for u in history[start:])
+        trimmed = 0
+        while start < len(history) and window_tokens > available:
+            window_tokens -= self._utterance_tokens(history[start])
+            start += 1
+            trimmed += 1
+        if trimmed:
+            logger.debug(f"Call {session.call_id}: {trimmed} utterance(s) over the token budget wait for the next summary.")
+        verbatim_limit = 2 * (settings.LLM_HISTORY_VERBATIM_TURNS + settings.LLM_HISTORY_SUMMARY_EVERY_TURNS)
+        if trimmed or len(history) - session.summary_upto > verbatim_limit:
+            self._schedule_summary(session)
+        return summary, start
+
+    def _schedule_summary(self, session: CallSession):
+        upto = len(session.history) - 2 * settings.LLM_HISTORY_VERBATIM_TURNS
+        if upto <= session.summary_upto:
+            return
+        with self._summary_lock:
+            if session.call_id in self._summaries_pending:
+                return
+            self._summaries_pending.add(session.call_id)
+        # The worker gets a copy of what it summarizes and never touches the session: the result is
+        # adopted (and persisted) by the call's next turn, see _apply_ready_summary.
+        excerpt = session.history[session.summary_upto:upto]
+        self._summary_executor.submit(self._refresh_summary, session.call_id, session.history_summary, excerpt, upto)
+
+    def _refresh_summary(self, call_id: str, previous_summary: Optional[str], excerpt: List[Utterance], upto: int):
+        try:
+            transcript = "\n".join(f"{'Alex' if u.speaker == 'agent' else 'Customer'}: {u.text}" for u in excerpt)
+            summary = self.llm_service.summarize_history(previous_summary, transcript)
+            if summary:
+                with self._summary_lock:
+                    self._ready_summaries[call_id] = (summary, upto)
+                logger.info(f"Call ID {call_id}: history summarized up to utterance {upto}; applied from the next turn.")
+        except Exception as e:
+            logger.error(f"History summarization failed for call {call_id}: {e}", exc_info=True)
+        finally:
+            with self._summary_lock:
+                self._summaries_pending.discard(call_id)
+
+    def _apply_ready_summary(self, session: CallSession):
+        """Adopts a summary finished since the last turn. Runs inside the call's turn, so history_summary and summary_upto change together."""
+        with self._summary_lock:
+            ready = self._ready_summaries.pop(session.call_id, None)
+        if ready is not None and ready[1] > session.summary_upto:
+            session.history_summary, session.summary_upto = ready # Persisted with the turn in _finalize_turn
+
+    def _discard_ready_summary(self, call_id: str):
+        with self._summary_lock:
+            self._ready_summaries.pop(call_id, None)
+
+    def _prompt_for_turn(self, session: CallSession, customer_message: str) -> Tuple[str, Optional[List[int]]]:
+        """Qwen prompt (text and token ids) for the agent's reply to customer_message, from the call's prompt cache."""
+        with PROMPT_BUILD_SECONDS.time():
+            customer_utterance = Utterance(speaker="customer", text=customer_message)
+            summary, start = self._history_window(session, customer_utterance)
+            cache: Optional[CallPromptCache] = session._prompt_cache
+            if cache is None or not cache.matches(start, summary):
+                prefix_ids = self.llm_service.system_prefix_ids() # Tokenized once when the model loaded
+                encode = self.llm_service.encode if prefix_ids is not None else None
+                cache = CallPromptCache(start, summary, prefix_ids, encode, self._utterance_token_ids)
+                session._prompt_cache = cache
+            cache.extend(session.history)
+            return cache.prompt_for(customer_utterance)
+
     def start_new_call(self, customer_name: str, phone_number: str) -> Tuple[str, str]:
         if not self.llm_service or not self.llm_service.is_ready():
-            fallback_message = "Hello, our AI system is currently initializing. Please try again shortly."
-            call_id = str(uuid.uuid4())
+            fallback_message = LLM_INITIALIZING_MESSAGE
+            call_id = new_call_id()
             session = CallSession(
                 call_id=call_id, customer_name=customer_name, phone_number=phone_number, is_active=False
             )
             session.add_utterance(speaker="agent", text=fallback_message)
-            self.active_calls[call_id] = session
+            self.sessions.put(session)
             logger.warning(f"LLM service not ready. Started call {call_id} with fallback message.")
             return call_id, fallback_message
 
-        call_id = str(uuid.uuid4())
-        session = CallSession(call_id=call_id, customer_name=customer_name, phone_number=phone_number)
+        call_id = new_call_id()
+        session = CallSession(call_id=call_id, customer_name=customer_name, phone_number=phone_number, kv_cache_key=call_id)
         
-        initial_greeting = self.llm_service.generate_initial_greeting(customer_name)
+        if settings.GREETING_MODE == "template":
+            # Fill a pre-generated template instead of running the LLM for every call start.
+            initial_greeting, session.greeting_template_index = get_greeting_cache().render(customer_name)
+        else:
+            initial_greeting = self.llm_service.generate_initial_greeting(customer_name)
         session.add_utterance(speaker="agent", text=initial_greeting) # Add greeting to history
 
-        self.active_calls[call_id] = session
+        self.sessions.put(session)
         logger.info(f"New call started. ID: {call_id}, Customer: {customer_name}, Initial Greeting: '{initial_greeting}'")
         return call_id, initial_greeting
 
     def process_customer_response(self, call_id: str, customer_message: str) -> Tuple[Optional[str], bool]:
         if not self.llm_service or not self.llm_service.is_ready() or not self.sales_chain:
             logger.warning("LLM service not ready or sales_chain not initialized during process_customer_response.")
-            return "Our AI system is currently having issues. Please try again later.", True
-
-        session = self.active_calls.get(call_id)
-        if not session or not session.is_active:
-            logger.warning(f"Call ID {call_id} not found or inactive.")
-            return "Call not found or has ended.", True
+            return LLM_UNAVAILABLE_MESSAGE, True
 
-        chat_history_lc_messages = self._convert_session_history_to_lc_messages(session.history)
+        turn = self._load_turn(call_id, customer_message)
+        if turn is None:
+            return CALL_NOT_FOUND_MESSAGE, True
+        session, prompt_string, prompt_token_ids = turn
 
-        logger.debug(f"Invoking sales_chain for call_id {call_id} with customer_input: '{customer_message}' and history_len: {len(chat_history_lc_messages)}")
+        logger.debug(f"Invoking sales_chain for call_id {call_id} with customer_input: '{customer_message}' and history_len: {len(session.history)}")
         
-        agent_reply = "I encountered an issue processing your request." # Default error reply
+        agent_reply = PROCESSING_ERROR_MESSAGE # Default error reply
         should_end_call_due_to_error = True # Assume error means call should end
 
         try:
-            chain_input = {
-                "chat_history": chat_history_lc_messages, # This is List[BaseMessage]
-                "customer_input": customer_message
-            }
-            agent_reply_from_chain = self.sales_chain.invoke(chain_input)
+            # Generation inputs go to LocalQwenLLM._call as kwargs of the chain's first step, not as run metadata
+            # (which is copied to every callback and tracer).
+            agent_reply_from_chain = self.sales_chain.invoke(
+                prompt_string, kv_cache_key=session.kv_cache_key, input_ids=prompt_token_ids,
+            )
             
             if not isinstance(agent_reply_from_chain, str) or not agent_reply_from_chain.strip():
                 logger.error(f"Sales chain returned non-string or empty reply: '{agent_reply_from_chain}' (type: {type(agent_reply_from_chain)}). Using fallback.")
@@ -193,6 +370,100 @@ class ConversationManager:
             logger.error(f"Error invoking sales_chain for call {call_id}: {e_chain}", exc_info=True)
             # agent_reply remains the default error message, should_end_call_due_to_error remains True
 
+        return self._finalize_turn(session, customer_message, agent_reply, should_end_call_due_to_error)
+
+    async def _run_blocking(self, fn: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.wrap_future(
+            self._turn_executor.submit(timed_call(THREADPOOL_WAIT_SECONDS.labels("call-turn"), fn), *args)
+        )
+
+    @asynccontextmanager
+    async def _hold_turn(self, call_id: str):
+        """
+        The call's turn lock in this process, plus its turn lease when the session store is shared: the
+        affinity proxy routes by connection, so a turn of the same call can still reach another worker.
+        """
+        async with self._turn_locks.hold(call_id):
+            if not self.sessions.shared:
+                yield
+                return
+            owner = f"{os.getpid()}:{uuid.uuid4().hex}"
+            lease_s = settings.SESSION_TURN_LEASE_SECONDS
+            while not await self._run_blocking(self.sessions.claim_turn, call_id, owner, lease_s):
+                await asyncio.sleep(_SHARED_TURN_POLL_S)
+            try:
+                yield
+            finally:
+                await self._run_blocking(self.sessions.release_turn, call_id, owner)
+
+    def _load_turn(self, call_id: str, customer_message: str) -> Optional[Tuple[CallSession, str, Optional[List[int]]]]:
+        """The active session and the prompt (text, token ids) for a customer turn; None if the call is unknown or over."""
+        session = self.sessions.get(call_id)
+        if not session or not session.is_active:
+            logger.warning(f"Call ID {call_id} not found or inactive.")
+            return None
+        self._apply_ready_summary(session)
+        prompt_string, prompt_token_ids = self._prompt_for_turn(session, customer_message)
+        return session, prompt_string, prompt_token_ids
+
+    @staticmethod
+    def _trace_loaded_turn(span: Any, session: CallSession, prompt_token_ids: Optional[List[int]]):
+        if span.recording:
+            span.set(
+                prompt_tokens=len(prompt_token_ids) if prompt_token_ids is not None else None,
+                history_utterances=len(session.history),
+            )
+            customer_turns = sum(1 for u in session.history if u.speaker == "customer")
+            get_tracer().annotate_turn(call_id=session.call_id, turn_index=customer_turns + 1)
+
+    async def astart_new_call(self, customer_name: str, phone_number: str) -> Tuple[str, str]:
+        """Async start_new_call; the greeting (LLM in "generate" mode) and the session write run on the turn executor."""
+        return await self._run_blocking(self.start_new_call, customer_name, phone_number)
+
+    async def aprocess_customer_response(self, call_id: str, customer_message: str) -> Tuple[Optional[str], bool]:
+        """
+        Async process_customer_response. Overlapping requests for the same call are answered one after
+        the other in arrival order, each seeing the history the previous one recorded. Across workers
+        sharing the session store they still run one at a time, in the order they win the call's lease.
+        """
+        if not self.llm_service or not self.llm_service.is_ready():
+            logger.warning("LLM service not ready during aprocess_customer_response.")
+            return LLM_UNAVAILABLE_MESSAGE, True
+
+        tracer = get_tracer()
+        async with self._hold_turn(call_id):
+            with tracer.span("prompt_build") as prompt_span:
+                turn = await self._run_blocking(self._load_turn, call_id, customer_message)
+                if turn is None:
+                    return CALL_NOT_FOUND_MESSAGE, True
+                session, prompt_string, prompt_token_ids = turn
+                self._trace_loaded_turn(prompt_span, session, prompt_token_ids)
+
+            agent_reply = PROCESSING_ERROR_MESSAGE
+            should_end_call_due_to_error = True
+            try:
+                with tracer.span("llm.generate") as generate_span:
+                    reply = await self.llm_service.agenerate_prompt(
+                        prompt_string, cache_key=session.kv_cache_key, input_ids=prompt_token_ids
+                    )
+                    generate_span.set(reply_chars=len(reply))
+                if reply.strip():
+                    agent_reply, should_end_call_due_to_error = reply, False
+                else:
+                    logger.error(f"Generation returned an empty reply for call {call_id}. Using fallback.")
+            except Exception as e:
+                logger.error(f"Error generating reply for call {call_id}: {e}", exc_info=True)
+            return await self._run_blocking(
+                self._finalize_turn, session, customer_message, agent_reply, should_end_call_due_to_error
+            )
+
+    async def aget_conversation_history(self, call_id: str) -> Optional[CallSession]:
+        return await self._run_blocking(self.sessions.get, call_id)
+
+    def _finalize_turn(
+        self, session: CallSession, customer_message: str, agent_reply: str, should_end_call_due_to_error: bool
+    ) -> Tuple[str, bool]:
+        call_id = session.call_id
         # Add utterances AFTER LLM processing
         session.add_utterance(speaker="customer", text=customer_message)
         session.add_utterance(speaker="agent", text=agent_reply) # Log the actual reply (could be error or LLM response)
@@ -202,27 +473,94 @@ class ConversationManager:
             # If an error occurred during chain invocation, we usually want to end the call gracefully.
             session.is_active = False # Mark inactive due to processing error
             session.end_time = datetime.now()
+            self.llm_service.release_call_cache(session.kv_cache_key)
+            self._discard_ready_summary(call_id)
             logger.warning(f"Call ID {call_id} ending due to processing error. Agent reply given: '{agent_reply}'")
-            self.active_calls[call_id] = session
+            self.sessions.put(session)
             return agent_reply, True
         else:
             # No error, check LLM's instruction
-            should_end_call_by_llm = "[END_CALL]" in agent_reply
+            should_end_call_by_llm = END_CALL_MARKER in agent_reply
             if should_end_call_by_llm:
-                final_agent_reply = agent_reply.replace("[END_CALL]", "").strip()
+                final_agent_reply = agent_reply.replace(END_CALL_MARKER, "").strip()
                 session.is_active = False
                 session.end_time = datetime.now()
+                self.llm_service.release_call_cache(session.kv_cache_key)
+                self._discard_ready_summary(call_id)
                 logger.info(f"Call ID {call_id} marked to end by agent logic. Final reply: '{final_agent_reply}'")
-                self.active_calls[call_id] = session
+                self.sessions.put(session)
                 return final_agent_reply, True
             else:
                 logger.info(f"Call ID {call_id} remains active. Agent reply: '{agent_reply}'")
-                self.active_calls[call_id] = session
+                self.sessions.put(session)
                 return agent_reply, False
 
+    async def astream_customer_response(self, call_id: str, customer_message: str) -> AsyncIterator[str]:
+        """
+        Streaming variant of process_customer_response: yields the agent reply as text deltas
+        (with the [END_CALL] marker removed) and records the turn once generation completes.
+        Afterwards the session's is_active flag tells the caller whether the call should end.
+        Like aprocess_customer_response, turns of one call are streamed one after the other.
+        """
+        if not self.llm_service or not self.llm_service.is_ready():
+            logger.warning("LLM service not ready during astream_customer_response.")
+            yield LLM_UNAVAILABLE_MESSAGE
+            return
+
+        # Spans are started and ended explicitly: a generator must not hold the current-span contextvar across yields.
+        tracer = get_tracer()
+        async with self._hold_turn(call_id):
+            prompt_span = tracer.start_span("prompt_build")
+            turn = await self._run_blocking(self._load_turn, call_id, customer_message)
+            prompt_span.end()
+            if turn is None:
+                yield CALL_NOT_FOUND_MESSAGE
+                return
+            session, prompt_string, prompt_token_ids = turn
+            self._trace_loaded_turn(prompt_span, session, prompt_token_ids)
+            marker_filter = _EndCallMarkerFilter()
+            raw_chunks: List[str] = []
+            should_end_call_due_to_error = False
+            generate_span = tracer.start_span("llm.generate")
+            try:
+                async for delta in self.llm_service.astream_prompt(
+                    prompt_string, cache_key=session.kv_cache_key, input_ids=prompt_token_ids
+                ):
+                    if not raw_chunks and generate_span.recording:
+                        generate_span.set(first_text_ms=round((time.time_ns() - generate_span.start_ns) / 1e6, 1))
+                    raw_chunks.append(delta)
+                    visible = marker_filter.feed(delta)
+                    if visible:
+                        yield visible
+                tail = marker_filter.flush()
+                if tail:
+                    yield tail
+            except Exception as e_stream:
+                logger.error(f"Error streaming reply for call {call_id}: {e_stream}", exc_info=True)
+                should_end_call_due_to_error = True
+            finally:
+                generate_span.set(reply_chars=sum(len(chunk) for chunk in raw_chunks), deltas=len(raw_chunks))
+                generate_span.end()
+
+            agent_reply = "".join(raw_chunks).strip()
+            if not should_end_call_due_to_error and not agent_reply:
+                logger.error(f"Streaming generation returned an empty reply for call {call_id}. Using fallback.")
+                should_end_call_due_to_error = True
+            if should_end_call_due_to_error:
+                agent_reply = PROCESSING_ERROR_MESSAGE
+                if not raw_chunks:
+                    yield agent_reply
+            await self._run_blocking(
+                self._finalize_turn, session, customer_message, agent_reply, should_end_call_due_to_error
+            )
 
     def get_conversation_history(self, call_id: str) -> Optional[CallSession]:
-        return self.active_calls.get(call_id)
+        return self.sessions.get(call_id)
+
+    def shutdown(self):
+        self._summary_executor.shutdown(wait=False)
+        self._turn_executor.shutdown(wait=False)
+        self.sessions.shutdown()
 
 # Singleton logic for ConversationManager
 conversation_manager_instance: Optional[ConversationManager] = None
@@ -231,6 +569,8 @@ def get_conversation_manager(recreate_instance: bool = False) -> ConversationMan
     if recreate_instance or conversation_manager_instance is None:
         logger.info("Creating/Recreating ConversationManager instance.")
         if recreate_instance:
+            if conversation_manager_instance is not None:
+                conversation_manager_instance.shutdown()
             get_llm_service(recreate_instance=True) # Ensure LLM service is also fresh
         conversation_manager_instance = ConversationManager()
     return conversation_manager_instance
\ No newline at end of file
@@ -0,0 +1,278 @@
+# app/core/metrics.py
+"""
+In-process metrics served in the Prometheus text format at /metrics.
+
+Recording is lock-free: every thread writes its own shard of a counter or histogram (a plain list it alone
+updates), and a scrape sums the shards. The event loop, the threadpool and the batcher threads therefore
+never contend, and an observation costs about a microsecond. Model worker processes (MODEL_WORKERS > 0)
+record into their own registries, which are not exported; the API-side latencies still are.
+"""
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class _ShardedValues:
+    """A fixed-size vector of numbers with one copy per writing thread; readers sum the copies."""
+    def __init__(self, size: int):
+        self._size = size
+        self._local = threading.local()
+        self._shards: List[List[float]] = []
+        self._shards_lock = threading.Lock() # Only taken once per thread, when it first writes
+
+    def shard(self) -> List[float]:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = [0.0] * self._size
+            with self._shards_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def totals(self) -> List[float]:
+        with self._shards_lock:
+            shards = list(self._shards)
+        return [sum(values) for values in zip(*shards)] if shards else [0.0] * self._size
+
+
+class _CounterChild:
+    def __init__(self):
+        self._values = _ShardedValues(1)
+
+    def inc(self, amount: float = 1.0):
+        if settings.METRICS_ENABLED:
+            self._values.shard()[0] += amount
+
+    def value(self) -> float:
+        return self._values.totals()[0]
+
+
+class _HistogramChild:
+    def __init__(self, bounds: Tuple[float, ...]):
+        self._bounds = bounds
+        # Slots: one count per bucket (the last one is +Inf), then the running sum.
+        self._values = _ShardedValues(len(bounds) + 2)
+
+    def observe(self, value: float):
+        if settings.METRICS_ENABLED:
+            shard = self._values.shard()
+            shard[bisect.bisect_left(self._bounds, value)] += 1
+            shard[-1] += value
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def snapshot(self) -> Tuple[List[float], float]:
+        totals = self._values.totals()
+        return totals[:-1], totals[-1]
+
+
+class _GaugeChild:
+    """inc/dec from any thread (sharded like counters); set() is meant for a single writer."""
+    def __init__(self):
+        self._values = _ShardedValues(1)
+        self._base = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self._values.shard()[0] += amount
+
+    def dec(self, amount: float = 1.0):
+        self._values.shard()[0] -= amount
+
+    def set(self, value: float):
+        self._base = value - self._values.totals()[0]
+
+    def value(self) -> float:
+        return self._base + self._values.totals()[0]
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry: Optional["MetricsRegistry"] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        (registry or REGISTRY).register(self)
+
+    def _new_child(self) -> Any:
+        raise NotImplementedError
+
+    def labels(self, *labelvalues: str) -> Any:
+        child = self._children.get(labelvalues)
+        if child is None:
+            if len(labelvalues) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labelvalues}")
+            child = self._children.setdefault(labelvalues, self._new_child())
+        return child
+
+    def _label_str(self, labelvalues: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labelvalues)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}", *self._samples()]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{self._label_str(lv)} {_fmt(child.value())}" for lv, child in list(self._children.items())]
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS, registry: Optional["MetricsRegistry"] = None):
+        self._bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self._bounds)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for lv, child in list(self._children.items()):
+            counts, total = child.snapshot()
+            cumulative = 0.0
+            for bound, count in zip(self._bounds + (math.inf,), counts):
+                cumulative += count
+                le = 'le="' + _fmt(bound) + '"'
+                lines.append(f"{self.name}_bucket{self._label_str(lv, le)} {_fmt(cumulative)}")
+            lines.append(f"{self.name}_sum{self._label_str(lv)} {_fmt(total)}")
+            lines.append(f"{self.name}_count{self._label_str(lv)} {_fmt(cumulative)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """A gauge set by the code (inc/dec/set), or computed at scrape time by function (-> value or {labelvalues: value})."""
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 function: Optional[Callable[[], Any]] = None, registry: Optional["MetricsRegistry"] = None):
+        self.function = function
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self.labels().dec(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def _samples(self) -> List[str]:
+        if self.function is None:
+            values = {lv: child.value() for lv, child in list(self._children.items())}
+        else:
+            result = self.function()
+            values = result if isinstance(result, dict) else {(): result}
+        return [
+            f"{self.name}{self._label_str(lv if isinstance(lv, tuple) else (lv,))} {_fmt(value)}"
+            for lv, value in values.items() if value is not None
+        ]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered.")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            try:
+                lines.extend(metric.render())
+            except Exception as e: # A failing scrape-time gauge must not take the endpoint down
+                lines.append(f"# {metric.name} unavailable: {e}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+REGISTRY = MetricsRegistry()
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+# --- Speech-to-text ---
+STT_DECODE_SECONDS = Histogram("stt_audio_decode_seconds", "Decoding uploaded audio into a Whisper input array.")
+STT_TRANSCRIBE_SECONDS = Histogram("stt_transcribe_seconds", "Whisper transcription of one utterance (incl. batching wait).")
+
+# --- LLM ---
+PROMPT_BUILD_SECONDS = Histogram("prompt_build_seconds", "Building a turn's prompt (history window + prompt cache).")
+LLM_PREFILL_SECONDS = Histogram(
+    "llm_prefill_seconds", "Time to the first generated token (batch queue + prompt prefill).", ["path"]
+)
+LLM_DECODE_SECONDS = Histogram("llm_decode_seconds", "Time from the first to the last generated token.", ["path"])
+LLM_PROMPT_TOKENS = Histogram("llm_prompt_tokens", "Prompt length in tokens.", buckets=TOKEN_BUCKETS)
+LLM_GENERATED_TOKENS = Counter("llm_generated_tokens_total", "Tokens generated.")
+LLM_TOKENS_PER_SECOND = Histogram("llm_decode_tokens_per_second", "Decode throughput of one generation.", buckets=RATE_BUCKETS)
+LLM_BATCH_SIZE = Histogram("llm_decode_batch_size", "Sequences decoded together per batch step.", buckets=(1, 2, 4, 8, 16, 32, 64))
+
+# --- Text-to-speech ---
+TTS_SYNTHESIS_SECONDS = Histogram("tts_synthesis_seconds", "pyttsx3 synthesis of one text (cache misses only).")
+
+# --- API ---
+HANDLER_SECONDS = Histogram("http_handler_seconds", "Call router handler latency (streams: until the last byte).", ["handler"])
+WS_SEND_SECONDS = Histogram("websocket_send_seconds", "Sending one WebSocket message.", ["kind"])
+WS_TURN_SECONDS = Histogram("websocket_turn_seconds", "Answering one WebSocket customer turn, transcript to last audio.")
+THREADPOOL_WAIT_SECONDS = Histogram("threadpool_queue_wait_seconds", "Wait for a threadpool thread before blocking work starts.", ["pool"])
+WEBSOCKET_CONNECTIONS = Gauge("websocket_connections", "Open voice WebSocket connections.")
+
+
+def timed_call(histogram_child: _HistogramChild, fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Wraps fn for a thread pool so the time between submission and start is observed as queue wait."""
+    submitted = time.perf_counter()
+    def run(*args: Any, **kwargs: Any) -> Any:
+        histogram_child.observe(time.perf_counter() - submitted)
+        return fn(*args, **kwargs)
+    return run
@@ -0,0 +1,75 @@
+# app/core/prompt_cache.py
+from typing import Callable, List, Optional, Tuple
+
+from app.prompts.sales_prompts import (
+    QWEN_SYSTEM_PROMPT_PREFIX, QWEN_ASSISTANT_HEADER, HISTORY_SUMMARY_MESSAGE_TEMPLATE, SYSTEM_ROLE,
+    format_qwen_message, qwen_role_for_speaker,
+)
+from app.schemas.conversation import Utterance
+
+TokenEncoder = Callable[[str], List[int]]
+UtteranceTokenIds = Callable[[Utterance], Optional[List[int]]]
+
+
+class CallPromptCache:
+    """
+    The Qwen prompt of one call, built append-only: system prompt, the rolling summary (if any) and the
+    formatted utterances history[start:covered], as text and (with an encoder) token ids. Each turn only
+    formats the utterances added since the previous one, and their ids come from the per-utterance cache
+    (utterance_ids). Every segment starts with an <|im_start|> special token, so concatenating segment ids
+    yields the ids of the whole string. The cache is rebuilt only when the history window moves
+    (new summary or budget trimming).
+    """
+    def __init__(
+        self, start: int, summary: Optional[str], prefix_ids: Optional[List[int]],
+        encode: Optional[TokenEncoder], utterance_ids: Optional[UtteranceTokenIds] = None,
+    ):
+        self.start = start
+        self.summary = summary
+        self.covered = start
+        self._utterance_ids = utterance_ids if encode is not None else None
+        self._parts: List[str] = [QWEN_SYSTEM_PROMPT_PREFIX]
+        self.token_ids: Optional[List[int]] = None
+        self._header_ids: Optional[List[int]] = None
+        if encode is not None and prefix_ids is not None:
+            self.token_ids = list(prefix_ids)
+            self._header_ids = encode(QWEN_ASSISTANT_HEADER)
+        if summary:
+            segment = format_qwen_message(SYSTEM_ROLE, HISTORY_SUMMARY_MESSAGE_TEMPLATE.format(summary=summary))
+            self._parts.append(segment)
+            if self.token_ids is not None:
+                self.token_ids.extend(encode(segment)) # type: ignore[misc]
+        self._text = "".join(self._parts)
+
+    def matches(self, start: int, summary: Optional[str]) -> bool:
+        return self.start == start and self.summary == summary
+
+    def _ids_for(self, utterance: Utterance) -> Optional[List[int]]:
+        return self._utterance_ids(utterance) if self._utterance_ids is not None else None
+
+    def extend(self, history: List[Utterance]):
+        """Appends the utterances added since the last call (history only ever grows)."""
+        if len(history) <= self.covered:
+            return
+        first_new = len(self._parts)
+        for utterance in history[self.covered:]:
+            self._parts.append(format_qwen_message(qwen_role_for_speaker(utterance.speaker), utterance.text))
+            if self.token_ids is not None:
+                utterance_ids = self._ids_for(utterance)
+                if utterance_ids is None: # Tokenizer went away; continue text-only
+                    self.token_ids = None
+                else:
+                    self.token_ids.extend(utterance_ids)
+        self.covered = len(history)
+        self._text += "".join(self._parts[first_new:])
+
+    def prompt_for(self, customer_utterance: Utterance) -> Tuple[str, Optional[List[int]]]:
+        """Prompt text (and ids) for the next reply; the customer's utterance itself is not cached yet."""
+        text = self._text + format_qwen_message(qwen_role_for_speaker(customer_utterance.speaker), customer_utterance.text)
+        text += QWEN_ASSISTANT_HEADER
+        if self.token_ids is None:
+            return text, None
+        customer_ids = self._ids_for(customer_utterance)
+        if customer_ids is None:
+            return text, None
+        return text, self.token_ids + customer_ids + self._header_ids # type: ignore[operator]
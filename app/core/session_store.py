@@ -0,0 +1,612 @@
+# app/core/session_store.py
+import os
+import queue
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings, logger
+from app.schemas.conversation import CallSession, Utterance
+
+EvictionCallback = Callable[[CallSession, str], None] # (session, reason) with reason "expired" or "evicted"
+
+
+class SessionStore(ABC):
+    """
+    Where ConversationManager keeps its CallSessions. Sessions are mutated in place by the manager and
+    handed back through put() after every change, so backends that persist can write them out there.
+    """
+    @abstractmethod
+    def get(self, call_id: str) -> Optional[CallSession]:
+        ...
+
+    @abstractmethod
+    def put(self, session: CallSession):
+        ...
+
+    @abstractmethod
+    def delete(self, call_id: str) -> Optional[CallSession]:
+        ...
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    def __contains__(self, call_id: str) -> bool:
+        return self.get(call_id) is not None
+
+    def stats(self) -> Dict[str, int]:
+        return {"sessions": len(self)}
+
+    # Turn leases order a call's turns across processes sharing the store; a private store has nothing to order.
+    shared = False
+
+    def claim_turn(self, call_id: str, owner: str, lease_s: float) -> bool:
+        """Takes the call's turn for owner unless another owner holds an unexpired lease."""
+        return True
+
+    def release_turn(self, call_id: str, owner: str):
+        pass
+
+    def shutdown(self):
+        pass
+
+
+class InMemorySessionStore(SessionStore):
+    """
+    Process-local store: an LRU of sessions ordered by last access.
+    - Sessions idle for longer than idle_ttl_s (active calls) or ended_ttl_s (ended calls) expire.
+    - Above max_sessions the least recently used ended calls are evicted first; only if every session
+      is still active does the oldest active call go, so the cap is a hard one.
+    - A daemon thread sweeps expired sessions every sweep_interval_s; lookups also skip expired ones.
+    on_evict is called (outside the store lock) for every session that leaves because of TTL or the cap,
+    e.g. to release the call's KV-cache.
+    """
+    def __init__(
+        self, idle_ttl_s: float, ended_ttl_s: float, max_sessions: int,
+        sweep_interval_s: float = 30.0, on_evict: Optional[EvictionCallback] = None,
+    ):
+        self.idle_ttl_s = idle_ttl_s
+        self.ended_ttl_s = ended_ttl_s
+        self.max_sessions = max(1, max_sessions)
+        self.on_evict = on_evict
+        self._sessions: "OrderedDict[str, CallSession]" = OrderedDict()
+        self._last_access: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted_ended = 0
+        self.evicted_active = 0
+        self._stop_event = threading.Event()
+        self._sweeper: Optional[threading.Thread] = None
+        if sweep_interval_s > 0:
+            self._sweeper = threading.Thread(
+                target=self._sweep_loop, args=(sweep_interval_s,), name="session-store-sweeper", daemon=True
+            )
+            self._sweeper.start()
+
+    def _ttl_for(self, session: CallSession) -> float:
+        return self.idle_ttl_s if session.is_active else self.ended_ttl_s
+
+    def _is_expired(self, call_id: str, session: CallSession, now: float) -> bool:
+        ttl = self._ttl_for(session)
+        return ttl > 0 and now - self._last_access[call_id] > ttl
+
+    def _remove_locked(self, call_id: str) -> CallSession:
+        self._last_access.pop(call_id, None)
+        return self._sessions.pop(call_id)
+
+    def _notify_evicted(self, removed: List[CallSession], reason: str):
+        if not self.on_evict:
+            return
+        for session in removed:
+            try:
+                self.on_evict(session, reason)
+            except Exception as e:
+                logger.error(f"Session store eviction hook failed for call {session.call_id}: {e}")
+
+    def get(self, call_id: str) -> Optional[CallSession]:
+        expired_session = None
+        with self._lock:
+            session = self._sessions.get(call_id)
+            if session is not None and self._is_expired(call_id, session, time.monotonic()):
+                expired_session = self._remove_locked(call_id)
+                self.expired += 1
+                session = None
+            if session is None:
+                self.misses += 1
+            else:
+                self._sessions.move_to_end(call_id)
+                self._last_access[call_id] = time.monotonic()
+                self.hits += 1
+        if expired_session is not None:
+            self._notify_evicted([expired_session], "expired")
+        return session
+
+    def put(self, session: CallSession):
+        evicted: List[CallSession] = []
+        with self._lock:
+            if session.call_id not in self._sessions:
+                self.created += 1
+            self._sessions[session.call_id] = session
+            self._sessions.move_to_end(session.call_id)
+            self._last_access[session.call_id] = time.monotonic()
+            if len(self._sessions) > self.max_sessions:
+                evicted = self._evict_over_cap_locked(keep=session.call_id)
+        self._notify_evicted(evicted, "evicted")
+
+    def _evict_over_cap_locked(self, keep: str) -> List[CallSession]:
+        evicted: List[CallSession] = []
+        overflow = len(self._sessions) - self.max_sessions
+        # Ended calls first, least recently used first (OrderedDict iterates oldest -> newest).
+        for call_id in [cid for cid, s in self._sessions.items() if not s.is_active][:overflow]:
+            evicted.append(self._remove_locked(call_id))
+            self.evicted_ended += 1
+        overflow -= len(evicted)
+        if overflow > 0:
+            for call_id in [cid for cid in self._sessions if cid != keep][:overflow]:
+                logger.warning(f"Session store full ({self.max_sessions}); evicting active call {call_id}.")
+                evicted.append(self._remove_locked(call_id))
+                self.evicted_active += 1
+        return evicted
+
+    def delete(self, call_id: str) -> Optional[CallSession]:
+        with self._lock:
+            if call_id not in self._sessions:
+                return None
+            return self._remove_locked(call_id)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def sweep(self) -> int:
+        """Drops every expired session. Returns how many were removed."""
+        now = time.monotonic()
+        with self._lock:
+            expired_ids = [cid for cid, s in self._sessions.items() if self._is_expired(cid, s, now)]
+            removed = [self._remove_locked(cid) for cid in expired_ids]
+            self.expired += len(removed)
+        if removed:
+            logger.info(f"Session store swept {len(removed)} expired session(s); {len(self)} remain.")
+        self._notify_evicted(removed, "expired")
+        return len(removed)
+
+    def _sweep_loop(self, interval_s: float):
+        while not self._stop_event.wait(interval_s):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Session store sweep failed: {e}", exc_info=True)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            active = sum(1 for s in self._sessions.values() if s.is_active)
+            return {
+                "sessions": len(self._sessions), "active": active, "ended": len(self._sessions) - active,
+                "max_sessions": self.max_sessions, "created": self.created, "hits": self.hits,
+                "misses": self.misses, "expired": self.expired,
+                "evicted_ended": self.evicted_ended, "evicted_active": self.evicted_active,
+            }
+
+    def shutdown(self):
+        self._stop_event.set()
+        if self._sweeper is not None:
+            self._sweeper.join(timeout=5)
+
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS call_sessions (
+    call_id TEXT PRIMARY KEY,
+    customer_name TEXT NOT NULL,
+    phone_number TEXT NOT NULL,
+    current_stage TEXT NOT NULL,
+    is_active INTEGER NOT NULL,
+    start_time TEXT NOT NULL,
+    end_time TEXT,
+    kv_cache_key TEXT,
+    greeting_template_index INTEGER,
+    updated_at REAL NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0,
+    history_summary TEXT,
+    summary_upto INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_call_sessions_active ON call_sessions (is_active, updated_at);
+CREATE TABLE IF NOT EXISTS utterances (
+    call_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    speaker TEXT NOT NULL,
+    text TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    PRIMARY KEY (call_id, seq)
+);
+CREATE TABLE IF NOT EXISTS call_turns (
+    call_id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    lease_until REAL NOT NULL
+);
+"""
+_UPSERT_SESSION_SQL = (
+    "INSERT OR REPLACE INTO call_sessions (call_id, customer_name, phone_number, current_stage, is_active, "
+    "start_time, end_time, kv_cache_key, greeting_template_index, updated_at, version, history_summary, summary_upto) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+_UPSERT_UTTERANCE_SQL = "INSERT OR REPLACE INTO utterances (call_id, seq, speaker, text, timestamp) VALUES (?, ?, ?, ?, ?)"
+_SELECT_SESSION_SQL = (
+    "SELECT call_id, customer_name, phone_number, current_stage, is_active, start_time, end_time, "
+    "kv_cache_key, greeting_template_index, version, history_summary, summary_upto FROM call_sessions WHERE call_id = ?"
+)
+_CLAIM_TURN_SQL = (
+    "INSERT INTO call_turns (call_id, owner, lease_until) VALUES (?, ?, ?) ON CONFLICT(call_id) DO UPDATE SET "
+    "owner = excluded.owner, lease_until = excluded.lease_until WHERE call_turns.lease_until < ?"
+)
+_ADDED_COLUMNS = [
+    ("version", "INTEGER NOT NULL DEFAULT 0"),
+    ("history_summary", "TEXT"),
+    ("summary_upto", "INTEGER NOT NULL DEFAULT 0"),
+]
+_WRITER_STOP = object()
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Sessions and transcripts persisted in SQLite (WAL mode), so calls survive a restart.
+    - put() only snapshots the session (plus the utterances added since the last put) onto a queue; a
+      write-behind thread commits queued snapshots in batched transactions, so a turn never waits on an fsync.
+    - Reads go through an InMemorySessionStore hot cache (idle/ended TTLs, max_sessions); misses fall back
+      to the database. Ended calls that leave the hot cache stay readable from disk.
+    - An active call whose idle TTL runs out is marked ended in the database and reported to on_evict.
+    - On startup, active calls touched within the idle TTL are loaded back into the hot cache; older
+      ones are marked ended.
+    With shared=True several processes use the same database file (multi-worker deployments): put()
+    returns only once its snapshot is committed, and a hot-cache hit is re-validated against the row's
+    version so a turn served by another worker is never answered from a stale copy. A call's turns are
+    ordered across processes by a lease row in call_turns (claim_turn / release_turn), taken before the
+    session is loaded and dropped after the turn's put(); a lease left by a crashed process expires.
+    """
+    def __init__(
+        self, path: str, idle_ttl_s: float, ended_ttl_s: float, max_sessions: int,
+        sweep_interval_s: float = 30.0, on_evict: Optional[EvictionCallback] = None,
+        flush_interval_s: float = 0.05, max_batch: int = 256, shared: bool = False,
+    ):
+        self.path = path
+        self.shared = shared
+        self.idle_ttl_s = idle_ttl_s
+        self.on_evict = on_evict
+        self.flush_interval_s = 0.0 if shared else flush_interval_s # Shared writers must not sit on a commit
+        self.max_batch = max(1, max_batch)
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._read_conn = self._connect()
+        self._read_conn.executescript(_SQLITE_SCHEMA)
+        columns = [r[1] for r in self._read_conn.execute("PRAGMA table_info(call_sessions)")]
+        for column, definition in _ADDED_COLUMNS: # Databases created by older versions
+            if column not in columns:
+                self._read_conn.execute(f"ALTER TABLE call_sessions ADD COLUMN {column} {definition}")
+        self._read_lock = threading.Lock()
+        self._lock = threading.RLock() # Guards the per-call bookkeeping below and the order of queued writes
+        self._committed = threading.Condition(self._lock) # Notified by the writer after each batch
+        self._queued_seq = 0 # Sequence number of the last queued write
+        self._committed_seq = 0 # Every write up to this sequence number has been committed (or failed)
+        self._pending_seq: Dict[str, int] = {} # call_id -> sequence number of its last uncommitted write
+        self._persisted_utterances: Dict[str, int] = {} # call_id -> utterances already queued for writing
+        self._known_versions: Dict[str, int] = {} # call_id -> row version of the hot-cache copy
+        self._write_queue: "queue.Queue[Any]" = queue.Queue()
+        self.db_hits = 0
+        self.db_misses = 0
+        self.queued_writes = 0
+        self.committed_batches = 0
+        self.write_errors = 0
+        self.recovered = 0
+        self.stale_reloads = 0
+        self._hot = InMemorySessionStore(
+            idle_ttl_s=idle_ttl_s, ended_ttl_s=ended_ttl_s, max_sessions=max_sessions,
+            sweep_interval_s=0, on_evict=self._on_hot_evicted,
+        )
+        self._writer = threading.Thread(target=self._writer_loop, name="session-store-writer", daemon=True)
+        self._writer.start()
+        self._recover_active_calls()
+        self._stop_event = threading.Event()
+        self._sweeper: Optional[threading.Thread] = None
+        if sweep_interval_s > 0:
+            self._sweeper = threading.Thread(
+                target=self._sweep_loop, args=(sweep_interval_s,), name="session-store-sweeper", daemon=True
+            )
+            self._sweeper.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL") # WAL + NORMAL: durable across app crashes, fsync only at checkpoints
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    @staticmethod
+    def _session_row(session: CallSession, version: int) -> Tuple[Any, ...]:
+        return (
+            session.call_id, session.customer_name, session.phone_number, session.current_stage,
+            int(session.is_active), session.start_time.isoformat(),
+            session.end_time.isoformat() if session.end_time else None,
+            session.kv_cache_key, session.greeting_template_index, time.time(), version,
+            session.history_summary, session.summary_upto,
+        )
+
+    def _enqueue_snapshot(self, session: CallSession) -> int:
+        # Snapshot on the caller's thread: the session object keeps changing after put() returns.
+        # Turn, summary and sweeper threads all put; the lock keeps versions and utterance offsets
+        # per call monotonic and in the same order as the queue.
+        with self._lock:
+            first_new = self._persisted_utterances.get(session.call_id, 0)
+            history = session.history
+            utterance_rows = [
+                (session.call_id, seq, u.speaker, u.text, u.timestamp.isoformat())
+                for seq, u in enumerate(history[first_new:], start=first_new)
+            ]
+            self._persisted_utterances[session.call_id] = len(history)
+            version = self._known_versions.get(session.call_id, 0) + 1
+            self._known_versions[session.call_id] = version
+            return self._enqueue(session.call_id, ("upsert", self._session_row(session, version), utterance_rows))
+
+    def _enqueue(self, call_id: Optional[str], write: Tuple[Any, ...]) -> int:
+        with self._lock:
+            self._queued_seq += 1
+            if call_id is not None:
+                self._pending_seq[call_id] = self._queued_seq
+            self._write_queue.put((self._queued_seq, call_id, write))
+            self.queued_writes += 1
+            return self._queued_seq
+
+    def _writer_loop(self):
+        conn = self._connect()
+        stopping = False
+        while not stopping:
+            item = self._write_queue.get()
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval_s
+            while len(batch) < self.max_batch and batch[-1] is not _WRITER_STOP:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._write_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            stopping = batch[-1] is _WRITER_STOP
+            entries = [entry for entry in batch if entry is not _WRITER_STOP]
+            try:
+                if entries:
+                    self._commit_batch(conn, [write for _, _, write in entries])
+            except Exception as e:
+                self.write_errors += 1
+                logger.error(f"Session store failed to write {len(entries)} queued update(s): {e}", exc_info=True)
+            finally:
+                if entries:
+                    self._mark_committed(entries)
+        conn.close()
+
+    def _commit_batch(self, conn: sqlite3.Connection, writes: List[Tuple[Any, ...]]):
+        conn.execute("BEGIN")
+        try:
+            for kind, *payload in writes:
+                if kind == "upsert":
+                    session_row, utterance_rows = payload
+                    conn.execute(_UPSERT_SESSION_SQL, session_row)
+                    if utterance_rows:
+                        conn.executemany(_UPSERT_UTTERANCE_SQL, utterance_rows)
+                elif kind == "delete":
+                    conn.execute("DELETE FROM utterances WHERE call_id = ?", payload)
+                    conn.execute("DELETE FROM call_turns WHERE call_id = ?", payload)
+                    conn.execute("DELETE FROM call_sessions WHERE call_id = ?", payload)
+                elif kind == "expire_before":
+                    conn.execute(
+                        "UPDATE call_sessions SET is_active = 0, end_time = ? WHERE is_active = 1 AND updated_at < ?",
+                        payload,
+                    )
+            conn.execute("COMMIT")
+            self.committed_batches += 1
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _mark_committed(self, entries: List[Tuple[int, Optional[str], Tuple[Any, ...]]]):
+        # A failed batch is logged and counted, not retried, so waiters are released either way.
+        with self._lock:
+            self._committed_seq = entries[-1][0]
+            for seq, call_id, _ in entries:
+                if call_id is not None and self._pending_seq.get(call_id) == seq:
+                    del self._pending_seq[call_id]
+            self._committed.notify_all()
+
+    def _wait_committed(self, seq: int):
+        with self._lock:
+            self._committed.wait_for(lambda: self._committed_seq >= seq)
+
+    def _wait_for_call(self, call_id: str):
+        """Blocks until the last write queued for this call is committed; returns at once if none is queued."""
+        with self._lock:
+            seq = self._pending_seq.get(call_id)
+        if seq is not None:
+            self._wait_committed(seq)
+
+    def flush(self):
+        """Blocks until every write queued so far is committed (writes queued meanwhile are not waited for)."""
+        with self._lock:
+            seq = self._queued_seq
+        self._wait_committed(seq)
+
+    def _load(self, call_id: str) -> Optional[CallSession]:
+        with self._read_lock:
+            row = self._read_conn.execute(_SELECT_SESSION_SQL, (call_id,)).fetchone()
+            if row is None:
+                return None
+            utterance_rows = self._read_conn.execute(
+                "SELECT speaker, text, timestamp FROM utterances WHERE call_id = ? ORDER BY seq", (call_id,)
+            ).fetchall()
+        session = CallSession(
+            call_id=row[0], customer_name=row[1], phone_number=row[2], current_stage=row[3],
+            is_active=bool(row[4]), start_time=datetime.fromisoformat(row[5]),
+            end_time=datetime.fromisoformat(row[6]) if row[6] else None,
+            kv_cache_key=row[7], greeting_template_index=row[8], history_summary=row[10], summary_upto=row[11],
+            history=[Utterance(speaker=s, text=t, timestamp=datetime.fromisoformat(ts)) for s, t, ts in utterance_rows],
+        )
+        with self._lock:
+            self._persisted_utterances[call_id] = len(session.history)
+            self._known_versions[call_id] = row[9]
+        return session
+
+    def _stored_version(self, call_id: str) -> Optional[int]:
+        with self._read_lock:
+            row = self._read_conn.execute("SELECT version FROM call_sessions WHERE call_id = ?", (call_id,)).fetchone()
+        return row[0] if row else None
+
+    def _recover_active_calls(self):
+        with self._read_lock:
+            if self.idle_ttl_s > 0:
+                cutoff = time.time() - self.idle_ttl_s
+                call_ids = [r[0] for r in self._read_conn.execute(
+                    "SELECT call_id FROM call_sessions WHERE is_active = 1 AND updated_at >= ? ORDER BY updated_at", (cutoff,)
+                )]
+            else:
+                call_ids = [r[0] for r in self._read_conn.execute(
+                    "SELECT call_id FROM call_sessions WHERE is_active = 1 ORDER BY updated_at"
+                )]
+        if self.idle_ttl_s > 0:
+            # Calls idle past the TTL while the service was down are over.
+            self._enqueue(None, ("expire_before", datetime.now().isoformat(), time.time() - self.idle_ttl_s))
+        for call_id in call_ids:
+            session = self._load(call_id)
+            if session is not None:
+                self._hot.put(session)
+                self.recovered += 1
+        if call_ids:
+            logger.info(f"Session store recovered {self.recovered} active call(s) from {self.path}.")
+
+    def _on_hot_evicted(self, session: CallSession, reason: str):
+        with self._lock:
+            self._persisted_utterances.pop(session.call_id, None)
+            known_version = self._known_versions.pop(session.call_id, 0)
+        if self.shared and (self._stored_version(session.call_id) or 0) > known_version:
+            return # Another worker has been serving this call; it is not idle
+        if reason == "expired" and session.is_active:
+            # Idle timeout of a live call: report it, then record the call as ended.
+            if self.on_evict:
+                try:
+                    self.on_evict(session, reason)
+                except Exception as e:
+                    logger.error(f"Session store eviction hook failed for call {session.call_id}: {e}")
+            session.is_active = False
+            session.end_time = datetime.now()
+            with self._lock:
+                self._known_versions[session.call_id] = known_version
+                self._enqueue_snapshot(session)
+                self._persisted_utterances.pop(session.call_id, None)
+                self._known_versions.pop(session.call_id, None)
+
+    def get(self, call_id: str) -> Optional[CallSession]:
+        session = self._hot.get(call_id)
+        if session is not None:
+            if not self.shared:
+                return session
+            stored_version = self._stored_version(call_id)
+            with self._lock:
+                known_version = self._known_versions.get(call_id, 0)
+            if stored_version is None or stored_version <= known_version:
+                return session
+            self.stale_reloads += 1
+        else:
+            self._wait_for_call(call_id) # A snapshot of this call may still be queued
+        session = self._load(call_id)
+        if session is None:
+            self.db_misses += 1
+            return None
+        self.db_hits += 1
+        self._hot.put(session)
+        return session
+
+    def put(self, session: CallSession):
+        seq = self._enqueue_snapshot(session)
+        self._hot.put(session)
+        if self.shared:
+            self._wait_committed(seq)
+
+    def delete(self, call_id: str) -> Optional[CallSession]:
+        session = self._hot.delete(call_id)
+        with self._lock:
+            self._persisted_utterances.pop(call_id, None)
+            self._known_versions.pop(call_id, None)
+            self._enqueue(call_id, ("delete", call_id))
+        return session
+
+    def claim_turn(self, call_id: str, owner: str, lease_s: float) -> bool:
+        # Committed at once on the autocommit read connection, not queued behind the write-behind batch.
+        now = time.time()
+        with self._read_lock:
+            cursor = self._read_conn.execute(_CLAIM_TURN_SQL, (call_id, owner, now + lease_s, now))
+        return cursor.rowcount == 1
+
+    def release_turn(self, call_id: str, owner: str):
+        with self._read_lock:
+            self._read_conn.execute("DELETE FROM call_turns WHERE call_id = ? AND owner = ?", (call_id, owner))
+
+    def __len__(self) -> int:
+        self.flush()
+        with self._read_lock:
+            return self._read_conn.execute("SELECT COUNT(*) FROM call_sessions").fetchone()[0]
+
+    def _sweep_loop(self, interval_s: float):
+        while not self._stop_event.wait(interval_s):
+            try:
+                self._hot.sweep()
+            except Exception as e:
+                logger.error(f"Session store sweep failed: {e}", exc_info=True)
+
+    def stats(self) -> Dict[str, int]:
+        stats = {f"hot_{k}": v for k, v in self._hot.stats().items()}
+        stats.update({
+            "db_hits": self.db_hits, "db_misses": self.db_misses, "queued_writes": self.queued_writes,
+            "pending_writes": self._write_queue.qsize(), "committed_batches": self.committed_batches,
+            "write_errors": self.write_errors, "recovered": self.recovered, "stale_reloads": self.stale_reloads,
+        })
+        return stats
+
+    def shutdown(self):
+        self._stop_event.set()
+        if self._sweeper is not None:
+            self._sweeper.join(timeout=5)
+        self._write_queue.put(_WRITER_STOP)
+        self._writer.join(timeout=30)
+        with self._read_lock:
+            self._read_conn.close()
+
+
+def create_session_store(on_evict: Optional[EvictionCallback] = None) -> SessionStore:
+    """Builds the backend selected by SESSION_STORE_BACKEND."""
+    backend = settings.SESSION_STORE_BACKEND.lower()
+    if backend == "sqlite":
+        return SQLiteSessionStore(
+            path=settings.SESSION_SQLITE_PATH,
+            idle_ttl_s=settings.SESSION_IDLE_TTL_SECONDS,
+            ended_ttl_s=settings.SESSION_ENDED_TTL_SECONDS,
+            max_sessions=settings.SESSION_MAX_SESSIONS,
+            sweep_interval_s=settings.SESSION_SWEEP_INTERVAL_SECONDS,
+            on_evict=on_evict,
+            flush_interval_s=settings.SESSION_SQLITE_FLUSH_MS / 1000.0,
+            shared=settings.SESSION_SHARED,
+        )
+    if backend != "memory":
+        logger.warning(f"Unknown SESSION_STORE_BACKEND '{settings.SESSION_STORE_BACKEND}'; using the in-memory store.")
+    if settings.WORKER_COUNT > 1:
+        logger.warning("WORKER_COUNT > 1 with the in-memory session store: calls are only visible to the worker that started them.")
+    return InMemorySessionStore(
+        idle_ttl_s=settings.SESSION_IDLE_TTL_SECONDS,
+        ended_ttl_s=settings.SESSION_ENDED_TTL_SECONDS,
+        max_sessions=settings.SESSION_MAX_SESSIONS,
+        sweep_interval_s=settings.SESSION_SWEEP_INTERVAL_SECONDS,
+        on_evict=on_evict,
+    )
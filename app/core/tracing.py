@@ -0,0 +1,275 @@
+# app/core/tracing.py
+"""
+Per-turn tracing: a root span per customer turn with child spans for its pipeline stages (STT, admission,
+prompt build, generation, TTS), exported as Chrome trace / Perfetto JSON or OTLP JSON to a local file.
+
+Only sampled turns record anything (TRACING_SAMPLE_RATE, capped at TRACING_MAX_TRACES_PER_SECOND); for
+the others every span call returns a shared no-op span. The current span lives in a contextvar, so tasks
+created inside a turn inherit it. Finished traces are written by a background thread, never on the event loop.
+"""
+import contextvars
+import json
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.core.config import settings, logger
+
+
+class _Trace:
+    def __init__(self):
+        self.trace_id = random.getrandbits(128)
+        self.spans: List["Span"] = []
+        self.root: Optional["Span"] = None
+
+
+class Span:
+    recording = True
+
+    def __init__(self, trace: _Trace, name: str, parent: Optional["Span"], start_ns: Optional[int], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = random.getrandbits(64)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.start_ns = start_ns if start_ns is not None else time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        trace.spans.append(self)
+
+    def set(self, **attributes: Any):
+        self.attributes.update(attributes)
+
+    def end(self, end_ns: Optional[int] = None):
+        if self.end_ns is None:
+            self.end_ns = end_ns if end_ns is not None else time.time_ns()
+            if self is self.trace.root:
+                get_tracer().export(self.trace)
+
+
+class _NoopSpan:
+    """Stands in for spans of unsampled turns; every operation is free."""
+    recording = False
+
+    def set(self, **attributes: Any):
+        pass
+
+    def end(self, end_ns: Optional[int] = None):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Tracer:
+    def __init__(self):
+        self.enabled = settings.TRACING_ENABLED and settings.TRACING_SAMPLE_RATE > 0
+        self.sample_rate = settings.TRACING_SAMPLE_RATE
+        self.max_per_second = settings.TRACING_MAX_TRACES_PER_SECOND
+        self.export_format = settings.TRACING_EXPORT_FORMAT.lower()
+        self._rate_lock = threading.Lock()
+        self._window_start = 0.0
+        self._window_count = 0
+        self.sampled = 0
+        self.dropped = 0 # Traces lost because the export queue was full
+        self.path: Optional[str] = None
+        self._queue: "queue.Queue[Optional[_Trace]]" = queue.Queue(maxsize=256)
+        self._writer: Optional[threading.Thread] = None
+        self._next_lane = 1
+        if self.enabled:
+            if self.export_format not in ("chrome", "otlp"):
+                logger.warning(f"Unknown TRACING_EXPORT_FORMAT '{self.export_format}'; using 'chrome'.")
+                self.export_format = "chrome"
+            suffix = "trace.json" if self.export_format == "chrome" else "otlp.jsonl"
+            os.makedirs(settings.TRACING_EXPORT_DIR, exist_ok=True)
+            self.path = os.path.join(settings.TRACING_EXPORT_DIR, f"turns-{os.getpid()}.{suffix}")
+            self._writer = threading.Thread(target=self._write_loop, name="trace-writer", daemon=True)
+            self._writer.start()
+            logger.info(f"Tracing {self.sample_rate:.0%} of turns (max {self.max_per_second}/s) to {self.path}.")
+
+    def _should_sample(self) -> bool:
+        if not self.enabled or random.random() >= self.sample_rate:
+            return False
+        if self.max_per_second <= 0:
+            return True
+        with self._rate_lock:
+            now = time.monotonic()
+            if now - self._window_start >= 1.0:
+                self._window_start, self._window_count = now, 0
+            if self._window_count >= self.max_per_second:
+                return False
+            self._window_count += 1
+        return True
+
+    @contextmanager
+    def turn(self, name: str, start_ns: Optional[int] = None, **attributes: Any) -> Iterator[Any]:
+        """Root span of one customer turn (sampled or not); spans opened inside become its children."""
+        if not self._should_sample():
+            yield NOOP_SPAN
+            return
+        self.sampled += 1
+        trace = _Trace()
+        root = Span(trace, name, None, start_ns, attributes)
+        trace.root = root
+        token = _current_span.set(root)
+        try:
+            yield root
+        except BaseException as e:
+            root.set(error=type(e).__name__)
+            raise
+        finally:
+            _current_span.reset(token)
+            root.end()
+
+    def start_span(self, name: str, start_ns: Optional[int] = None, **attributes: Any) -> Any:
+        """
+        A child of the current span that is not made current; the caller ends it. For async generators,
+        whose body may resume in another context, and for stages timed after the fact.
+        """
+        parent = _current_span.get()
+        if parent is None:
+            return NOOP_SPAN
+        return Span(parent.trace, name, parent, start_ns, attributes)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Any]:
+        parent = _current_span.get()
+        if parent is None:
+            yield NOOP_SPAN
+            return
+        span = Span(parent.trace, name, parent, None, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set(error=type(e).__name__)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+    def annotate_turn(self, **attributes: Any):
+        """Adds attributes to the root span of the current turn (e.g. its index, known once the session is loaded)."""
+        span = _current_span.get()
+        if span is not None and span.trace.root is not None:
+            span.trace.root.set(**attributes)
+
+    def export(self, trace: _Trace):
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def _write_loop(self):
+        while True:
+            trace = self._queue.get()
+            if trace is None:
+                return
+            try:
+                self._write(trace)
+            except Exception as e:
+                logger.error(f"Writing trace to {self.path} failed: {e}")
+
+    def _write(self, trace: _Trace):
+        spans = [s for s in trace.spans if s.end_ns is not None] # Spans still open when the turn ended are left out
+        if self.export_format == "chrome":
+            lines = [json.dumps(event, default=str) + ",\n" for event in self._chrome_events(spans, trace)]
+        else:
+            lines = [json.dumps(self._otlp_request(spans, trace)) + "\n"]
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0 # type: ignore[arg-type]
+        with open(self.path, "a", encoding="utf-8") as f: # type: ignore[arg-type]
+            if new_file and self.export_format == "chrome":
+                f.write("[\n") # JSON array format; the closing bracket is optional for chrome://tracing and Perfetto
+            f.writelines(lines)
+
+    def _chrome_events(self, spans: List[Span], trace: _Trace) -> List[Dict[str, Any]]:
+        # Complete ("X") events on one track must nest, so concurrent siblings (e.g. TTS of one sentence
+        # while the next is generated) are spread over extra tracks of the same turn.
+        pid = os.getpid()
+        lanes: List[List[Span]] = [] # Per track, the stack of spans still open at the current start time
+        lane_ids: List[int] = []
+        events: List[Dict[str, Any]] = []
+        root_attrs = trace.root.attributes if trace.root else {}
+        label = f"call {root_attrs.get('call_id', '?')} turn {root_attrs.get('turn_index', '?')}"
+        for span in sorted(spans, key=lambda s: (s.start_ns, -(s.end_ns or 0))):
+            for index, stack in enumerate(lanes):
+                while stack and stack[-1].end_ns <= span.start_ns: # type: ignore[operator]
+                    stack.pop()
+                if not stack or stack[-1].end_ns >= span.end_ns: # type: ignore[operator]
+                    break
+            else:
+                lanes.append([])
+                lane_ids.append(self._next_lane)
+                events.append({
+                    "ph": "M", "name": "thread_name", "pid": pid, "tid": self._next_lane,
+                    "args": {"name": label if len(lanes) == 1 else f"{label} (concurrent)"},
+                })
+                self._next_lane += 1
+                index = len(lanes) - 1
+            lanes[index].append(span)
+            events.append({
+                "name": span.name, "cat": "turn", "ph": "X", "pid": pid, "tid": lane_ids[index],
+                "ts": span.start_ns / 1000, "dur": (span.end_ns - span.start_ns) / 1000, # type: ignore[operator]
+                "args": span.attributes,
+            })
+        return events
+
+    def _otlp_request(self, spans: List[Span], trace: _Trace) -> Dict[str, Any]:
+        # One ExportTraceServiceRequest per line, as written by the OpenTelemetry collector's file exporter.
+        return {"resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": settings.APP_TITLE, "process.pid": os.getpid()})},
+            "scopeSpans": [{
+                "scope": {"name": "app.core.tracing"},
+                "spans": [{
+                    "traceId": f"{trace.trace_id:032x}",
+                    "spanId": f"{span.span_id:016x}",
+                    **({"parentSpanId": f"{span.parent_id:016x}"} if span.parent_id is not None else {}),
+                    "name": span.name,
+                    "kind": 2 if span.parent_id is None else 1, # SERVER for the turn, INTERNAL for its stages
+                    "startTimeUnixNano": str(span.start_ns),
+                    "endTimeUnixNano": str(span.end_ns),
+                    "attributes": _otlp_attributes(span.attributes),
+                } for span in spans],
+            }],
+        }]}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled, "sample_rate": self.sample_rate, "sampled": self.sampled,
+            "dropped": self.dropped, "pending": self._queue.qsize(), "path": self.path,
+        }
+
+    def shutdown(self):
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join(timeout=5)
+            self._writer = None
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    encoded = []
+    for key, value in attributes.items():
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            typed = {"boolValue": value}
+        elif isinstance(value, int):
+            typed = {"intValue": str(value)} # 64-bit integers are strings in OTLP JSON
+        elif isinstance(value, float):
+            typed = {"doubleValue": value}
+        else:
+            typed = {"stringValue": str(value)}
+        encoded.append({"key": key, "value": typed})
+    return encoded
+
+
+tracer_instance: Optional[Tracer] = None
+def get_tracer() -> Tracer:
+    global tracer_instance
+    if tracer_instance is None:
+        tracer_instance = Tracer()
+    return tracer_instance
@@ -1,17 +1,33 @@
 # app/main.py
-from fastapi import FastAPI, HTTPException, status
+from fastapi import FastAPI, HTTPException, Request, status
+from fastapi.responses import JSONResponse, Response
 from app.api.v1.endpoints import call_router
 from app.core.config import settings, logger
 from app.services.llm_service import get_llm_service # LLMService import might not be directly needed here if only using get_llm_service
 from app.services.tts_service import get_tts_service
 from app.services.stt_service import get_stt_service
+from app.services.model_worker_pool import get_model_worker_pool, get_tts_worker_pool, shutdown_model_worker_pool
+from app.prompts.sales_prompts import FIXED_AGENT_PHRASES
+from app.services.greeting_cache import get_greeting_cache
+from app.core import conversation_manager
+from app.core.admission import AdmissionRejected, get_admission_controller
+from app.core.metrics import REGISTRY, CONTENT_TYPE_LATEST, Gauge
+from app.core import tracing
+from fastapi.concurrency import run_in_threadpool
 from contextlib import asynccontextmanager
+from typing import Dict, Optional
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Application startup...")
     logger.info(f"App Title: {settings.APP_TITLE}, Version: {settings.APP_VERSION}")
+
+    # Start the worker processes before anything else spawns threads (required for fork).
+    if settings.TTS_WORKERS > 0:
+        get_tts_worker_pool()
+    if settings.MODEL_WORKERS > 0:
+        get_model_worker_pool()
     
     llm_service = get_llm_service() 
     if not llm_service: # Should ideally not happen if get_llm_service returns an instance
@@ -21,13 +37,35 @@ async def lifespan(app: FastAPI):
     else:
         logger.info(f"LLM Service (local mode) successfully initialized and ready.")
     
-    get_tts_service() 
+    tts_service = get_tts_service() 
     get_stt_service() 
     logger.info("TTS and STT services initialization attempted.")
+    if tts_service and tts_service.audio_cache is not None:
+        await run_in_threadpool(tts_service.voice_settings) # Resolved once here, not on the event loop by the first request
+    if settings.GREETING_MODE == "template":
+        greeting_cache = get_greeting_cache()
+        if not await run_in_threadpool(greeting_cache.ensure_templates):
+            greeting_cache.start_background_retry()
+    if tts_service and settings.TTS_CACHE_PREWARM:
+        await run_in_threadpool(tts_service.prewarm_cache, FIXED_AGENT_PHRASES)
+        if settings.GREETING_MODE == "template" and settings.GREETING_AUDIO_NAME_SLOT:
+            await run_in_threadpool(greeting_cache.prewarm_audio, tts_service)
     
     yield
     
     logger.info("Application shutdown...")
+    if conversation_manager.conversation_manager_instance:
+        conversation_manager.conversation_manager_instance.shutdown()
+    get_greeting_cache().shutdown()
+    llm_service = get_llm_service()
+    if llm_service:
+        llm_service.shutdown()
+    stt_service = get_stt_service()
+    if stt_service:
+        stt_service.shutdown()
+    shutdown_model_worker_pool()
+    if tracing.tracer_instance:
+        tracing.tracer_instance.shutdown() # Writes the traces still queued
 
 app = FastAPI(
     title=settings.APP_TITLE,
@@ -35,6 +73,15 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    # Shed load fast: the client learns when to retry instead of timing out in a queue.
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": f"Server busy ({exc.stage}: {exc.reason}). Retry in {exc.retry_after_s}s."},
+        headers={"Retry-After": str(exc.retry_after_s)},
+    )
+
 app.include_router(call_router.router, prefix="/api/v1/sales", tags=["Sales Agent Calls"])
 
 @app.get("/health", tags=["Health Check"], status_code=status.HTTP_200_OK)
@@ -52,13 +99,48 @@ async def health_check():
     else: 
         llm_service_status_detail = "llm_service_not_instantiated_by_get_llm_service" # Should be rare
             
-    return {
+    health = {
         "status": "ok" if llm_ok else "issues_present", # Overall status reflects LLM readiness
         "app_title": settings.APP_TITLE,
         "app_version": settings.APP_VERSION,
         "llm_service_status": "ok" if llm_ok else "critical_issue",
         "llm_service_details": llm_service_status_detail
     }
+    model_worker_pool = get_model_worker_pool()
+    if model_worker_pool:
+        health["model_workers"] = model_worker_pool.stats()
+    tts_service = get_tts_service()
+    if tts_service and tts_service.audio_cache:
+        health["tts_cache"] = tts_service.audio_cache.stats()
+    if settings.WORKER_COUNT > 1:
+        health["worker"] = {"index": settings.WORKER_INDEX, "count": settings.WORKER_COUNT}
+    health["admission"] = get_admission_controller().stats()
+    if settings.TRACING_ENABLED:
+        health["tracing"] = tracing.get_tracer().stats()
+    if conversation_manager.conversation_manager_instance:
+        health["sessions"] = conversation_manager.conversation_manager_instance.sessions.stats()
+    return health
+
+def _active_calls() -> Optional[int]:
+    manager = conversation_manager.conversation_manager_instance
+    if manager is None:
+        return None
+    stats = manager.sessions.stats()
+    return stats.get("active", stats.get("hot_active"))
+
+def _admission_stage_values(key: str) -> Dict[str, int]:
+    return {name: stats[key] for name, stats in get_admission_controller().stats().items() if isinstance(stats, dict)}
+
+# Computed when /metrics is scraped, from the same state /health reports.
+Gauge("active_calls", "Active calls in this process's session store.", function=_active_calls)
+Gauge("admission_in_flight", "Requests running per admission stage.", ["stage"], function=lambda: _admission_stage_values("in_flight"))
+Gauge("admission_queued", "Requests waiting per admission stage.", ["stage"], function=lambda: _admission_stage_values("queued"))
+
+@app.get("/metrics", tags=["Health Check"], include_in_schema=False)
+async def metrics():
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Metrics are disabled (METRICS_ENABLED=false).")
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE_LATEST)
 
 @app.get("/", tags=["Root"], include_in_schema=False)
 async def read_root():
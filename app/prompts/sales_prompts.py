@@ -2,7 +2,7 @@
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, BaseMessage # Added BaseMessage
 from app.core.config import settings, logger
-from typing import List, Union
+from typing import List, Optional, Union
 
 # --- Pre-format COURSE_BENEFITS (remains the same logic) ---
 try:
@@ -54,67 +54,85 @@ Conversation Stages and Actions:
 5.  Closing: Attempt to schedule a follow-up or get a soft commitment. If not interested, politely end the call.
 """
 
+# The rendered system block exactly as format_lc_messages_to_qwen_prompt_string emits it.
+# Every sales prompt starts with this string, so its KV-cache can be computed once and shared.
+QWEN_SYSTEM_PROMPT_PREFIX = f"{IM_START_TOKEN}{SYSTEM_ROLE}\n{QWEN_SYSTEM_PROMPT_CONTENT.strip()}{IM_END_TOKEN}\n"
+
+# --- Fixed agent phrases (spoken verbatim, so their TTS audio is cached and pre-warmed at startup) ---
+LLM_INITIALIZING_MESSAGE = "Hello, our AI system is currently initializing. Please try again shortly."
+LLM_UNAVAILABLE_MESSAGE = "Our AI system is currently having issues. Please try again later."
+GREETING_UNAVAILABLE_MESSAGE = "Hello! Our AI is temporarily unavailable (LLM not ready)."
+CALL_NOT_FOUND_MESSAGE = "Call not found or has ended."
+PROCESSING_ERROR_MESSAGE = "I encountered an issue processing your request."
+REPROMPT_MESSAGE = "I'm sorry, I didn't quite catch that. Could you please repeat?"
+BUSY_MESSAGE = "Sorry, give me just a moment. Could you say that again in a few seconds?"
+
+FIXED_AGENT_PHRASES = [
+    REPROMPT_MESSAGE,
+    BUSY_MESSAGE,
+    PROCESSING_ERROR_MESSAGE,
+    LLM_UNAVAILABLE_MESSAGE,
+    LLM_INITIALIZING_MESSAGE,
+    GREETING_UNAVAILABLE_MESSAGE,
+    CALL_NOT_FOUND_MESSAGE,
+]
+
 MAIN_SALES_CHAT_PROMPT = ChatPromptTemplate.from_messages([
     SystemMessage(content=QWEN_SYSTEM_PROMPT_CONTENT),
     MessagesPlaceholder(variable_name="chat_history"),
     ("human", "{customer_input}")
 ])
 
+QWEN_ASSISTANT_HEADER = f"{IM_START_TOKEN}{ASSISTANT_ROLE}\n" # Opens the turn the model completes
+_LC_TYPE_TO_QWEN_ROLE = {"system": SYSTEM_ROLE, "human": USER_ROLE, "ai": ASSISTANT_ROLE}
+_SPEAKER_TO_QWEN_ROLE = {"agent": ASSISTANT_ROLE, "customer": USER_ROLE}
+
+def format_qwen_message(role: str, content: str) -> str:
+    return f"{IM_START_TOKEN}{role}\n{content.strip()}{IM_END_TOKEN}\n"
+
+def qwen_role_for_speaker(speaker: str) -> str:
+    return _SPEAKER_TO_QWEN_ROLE[speaker]
+
 def format_lc_messages_to_qwen_prompt_string(
     messages: List[BaseMessage] # Expecting a list of BaseMessage instances
 ) -> str:
     logger.debug(f"format_lc_messages_to_qwen_prompt_string received {len(messages)} messages.")
-    prompt_str = ""
+    parts: List[str] = []
     for i, msg in enumerate(messages):
-        role = ""
-        content_text = "" # Initialize to empty string
-
-        # Ensure msg is a BaseMessage and extract content and role
-        if isinstance(msg, SystemMessage):
-            role = SYSTEM_ROLE
-            content_text = msg.content
-        elif isinstance(msg, HumanMessage):
-            role = USER_ROLE
-            content_text = msg.content
-        elif isinstance(msg, AIMessage):
-            role = ASSISTANT_ROLE
-            content_text = msg.content
-        else:
-            logger.error(f"Message at index {i} is not a recognized LangChain BaseMessage type. Type: {type(msg)}, Value: {msg}")
-            # Optionally, try to infer if it's a dict with 'type' and 'content'
-            if hasattr(msg, 'type') and hasattr(msg, 'content'): # Check for attributes directly
-                try:
-                    msg_type_attr = getattr(msg, 'type')
-                    msg_content_attr = getattr(msg, 'content')
-                    if isinstance(msg_content_attr, str):
-                        content_text = msg_content_attr
-                        if msg_type_attr == "system": role = SYSTEM_ROLE
-                        elif msg_type_attr == "human": role = USER_ROLE
-                        elif msg_type_attr == "ai": role = ASSISTANT_ROLE
-                        else:
-                            logger.warning(f"Inferred message type '{msg_type_attr}' not standard.")
-                            continue # Skip if role can't be determined
-                    else:
-                        logger.warning(f"Inferred content for message at index {i} is not a string: {type(msg_content_attr)}")
-                        continue
-                except Exception as e_infer:
-                    logger.error(f"Error trying to infer role/content for message at index {i}: {e_infer}")
-                    continue
-            else:
-                continue # Skip this malformed message
-
-        if role and isinstance(content_text, str): # Ensure content is a string after extraction
-            prompt_str += f"{IM_START_TOKEN}{role}\n{content_text.strip()}{IM_END_TOKEN}\n"
-        elif role and not isinstance(content_text, str): # Should be caught by previous checks, but safeguard
+        # BaseMessage subclasses (and message-like objects) expose their kind as .type: "system", "human" or "ai".
+        role = _LC_TYPE_TO_QWEN_ROLE.get(getattr(msg, "type", None))
+        content_text = getattr(msg, "content", None)
+        if role is None:
+            logger.warning(f"Could not determine role for message at index {i}. Type: {type(msg)}")
+            continue
+        if not isinstance(content_text, str):
             logger.warning(f"Content of message (role: {role}) at index {i} is not a string: {type(content_text)}")
-        elif not role:
-            logger.warning(f"Could not determine role for message at index {i}.")
-
-
-    prompt_str += f"{IM_START_TOKEN}{ASSISTANT_ROLE}\n" # Prompt for assistant's response
+            continue
+        parts.append(format_qwen_message(role, content_text))
+    parts.append(QWEN_ASSISTANT_HEADER) # Prompt for assistant's response
+    prompt_str = "".join(parts)
     logger.debug(f"Formatted Qwen prompt string (first 200 chars): {prompt_str[:200]}")
     return prompt_str
 
+HISTORY_SUMMARY_MESSAGE_TEMPLATE = "Summary of the earlier part of this call:\n{summary}"
+
+def get_qwen_history_summary_prompt_string(previous_summary: Optional[str], transcript: str) -> str:
+    system_instruction = (
+        "You summarize sales calls for Alex, an AI Sales Agent from Edvantage AI. "
+        "Write a brief factual summary (at most 4 sentences) of what the customer said about their needs, "
+        "interest, objections and any agreements, so the call can continue without the full transcript. "
+        "Output only the summary."
+    )
+    user_instruction = ""
+    if previous_summary:
+        user_instruction += f"Summary so far:\n{previous_summary.strip()}\n\n"
+    user_instruction += f"Next part of the call:\n{transcript.strip()}\n\nWrite the updated summary."
+    return (
+        f"{IM_START_TOKEN}{SYSTEM_ROLE}\n{system_instruction}{IM_END_TOKEN}\n"
+        f"{IM_START_TOKEN}{USER_ROLE}\n{user_instruction}{IM_END_TOKEN}\n"
+        f"{IM_START_TOKEN}{ASSISTANT_ROLE}\n"
+    )
+
 def get_qwen_initial_greeting_prompt_string(customer_name: str) -> str:
     system_instruction = (
         f"You are Alex, a friendly AI Sales Agent from Edvantage AI. "
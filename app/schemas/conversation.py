@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 from typing import List, Dict, Any, Literal, Optional
 import uuid
 from datetime import datetime
@@ -7,6 +7,8 @@ class Utterance(BaseModel):
     speaker: Literal["agent", "customer"]
     text: str
     timestamp: datetime = Field(default_factory=datetime.now)
+    _token_count: Optional[int] = PrivateAttr(default=None) # Prompt tokens incl. chat markup, counted once (not persisted)
+    _token_ids: Optional[List[int]] = PrivateAttr(default=None) # Its Qwen message tokenized once (not persisted)
 
 class CallSession(BaseModel):
     call_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -17,6 +19,11 @@ class CallSession(BaseModel):
     is_active: bool = True
     start_time: datetime = Field(default_factory=datetime.now)
     end_time: Optional[datetime] = None
+    kv_cache_key: Optional[str] = None # Handle to this call's KV-cache inside the LLM service
+    greeting_template_index: Optional[int] = None # Greeting template the first message was rendered from
+    history_summary: Optional[str] = None # Rolling summary of history[:summary_upto]
+    summary_upto: int = 0 # Utterances covered by history_summary; later ones are sent verbatim
+    _prompt_cache: Any = PrivateAttr(default=None) # CallPromptCache: this call's append-only Qwen prompt (not persisted)
 
     def add_utterance(self, speaker: Literal["agent", "customer"], text: str):
         self.history.append(Utterance(speaker=speaker, text=text))
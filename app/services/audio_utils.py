@@ -0,0 +1,205 @@
+# app/services/audio_utils.py
+import io
+import math
+import struct
+import wave
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import logger
+
+try:
+    import soundfile as sf
+    SOUNDFILE_AVAILABLE = True
+except (ImportError, OSError): # OSError: libsndfile missing
+    sf = None
+    SOUNDFILE_AVAILABLE = False
+
+WHISPER_SAMPLE_RATE = 16000
+
+_WAVE_FORMAT_PCM = 0x0001
+_WAVE_FORMAT_IEEE_FLOAT = 0x0003
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+# Anti-aliasing filter of resample_audio: a Kaiser-windowed sinc, the same design scipy.signal.resample_poly uses.
+_RESAMPLE_HALF_WIDTH = 10 # Filter half-length, in periods of the lower of the two rates
+_RESAMPLE_KAISER_BETA = 5.0
+_RESAMPLE_BLOCK = 16384 # Output samples computed per vectorized step (bounds the temporary arrays)
+
+
+def pcm16_bytes_to_float32(data: bytes) -> np.ndarray:
+    """Little-endian signed 16-bit PCM (mono) -> float32 in [-1, 1]."""
+    usable = len(data) - (len(data) % 2)
+    return np.frombuffer(data[:usable], dtype="<i2").astype(np.float32) / 32768.0
+
+
+def _pcm_to_float32(raw: bytes, bits_per_sample: int, is_float: bool) -> Optional[np.ndarray]:
+    if is_float:
+        dtype = {32: "<f4", 64: "<f8"}.get(bits_per_sample)
+        if dtype is None:
+            return None
+        return np.frombuffer(raw[:len(raw) - len(raw) % (bits_per_sample // 8)], dtype=dtype).astype(np.float32)
+    if bits_per_sample == 8: # 8-bit WAV is unsigned
+        return (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    if bits_per_sample == 16:
+        return pcm16_bytes_to_float32(raw)
+    if bits_per_sample == 24:
+        usable = len(raw) - len(raw) % 3
+        triplets = np.frombuffer(raw[:usable], dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        values = triplets[:, 0] | (triplets[:, 1] << 8) | (triplets[:, 2] << 16)
+        values = np.where(values >= 1 << 23, values - (1 << 24), values)
+        return values.astype(np.float32) / float(1 << 23)
+    if bits_per_sample == 32:
+        return np.frombuffer(raw[:len(raw) - len(raw) % 4], dtype="<i4").astype(np.float32) / 2147483648.0
+    return None
+
+
+def decode_wav_bytes(data: bytes) -> Optional[Tuple[np.ndarray, int]]:
+    """
+    Parses a RIFF/WAVE container in memory. Returns (mono float32 samples, sample_rate),
+    or None if the bytes are not a WAV this parser understands (PCM 8/16/24/32-bit or float).
+    """
+    if len(data) < 12 or data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        return None
+    fmt = None
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id = data[offset:offset + 4]
+        chunk_size = struct.unpack_from("<I", data, offset + 4)[0]
+        body_start = offset + 8
+        if chunk_id == b"fmt " and chunk_size >= 16:
+            format_tag, channels, sample_rate, _, _, bits_per_sample = struct.unpack_from("<HHIIHH", data, body_start)
+            if format_tag == _WAVE_FORMAT_EXTENSIBLE and chunk_size >= 40:
+                format_tag = struct.unpack_from("<H", data, body_start + 24)[0] # First field of the sub-format GUID
+            fmt = (format_tag, channels, sample_rate, bits_per_sample)
+        elif chunk_id == b"data":
+            if fmt is None:
+                return None
+            format_tag, channels, sample_rate, bits_per_sample = fmt
+            if format_tag not in (_WAVE_FORMAT_PCM, _WAVE_FORMAT_IEEE_FLOAT) or channels < 1:
+                return None
+            # Streaming writers leave the size as 0 or 0xFFFFFFFF; take everything that is there.
+            body_end = len(data) if chunk_size in (0, 0xFFFFFFFF) else min(len(data), body_start + chunk_size)
+            samples = _pcm_to_float32(data[body_start:body_end], bits_per_sample, format_tag == _WAVE_FORMAT_IEEE_FLOAT)
+            if samples is None:
+                return None
+            if channels > 1:
+                samples = samples[:len(samples) - len(samples) % channels].reshape(-1, channels).mean(axis=1)
+            return samples.astype(np.float32, copy=False), sample_rate
+        offset = body_start + chunk_size + (chunk_size & 1) # Chunks are word-aligned
+    return None
+
+
+def wav_duration_seconds(data: bytes) -> Optional[float]:
+    """Duration of a RIFF/WAVE clip from its header alone (no sample decoding); None if it is not a WAV."""
+    if len(data) < 12 or data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        return None
+    block_align = sample_rate = 0
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id = data[offset:offset + 4]
+        chunk_size = struct.unpack_from("<I", data, offset + 4)[0]
+        if chunk_id == b"fmt " and chunk_size >= 16:
+            _, _, sample_rate, _, block_align = struct.unpack_from("<HHIIH", data, offset + 8)
+        elif chunk_id == b"data":
+            if not block_align or not sample_rate:
+                return None
+            data_size = len(data) - offset - 8 if chunk_size in (0, 0xFFFFFFFF) else min(chunk_size, len(data) - offset - 8)
+            return data_size / block_align / sample_rate
+        offset += 8 + chunk_size + (chunk_size & 1)
+    return None
+
+
+@lru_cache(maxsize=16)
+def _polyphase_filter(up: int, down: int) -> Tuple[np.ndarray, int]:
+    """
+    Low-pass FIR for resampling by up/down (cutoff at the lower Nyquist frequency), split into its up
+    polyphase branches: row p holds taps p, p + up, p + 2*up, ... Also returns the filter's delay in taps.
+    """
+    max_rate = max(up, down)
+    half_len = _RESAMPLE_HALF_WIDTH * max_rate
+    n = np.arange(2 * half_len + 1, dtype=np.float64) - half_len
+    taps = np.sinc(n / max_rate) * np.kaiser(2 * half_len + 1, _RESAMPLE_KAISER_BETA)
+    taps *= up / taps.sum() # Unity gain at DC after zero-stuffing by up
+    branch_len = math.ceil(taps.size / up)
+    padded = np.zeros(branch_len * up)
+    padded[:taps.size] = taps
+    return padded.reshape(branch_len, up).T.astype(np.float32), half_len
+
+
+def resample_audio(samples: np.ndarray, orig_sr: int, target_sr: int = WHISPER_SAMPLE_RATE) -> np.ndarray:
+    """
+    In-process polyphase resampling (equivalent to scipy.signal.resample_poly): content above the lower
+    Nyquist frequency is filtered out instead of folding back into the speech band (e.g. 44.1 kHz -> 16 kHz).
+    Only the filter taps that meet real input samples are evaluated, so the cost is ~20 taps per output sample.
+    """
+    if orig_sr == target_sr or samples.size == 0:
+        return samples
+    divisor = math.gcd(orig_sr, target_sr)
+    up, down = target_sr // divisor, orig_sr // divisor
+    branches, delay = _polyphase_filter(up, down)
+    branch_len = branches.shape[1]
+    source = np.asarray(samples, dtype=np.float32)
+    out_length = -(-source.size * up // down) # ceil
+    output = np.empty(out_length, dtype=np.float32)
+    tap_offsets = np.arange(branch_len)
+    for start in range(0, out_length, _RESAMPLE_BLOCK):
+        # Output m sits at position m*down + delay of the zero-stuffed input; branch p = position % up
+        # multiplies the input samples at (position - p) / up, going backwards one sample per tap.
+        positions = np.arange(start, min(start + _RESAMPLE_BLOCK, out_length), dtype=np.int64) * down + delay
+        phases = positions % up
+        indices = ((positions - phases) // up)[:, None] - tap_offsets[None, :]
+        valid = (indices >= 0) & (indices < source.size)
+        gathered = np.where(valid, source[np.clip(indices, 0, source.size - 1)], 0.0)
+        output[start:start + positions.size] = np.einsum("ij,ij->i", gathered, branches[phases])
+    return output
+
+
+def decode_audio_for_whisper(data: bytes) -> Optional[np.ndarray]:
+    """
+    Decodes audio bytes straight into the float32 16 kHz mono array Whisper expects, without temp files
+    or ffmpeg. Handles WAV natively and other libsndfile formats (FLAC, OGG) when soundfile is installed.
+    Returns None when the container needs ffmpeg.
+    """
+    decoded = decode_wav_bytes(data)
+    if decoded is None and SOUNDFILE_AVAILABLE:
+        try:
+            samples, sample_rate = sf.read(io.BytesIO(data), dtype="float32", always_2d=True)
+            decoded = (samples.mean(axis=1).astype(np.float32), sample_rate)
+        except Exception:
+            decoded = None
+    if decoded is None:
+        return None
+    samples, sample_rate = decoded
+    if sample_rate <= 0:
+        logger.warning(f"Audio reports an invalid sample rate ({sample_rate}); leaving it to ffmpeg.")
+        return None
+    return resample_audio(samples, sample_rate, WHISPER_SAMPLE_RATE)
+
+
+def concatenate_wav_bytes(parts: List[bytes]) -> Optional[bytes]:
+    """Joins WAV clips into one WAV. Returns None if the clips differ in channels, sample width or rate."""
+    params = None
+    frames: List[bytes] = []
+    try:
+        for part in parts:
+            with wave.open(io.BytesIO(part), "rb") as reader:
+                part_params = (reader.getnchannels(), reader.getsampwidth(), reader.getframerate())
+                if params is None:
+                    params = part_params
+                elif part_params != params:
+                    return None
+                frames.append(reader.readframes(reader.getnframes()))
+    except (wave.Error, EOFError) as e:
+        logger.warning(f"Could not concatenate WAV clips: {e}")
+        return None
+    if params is None:
+        return None
+    output = io.BytesIO()
+    with wave.open(output, "wb") as writer:
+        writer.setnchannels(params[0])
+        writer.setsampwidth(params[1])
+        writer.setframerate(params[2])
+        writer.writeframes(b"".join(frames))
+    return output.getvalue()
@@ -0,0 +1,330 @@
+# app/services/fake_backends.py
+"""
+Deterministic stand-ins for Qwen, Whisper and pyttsx3, selected with BACKEND_MODE=fake.
+
+They load nothing and answer after delays derived from a fixed latency profile (FAKE_* settings), so
+the API layer, the schedulers around the models and the session store can be benchmarked without the
+models' cost or noise. The same input always gives the same output and the same delay. Everything around
+the models stays real: admission control, caches, worker pools, threadpools and metrics.
+"""
+import asyncio
+import io
+import re
+import threading
+import time
+import wave
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from app.core.config import settings, logger
+from app.core.metrics import LLM_PROMPT_TOKENS, THREADPOOL_WAIT_SECONDS, timed_call
+from app.prompts.sales_prompts import IM_END_TOKEN, QWEN_SYSTEM_PROMPT_PREFIX
+from app.services.llm_service import (
+    LocalQwenLLM, QwenCallKVCache, _QwenPrefixCacheEntry, _record_generation_metrics,
+)
+from app.services.model_worker_pool import get_model_worker_pool
+
+# fp32 KV-cache of Qwen2-0.5B per token: 24 layers x (key + value) x 2 KV heads x 64 dims x 4 bytes.
+_QWEN_KV_BYTES_PER_TOKEN = 24 * 2 * 2 * 64 * 4
+_FAKE_VOCAB_SIZE = 151643
+_FAKE_TTS_SAMPLE_RATE = 22050 # What pyttsx3 (eSpeak) writes
+
+# Special tokens, then words with their leading space, then punctuation and whitespace (roughly BPE-sized).
+_TOKEN_PATTERN = re.compile(r"<\|[a-z_]+\|>| ?[A-Za-z]{1,6}| ?\d{1,3}| ?[^\sA-Za-z\d]|\s+")
+_GREETING_PATTERN = re.compile(r"The customer's name is (.+?)\. Generate Alex's initial greeting now\.")
+_SUMMARY_MARKER = "Write the updated summary."
+
+_FAKE_REPLY_SENTENCES = [
+    "That's a great question, and I'm glad you asked.",
+    "The {course} runs for {duration} and is fully online, so you can learn around your schedule.",
+    "You'll build hands-on projects with LLMs, computer vision and MLOps that you can show to employers.",
+    "Right now we have a special price of {price_special} instead of {price_full}.",
+    "Many of our students join while working full time and spend about eight hours a week on it.",
+    "We also help with job placement once you've finished the course.",
+    "Would it help if I sent you the full syllabus by email?",
+    "What would you most like to get out of a course like this?",
+]
+_FAKE_GREETINGS = [
+    "Hi {name}, this is Alex from Edvantage AI. I'm calling about our {course}. Is now a good time to talk?",
+    "Hello {name}, Alex here from Edvantage AI. I wanted to tell you about our {course}. Do you have a couple of minutes?",
+    "Hi {name}, it's Alex with Edvantage AI, reaching out about our {course}. Is this an okay time for a quick chat?",
+    "Good day {name}, this is Alex from Edvantage AI. Could I take two minutes to tell you about our {course}?",
+]
+_FAKE_SUMMARY = "The customer is interested in the {course} and asked about its schedule and price. No commitment yet."
+_FAKE_TRANSCRIPTS = [
+    "Hi, yes, I have a few minutes.",
+    "How long does the course take?",
+    "What does it cost?",
+    "Can I do it while working full time?",
+    "Do you help with finding a job afterwards?",
+    "Okay, that sounds interesting. Please send me the details.",
+]
+
+
+def _scaled_seconds(seconds: float) -> float:
+    return max(0.0, seconds * settings.FAKE_LATENCY_SCALE)
+
+
+def _sleep_until(deadline: float):
+    remaining = deadline - time.perf_counter()
+    if remaining > 0:
+        time.sleep(remaining)
+
+
+def _course_fields() -> Dict[str, str]:
+    return {
+        "course": settings.COURSE_NAME, "duration": settings.COURSE_DURATION,
+        "price_full": settings.COURSE_PRICE_FULL, "price_special": settings.COURSE_PRICE_SPECIAL,
+    }
+
+
+# --- LLM ---
+class FakeQwenTokenizer:
+    """Splits text into roughly Qwen-sized pieces and hashes each piece to a stable id."""
+    pad_token_id = 0
+    eos_token_id = 1
+
+    def pieces(self, text: str) -> List[str]:
+        return _TOKEN_PATTERN.findall(text)
+
+    def encode(self, text: str) -> List[int]:
+        return [zlib.crc32(piece.encode("utf-8")) % _FAKE_VOCAB_SIZE for piece in self.pieces(text)]
+
+    def __call__(self, text: str, **kwargs: Any) -> Dict[str, List[int]]:
+        return {"input_ids": self.encode(text)}
+
+
+class _FakePrefixCacheEntry(_QwenPrefixCacheEntry):
+    """Token ids without tensors; nbytes is what Qwen's KV-cache would take, so QwenCallKVCache evicts alike."""
+    def __init__(self, token_ids: List[int]):
+        self.text = None
+        self.token_ids = token_ids
+        self.past = None
+        self.nbytes = len(token_ids) * _QWEN_KV_BYTES_PER_TOKEN
+
+    def cropped(self, length: int) -> "_FakePrefixCacheEntry":
+        return self if length >= len(self.token_ids) else _FakePrefixCacheEntry(self.token_ids[:length])
+
+
+class FakeQwenModel:
+    """
+    The latency profile of a generation: uncached prompt tokens at FAKE_LLM_PREFILL_TOKENS_PER_S, then
+    FAKE_LLM_DECODE_TOKENS_PER_S per sequence. Only FAKE_LLM_CONCURRENCY generations run at once (a batch,
+    or the generation threads); the others wait for a slot, as they would for the CPU.
+    """
+    def __init__(self):
+        concurrency = settings.FAKE_LLM_CONCURRENCY or (
+            settings.LLM_MAX_BATCH_SIZE if settings.LLM_BATCHING_ENABLED else settings.LLM_GENERATION_THREADS
+        )
+        self.concurrency = max(1, concurrency)
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        with self._slots:
+            yield
+
+    def prefill_seconds(self, uncached_tokens: int) -> float:
+        return _scaled_seconds(uncached_tokens / max(settings.FAKE_LLM_PREFILL_TOKENS_PER_S, 1e-6))
+
+    def token_seconds(self) -> float:
+        return _scaled_seconds(1.0 / max(settings.FAKE_LLM_DECODE_TOKENS_PER_S, 1e-6))
+
+    def reply_for(self, prompt_string: str, tokenizer: FakeQwenTokenizer) -> str:
+        """The reply to a prompt: a greeting, a summary, or sales sentences picked by the prompt's hash."""
+        greeting = _GREETING_PATTERN.search(prompt_string)
+        if greeting:
+            name = greeting.group(1)
+            template = _FAKE_GREETINGS[zlib.crc32(name.encode("utf-8")) % len(_FAKE_GREETINGS)]
+            return template.format(name=name, **_course_fields())
+        if _SUMMARY_MARKER in prompt_string:
+            return _FAKE_SUMMARY.format(**_course_fields())
+        start = zlib.crc32(prompt_string.encode("utf-8"))
+        sentences: List[str] = []
+        length = 0
+        for offset in range(len(_FAKE_REPLY_SENTENCES)):
+            sentence = _FAKE_REPLY_SENTENCES[(start + offset) % len(_FAKE_REPLY_SENTENCES)].format(**_course_fields())
+            sentences.append(sentence)
+            length += len(tokenizer.pieces(sentence)) + 1
+            if length >= settings.FAKE_LLM_REPLY_TOKENS:
+                break
+        return " ".join(sentences)
+
+
+class FakeQwenLLM(LocalQwenLLM):
+    """
+    LocalQwenLLM with FakeQwenModel in place of the transformers model. Prompt tokenization, prefix and
+    per-call cache selection, the generation threads and the worker pool path are the real ones.
+    """
+    @property
+    def _llm_type(self) -> str:
+        return "fake_qwen_llm"
+
+    def __init__(self, **kwargs: Any):
+        super(LocalQwenLLM, self).__init__(**kwargs) # Skips LocalQwenLLM.__init__, which loads the model
+        self.model_id = "fake"
+        self.tokenizer = FakeQwenTokenizer()
+        self.eos_token_ids = [self.tokenizer.eos_token_id]
+        self.system_prefix_ids = self.encode(QWEN_SYSTEM_PROMPT_PREFIX)
+        pool = get_model_worker_pool()
+        if pool is not None and pool.serves("llm"):
+            self.worker_pool = pool
+            logger.info("FakeQwenLLM: Generation runs in the model worker pool.")
+            return
+        self.model = FakeQwenModel()
+        if settings.LLM_PREFIX_CACHE_ENABLED:
+            self.system_prefix_cache = _FakePrefixCacheEntry(self.system_prefix_ids)
+        if settings.LLM_CALL_KV_CACHE_MAX_MB > 0:
+            self.call_kv_cache = QwenCallKVCache(settings.LLM_CALL_KV_CACHE_MAX_MB * 1024 * 1024)
+        self.generation_executor = ThreadPoolExecutor(
+            max_workers=max(self.model.concurrency, settings.LLM_GENERATION_THREADS), thread_name_prefix="llm-generate"
+        )
+        logger.info(
+            f"FakeQwenLLM ready: {settings.FAKE_LLM_DECODE_TOKENS_PER_S} tokens/s, "
+            f"{self.model.concurrency} concurrent generation(s), latency x{settings.FAKE_LATENCY_SCALE}."
+        )
+
+    def encode(self, text: str) -> List[int]:
+        return self.tokenizer.encode(text)
+
+    def _store_call_cache(self, cache_key: str, token_ids: List[int], past: Any):
+        self.call_kv_cache.put(cache_key, _FakePrefixCacheEntry(token_ids))
+
+    def _fake_generate(
+        self, prompt_string: str, max_tokens: int, cache_key: Optional[str] = None,
+        input_ids: Optional[List[int]] = None, on_text: Optional[Callable[[str], None]] = None,
+    ) -> str:
+        if input_ids is None:
+            input_ids = self._tokenize_prompt(prompt_string)
+        prefix = self._select_prefix(input_ids, cache_key)
+        pieces = self.tokenizer.pieces(self.model.reply_for(prompt_string, self.tokenizer))[:max_tokens]
+        LLM_PROMPT_TOKENS.observe(len(input_ids))
+        started = time.perf_counter()
+        first_token_at = None
+        with self.model.slot():
+            deadline = time.perf_counter() + self.model.prefill_seconds(len(input_ids) - (len(prefix.token_ids) if prefix else 0))
+            token_seconds = self.model.token_seconds()
+            for piece in pieces:
+                _sleep_until(deadline)
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                if on_text is not None:
+                    on_text(piece)
+                deadline += token_seconds
+        _record_generation_metrics("fake", started, first_token_at, len(pieces))
+        reply = "".join(pieces)
+        if cache_key is not None and self.call_kv_cache is not None:
+            self._store_call_cache(cache_key, input_ids + self.encode(reply), None)
+        return reply + IM_END_TOKEN
+
+    def _generate_raw_qwen_response(
+        self, prompt_string: str, max_tokens: int, cache_key: Optional[str] = None, streamer: Any = None,
+        input_ids: Optional[List[int]] = None,
+    ) -> str:
+        # Streaming goes through stream_raw_qwen_response / astream_raw_qwen_response, never a TextStreamer.
+        if self.worker_pool is not None:
+            return super()._generate_raw_qwen_response(prompt_string, max_tokens, cache_key, input_ids=input_ids)
+        return self._fake_generate(prompt_string, max_tokens, cache_key, input_ids)
+
+    def stream_raw_qwen_response(
+        self, prompt_string: str, max_tokens: int, cache_key: Optional[str] = None,
+        on_text: Optional[Callable[[str], None]] = None, input_ids: Optional[List[int]] = None,
+    ) -> str:
+        return self._fake_generate(prompt_string, max_tokens, cache_key, input_ids, on_text)
+
+    async def astream_raw_qwen_response(
+        self, prompt_string: str, max_tokens: int, cache_key: Optional[str] = None,
+        input_ids: Optional[List[int]] = None,
+    ) -> AsyncIterator[str]:
+        if self.worker_pool is not None:
+            async for text in super().astream_raw_qwen_response(prompt_string, max_tokens, cache_key, input_ids):
+                yield text
+            return
+        loop = asyncio.get_running_loop()
+        deltas: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+        def generate() -> str:
+            try:
+                return self.stream_raw_qwen_response(
+                    prompt_string, max_tokens, cache_key,
+                    on_text=lambda text: loop.call_soon_threadsafe(deltas.put_nowait, text), input_ids=input_ids,
+                )
+            finally:
+                loop.call_soon_threadsafe(deltas.put_nowait, None)
+        generation = loop.run_in_executor(
+            self.generation_executor, timed_call(THREADPOOL_WAIT_SECONDS.labels("llm-generate"), generate)
+        )
+        while True:
+            text = await deltas.get()
+            if text is None:
+                break
+            yield text
+        try:
+            await generation
+        except Exception as e:
+            raise RuntimeError(f"FakeQwenLLM streaming generation failed: {e}") from e
+
+
+# --- STT ---
+class FakeWhisperModel:
+    """
+    Answers whisper's transcribe() after FAKE_STT_BASE_MS plus FAKE_STT_REAL_TIME_FACTOR x the audio length,
+    with one of a few customer lines picked by the audio's hash (empty for silence).
+    """
+    sample_rate = 16000
+
+    def transcribe(self, audio: np.ndarray, **kwargs: Any) -> Dict[str, Any]:
+        duration_s = len(audio) / self.sample_rate
+        time.sleep(_scaled_seconds(settings.FAKE_STT_BASE_MS / 1000 + duration_s * settings.FAKE_STT_REAL_TIME_FACTOR))
+        if audio.size == 0 or float(np.sqrt(np.mean(np.square(audio, dtype=np.float64)))) < 1e-4:
+            return {"text": ""} # Silence, as whisper's no-speech check would report it
+        # Hash the samples at 16 bits, so the same clip gives the same transcript however it was decoded.
+        digest = zlib.crc32((np.clip(audio, -1.0, 1.0) * 32767).astype("<i2").tobytes())
+        return {"text": " " + _FAKE_TRANSCRIPTS[digest % len(_FAKE_TRANSCRIPTS)]}
+
+
+# --- TTS ---
+class FakeTTSEngine:
+    """
+    The parts of a pyttsx3 engine TTSService uses. runAndWait() takes FAKE_TTS_BASE_MS plus FAKE_TTS_MS_PER_CHAR
+    per character and writes 16-bit mono WAVs as long as speaking the text at FAKE_TTS_CHARS_PER_SECOND.
+    """
+    def __init__(self):
+        self._pending: List[tuple] = []
+        self._properties = {"voice": "fake", "rate": 200, "volume": 1.0}
+
+    def getProperty(self, name: str) -> Any:
+        return self._properties.get(name)
+
+    def setProperty(self, name: str, value: Any):
+        self._properties[name] = value
+
+    def say(self, text: str):
+        self._pending.append((text, None))
+
+    def save_to_file(self, text: str, filename: str):
+        self._pending.append((text, filename))
+
+    def runAndWait(self):
+        pending, self._pending = self._pending, []
+        for text, filename in pending:
+            time.sleep(_scaled_seconds((settings.FAKE_TTS_BASE_MS + len(text) * settings.FAKE_TTS_MS_PER_CHAR) / 1000))
+            if filename is not None:
+                with open(filename, "wb") as f:
+                    f.write(tone_wav(len(text) / max(settings.FAKE_TTS_CHARS_PER_SECOND, 1e-6)))
+
+
+def tone_wav(duration_s: float, sample_rate: int = _FAKE_TTS_SAMPLE_RATE) -> bytes:
+    """A quiet 220 Hz tone: loud enough for the VAD and FakeWhisperModel to treat it as speech, unlike silence."""
+    t = np.arange(int(duration_s * sample_rate)) / sample_rate
+    samples = (0.1 * np.sin(2 * np.pi * 220.0 * t) * 32767).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as writer:
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(sample_rate)
+        writer.writeframes(samples.tobytes())
+    return buffer.getvalue()
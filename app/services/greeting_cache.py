@@ -0,0 +1,210 @@
+# app/services/greeting_cache.py
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import List, Optional, Tuple
+
+from app.core.config import settings, logger
+from app.services.audio_utils import concatenate_wav_bytes
+from app.services.llm_service import LLMService, get_llm_service
+from app.services.tts_service import TTSService
+
+GREETING_NAME_PLACEHOLDER = "{customer_name}"
+# Greetings are generated for this stand-in name, which is then swapped for the placeholder.
+_TEMPLATE_SENTINEL_NAME = "Morgan"
+_HAS_WORDS_RE = re.compile(r"[A-Za-z0-9]")
+# Backoff of the background retry when templates could not be generated at startup.
+_RETRY_INITIAL_S = 5.0
+_RETRY_MAX_S = 300.0
+
+FALLBACK_GREETING_TEMPLATE = (
+    f"Hi {GREETING_NAME_PLACEHOLDER}, this is Alex from Edvantage AI. "
+    f"I'm calling to chat briefly about our {settings.COURSE_NAME}. Is now an okay time to talk for a couple of minutes?"
+)
+
+
+def course_config_fingerprint() -> str:
+    """Greeting templates depend only on the course settings and the model; a change invalidates them."""
+    payload = json.dumps({
+        "model": settings.LLM_MODEL_REPO_ID,
+        "course": [settings.COURSE_NAME, settings.COURSE_DURATION, settings.COURSE_PRICE_FULL,
+                   settings.COURSE_PRICE_SPECIAL, settings.COURSE_BENEFITS_RAW],
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class GreetingTemplateCache:
+    """
+    A small pool of name-agnostic greeting templates, generated by the LLM once per course configuration
+    (optionally persisted to GREETING_TEMPLATE_CACHE_PATH) and filled with the customer's name per call.
+    The template text around the name slot is synthesized once, so a greeting's audio only needs the name.
+    Templates are generated at startup; if that fails, one background thread retries with backoff while
+    render() keeps using the static fallback template. render() never waits for the LLM.
+    """
+    def __init__(self, llm_service: Optional[LLMService] = None, pool_size: int = 4):
+        self.llm_service = llm_service
+        self.pool_size = max(1, pool_size)
+        self.templates: List[str] = []
+        self.fingerprint: Optional[str] = None
+        self._next_index = 0
+        self._lock = threading.Lock() # Guards templates/fingerprint/_next_index; never held across generation
+        self._generate_lock = threading.Lock() # One load/generation at a time
+        self._retry_thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    def _load_from_disk(self, fingerprint: str) -> List[str]:
+        path = settings.GREETING_TEMPLATE_CACHE_PATH
+        if not path or not os.path.exists(path):
+            return []
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            return [t for t in stored.get(fingerprint, []) if GREETING_NAME_PLACEHOLDER in t]
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read greeting templates from {path}: {e}")
+            return []
+
+    def _save_to_disk(self, fingerprint: str, templates: List[str]):
+        path = settings.GREETING_TEMPLATE_CACHE_PATH
+        if not path:
+            return
+        try:
+            stored = {}
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    stored = json.load(f)
+            stored[fingerprint] = templates
+            tmp_path = f"{path}.part"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(stored, f, indent=2)
+            os.replace(tmp_path, path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not save greeting templates to {path}: {e}")
+
+    def _generate_templates(self) -> List[str]:
+        llm_service = self.llm_service or get_llm_service()
+        if not llm_service or not llm_service.is_ready():
+            return []
+        templates: List[str] = []
+        for _ in range(self.pool_size * 2): # Sampled generations; some come back unusable
+            greeting = llm_service.generate_initial_greeting(_TEMPLATE_SENTINEL_NAME).strip()
+            if greeting.count(_TEMPLATE_SENTINEL_NAME) != 1 or "{" in greeting or "}" in greeting:
+                continue # The name must appear exactly once so the slot is unambiguous
+            template = greeting.replace(_TEMPLATE_SENTINEL_NAME, GREETING_NAME_PLACEHOLDER)
+            if template not in templates:
+                templates.append(template)
+            if len(templates) >= self.pool_size:
+                break
+        return templates
+
+    def ensure_templates(self) -> bool:
+        """
+        Loads or generates the templates for the current course configuration (no-op once done).
+        Returns False if none are available yet, e.g. while the LLM is down.
+        """
+        fingerprint = course_config_fingerprint()
+        with self._generate_lock:
+            with self._lock:
+                if self.fingerprint == fingerprint and self.templates:
+                    return True
+            templates = self._load_from_disk(fingerprint)
+            source = "disk"
+            if not templates:
+                templates = self._generate_templates()
+                source = "LLM"
+                if templates:
+                    self._save_to_disk(fingerprint, templates)
+            if not templates:
+                # LLM unavailable or nothing usable: callers use the static template meanwhile.
+                logger.warning("No greeting templates could be generated; using the fallback template for now.")
+                return False
+            with self._lock:
+                self.templates, self.fingerprint = templates, fingerprint
+            logger.info(f"Greeting templates ready ({len(templates)} from {source}, config {fingerprint}).")
+            return True
+
+    def start_background_retry(self):
+        """Starts the retry thread unless it is already running; it stops once templates are ready."""
+        with self._lock:
+            if self.templates or self._stop_event.is_set():
+                return
+            if self._retry_thread is not None and self._retry_thread.is_alive():
+                return
+            self._retry_thread = threading.Thread(target=self._retry_loop, name="greeting-templates", daemon=True)
+            self._retry_thread.start()
+
+    def _retry_loop(self):
+        delay_s = _RETRY_INITIAL_S
+        while not self._stop_event.wait(delay_s):
+            try:
+                if self.ensure_templates():
+                    return
+            except Exception as e:
+                logger.error(f"Greeting template generation failed: {e}", exc_info=True)
+            delay_s = min(delay_s * 2, _RETRY_MAX_S)
+
+    def render(self, customer_name: str) -> Tuple[str, Optional[int]]:
+        """Returns (greeting, template_index); the index is None when the fallback template was used."""
+        with self._lock:
+            templates = self.templates
+            index = self._next_index % len(templates) if templates else 0
+            self._next_index += 1
+        if not templates:
+            self.start_background_retry()
+            return FALLBACK_GREETING_TEMPLATE.replace(GREETING_NAME_PLACEHOLDER, customer_name), None
+        return templates[index].replace(GREETING_NAME_PLACEHOLDER, customer_name), index
+
+    def shutdown(self):
+        self._stop_event.set()
+
+    def _template_pieces(self, template_index: int, customer_name: str, greeting_text: str) -> Optional[List[str]]:
+        templates = self.templates
+        if not (0 <= template_index < len(templates)):
+            return None
+        template = templates[template_index]
+        # The stored index may come from another process or an earlier run with a different pool.
+        if template.replace(GREETING_NAME_PLACEHOLDER, customer_name) != greeting_text:
+            return None
+        return template.split(GREETING_NAME_PLACEHOLDER)
+
+    async def asynthesize_greeting(
+        self, template_index: int, customer_name: str, greeting_text: str, tts_service: TTSService
+    ) -> Optional[bytes]:
+        """
+        Greeting audio stitched from the cached template pieces and the (separately cached) name.
+        Returns None if this process's template at template_index does not render to greeting_text (the text the
+        call actually showed) or the clips cannot be joined; callers then synthesize the full text.
+        """
+        pieces = self._template_pieces(template_index, customer_name, greeting_text)
+        if pieces is None:
+            return None
+        texts: List[str] = []
+        for position, piece in enumerate(pieces):
+            if _HAS_WORDS_RE.search(piece): # Punctuation-only glue (", ") carries no audio
+                texts.append(piece.strip())
+            if position < len(pieces) - 1:
+                texts.append(customer_name)
+        clips = await asyncio.gather(*(tts_service.asynthesize_to_wav_bytes(text) for text in texts))
+        if not all(clips):
+            return None
+        return concatenate_wav_bytes(list(clips)) # type: ignore[arg-type]
+
+    def prewarm_audio(self, tts_service: TTSService) -> int:
+        """Synthesizes the fixed text around every name slot into the TTS cache."""
+        fixed_texts = [
+            piece.strip() for template in self.templates
+            for piece in template.split(GREETING_NAME_PLACEHOLDER) if _HAS_WORDS_RE.search(piece)
+        ]
+        return tts_service.prewarm_cache(fixed_texts)
+
+
+greeting_cache_instance: Optional[GreetingTemplateCache] = None
+
+def get_greeting_cache() -> GreetingTemplateCache:
+    global greeting_cache_instance
+    if greeting_cache_instance is None:
+        greeting_cache_instance = GreetingTemplateCache(pool_size=settings.GREETING_TEMPLATE_POOL_SIZE)
+    return greeting_cache_instance
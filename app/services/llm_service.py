@@ -1,15 +1,30 @@
 # app/services/llm_service.py
 
 from app.core.config import settings, logger
+from app.core.metrics import (
+    LLM_PREFILL_SECONDS, LLM_DECODE_SECONDS, LLM_PROMPT_TOKENS, LLM_GENERATED_TOKENS, LLM_TOKENS_PER_SECOND,
+    LLM_BATCH_SIZE, THREADPOOL_WAIT_SECONDS, timed_call,
+)
+from app.services.model_worker_pool import get_model_worker_pool, take_preloaded_model
 from app.prompts.sales_prompts import (
     # MAIN_SALES_CHAT_PROMPT, # Will be used by the chain in ConversationManager
     format_lc_messages_to_qwen_prompt_string,
     get_qwen_initial_greeting_prompt_string,
+    get_qwen_history_summary_prompt_string,
+    QWEN_SYSTEM_PROMPT_PREFIX,
+    GREETING_UNAVAILABLE_MESSAGE,
     IM_END_TOKEN, # For cleaning
     IM_START_TOKEN, # For cleaning (though less likely needed in output)
     ASSISTANT_ROLE # For cleaning
 )
-from typing import List, Dict, Optional, Any, Union
+from typing import List, Dict, Optional, Any, Union, Set, Callable, AsyncIterator
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import asyncio
+import functools
+import queue
+import threading
+import time
 import traceback
 
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
@@ -19,15 +34,473 @@ from langchain_core.outputs import Generation, LLMResult
 
 try:
     import torch
-    from transformers import AutoModelForCausalLM, AutoTokenizer
+    from transformers import AutoModelForCausalLM, AutoTokenizer, TextStreamer, StoppingCriteria, StoppingCriteriaList
+    try:
+        from transformers import DynamicCache
+    except ImportError: # Older transformers releases only understand legacy tuple caches
+        DynamicCache = None
     TRANSFORMERS_AVAILABLE = True
     logger.debug("Transformers and torch are available for LocalQwenLLM.")
 except ImportError as e:
     TRANSFORMERS_AVAILABLE = False
     torch = None
+    DynamicCache = None
     AutoModelForCausalLM, AutoTokenizer = (type(None), type(None))
+    TextStreamer = object
+    StoppingCriteria = object
     logger.warning(f"Transformers library or PyTorch not available. LocalQwenLLM will fail. Error: {e}")
 
+# --- KV-cache helpers (work with both DynamicCache objects and legacy tuples) ---
+def _kv_to_legacy(past_key_values: Any) -> tuple:
+    """Returns the cache as a tuple of (key, value) tensors per layer, each shaped [batch, heads, seq, head_dim]."""
+    if hasattr(past_key_values, "to_legacy_cache"):
+        return past_key_values.to_legacy_cache()
+    if hasattr(past_key_values, "layers"):
+        return tuple((layer.keys, layer.values) for layer in past_key_values.layers)
+    return tuple((k, v) for k, v in past_key_values)
+
+def _kv_from_legacy(legacy_kv: tuple) -> Any:
+    # A fresh cache object is built on every call; DynamicCache appends with torch.cat,
+    # so the tensors we hand in are never modified in place.
+    if DynamicCache is None:
+        return legacy_kv
+    if hasattr(DynamicCache, "from_legacy_cache"):
+        return DynamicCache.from_legacy_cache(legacy_kv)
+    return DynamicCache(legacy_kv)
+
+def _left_pad_kv(legacy_kv: tuple, pad: int) -> tuple:
+    if pad <= 0:
+        return legacy_kv
+    return tuple(
+        (torch.nn.functional.pad(k, (0, 0, pad, 0)), torch.nn.functional.pad(v, (0, 0, pad, 0)))
+        for k, v in legacy_kv
+    )
+
+def _crop_kv(legacy_kv: tuple, length: int) -> tuple:
+    return tuple((k[:, :, :length, :], v[:, :, :length, :]) for k, v in legacy_kv)
+
+def _kv_nbytes(legacy_kv: tuple) -> int:
+    return sum(k.numel() * k.element_size() + v.numel() * v.element_size() for k, v in legacy_kv)
+
+def _common_prefix_length(a: List[int], b: List[int]) -> int:
+    n = min(len(a), len(b))
+    for i in range(n):
+        if a[i] != b[i]:
+            return i
+    return n
+
+def _sample_next_token_ids(
+    logits: Any, seen_token_ids: List[Set[int]],
+    temperature: float, top_p: float, repetition_penalty: float
+) -> List[int]:
+    """Row-wise sampling equivalent to generate(do_sample=True, temperature, top_p, repetition_penalty)."""
+    logits = logits.float()
+    if repetition_penalty != 1.0:
+        for row, seen in enumerate(seen_token_ids):
+            if not seen:
+                continue
+            index = torch.tensor(list(seen), dtype=torch.long, device=logits.device)
+            picked = logits[row, index]
+            logits[row, index] = torch.where(picked < 0, picked * repetition_penalty, picked / repetition_penalty)
+    probs = torch.softmax(logits / max(temperature, 1e-5), dim=-1)
+    sorted_probs, sorted_index = torch.sort(probs, descending=True, dim=-1)
+    cumulative = torch.cumsum(sorted_probs, dim=-1)
+    sorted_probs = sorted_probs.masked_fill(cumulative - sorted_probs > top_p, 0.0) # Always keeps the top token
+    choice = torch.multinomial(sorted_probs, num_samples=1)
+    return sorted_index.gather(-1, choice).squeeze(-1).tolist()
+
+
+# --- Streaming ---
+class _CallbackTextStreamer(TextStreamer):
+    """
+    transformers streamer that hands every finalized text delta (special tokens removed) to on_text,
+    followed by a single None when the stream ends.
+    """
+    def __init__(self, tokenizer: Any, on_text: Callable[[Optional[str]], None]):
+        super().__init__(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        self.on_text = on_text
+        self.finished = False
+
+    def on_finalized_text(self, text: str, stream_end: bool = False):
+        if text:
+            self.on_text(text)
+        if stream_end:
+            self.on_text(None)
+
+    def end(self):
+        if self.finished: # Error paths may end the stream a second time
+            return
+        self.finished = True
+        super().end()
+
+
+class _FirstTokenClock(StoppingCriteria):
+    """Never stops generate(); its first call (right after the first sampled token) marks the end of prefill."""
+    def __init__(self):
+        self.first_token_at: Optional[float] = None
+
+    def __call__(self, input_ids: Any, scores: Any, **kwargs: Any) -> Any:
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        return torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+
+
+def _record_generation_metrics(path: str, started: float, first_token_at: Optional[float], generated_tokens: int):
+    finished = time.perf_counter()
+    first_token_at = first_token_at or finished
+    LLM_PREFILL_SECONDS.labels(path).observe(first_token_at - started)
+    decode_s = finished - first_token_at
+    LLM_DECODE_SECONDS.labels(path).observe(decode_s)
+    LLM_GENERATED_TOKENS.inc(generated_tokens)
+    if generated_tokens > 1 and decode_s > 0:
+        LLM_TOKENS_PER_SECOND.observe((generated_tokens - 1) / decode_s) # The first token belongs to prefill
+
+
+class _AsyncQueueTextStreamer(_CallbackTextStreamer):
+    """
+    Forwards text deltas to an asyncio.Queue, so generation can run on a worker thread while the
+    event loop consumes the text. None on the queue marks the end of the stream.
+    """
+    def __init__(self, tokenizer: Any, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+        super().__init__(tokenizer, lambda text: loop.call_soon_threadsafe(self.queue.put_nowait, text))
+
+
+def load_qwen_model(model_id: str, device: str = "cpu") -> Any:
+    return AutoModelForCausalLM.from_pretrained(
+        model_id,
+        device_map=device, # Explicitly CPU
+        trust_remote_code=True,
+        torch_dtype=torch.float32 # Use float32 for CPU
+    )
+
+
+# --- Continuous-batching scheduler ---
+class _QwenPrefixCacheEntry:
+    """Token ids of a prompt prefix together with the KV-cache (batch of one) that encodes them."""
+    def __init__(self, text: Optional[str], token_ids: List[int], past: tuple):
+        self.text = text
+        self.token_ids = token_ids
+        self.past = past
+        self.nbytes = _kv_nbytes(past)
+
+    def cropped(self, length: int) -> "_QwenPrefixCacheEntry":
+        if length >= len(self.token_ids):
+            return self
+        return _QwenPrefixCacheEntry(None, self.token_ids[:length], _crop_kv(self.past, length))
+
+class QwenCallKVCache:
+    """
+    Per-call KV-caches from each call's last generation, keyed by CallSession.kv_cache_key.
+    Bounded by total tensor bytes; least recently used calls are evicted first.
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, _QwenPrefixCacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[_QwenPrefixCacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, entry: _QwenPrefixCacheEntry):
+        if entry.nbytes > self.max_bytes:
+            self.drop(key) # A stale, shorter cache for this call would only waste memory
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.nbytes
+            self._entries[key] = entry
+            self._bytes += entry.nbytes
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def drop(self, key: str):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry.nbytes
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+            }
+
+class _QwenGenerationRequest:
+    """One prompt waiting for, or taking part in, a batched generation."""
+    def __init__(
+        self, input_ids: List[int], max_new_tokens: int, prefix: Optional[_QwenPrefixCacheEntry] = None,
+        on_complete: Optional[Callable[[List[int], tuple], None]] = None,
+        on_token: Optional[Callable[[int], None]] = None,
+    ):
+        self.input_ids = input_ids
+        self.max_new_tokens = max_new_tokens
+        self.prefix = prefix # input_ids[:len(prefix.token_ids)] are already encoded in prefix.past
+        self.on_complete = on_complete # Receives (token_ids, kv) of the finished sequence
+        self.on_token = on_token       # Receives every sampled token id as soon as it exists
+        self.future: Future = Future()
+        self.enqueued_at = time.monotonic()
+        self.started_at = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+        self.generated_ids: List[int] = []
+        self.seen_token_ids: Set[int] = set(input_ids) # Repetition penalty covers prompt + output, like generate()
+        self.pending_token_id: Optional[int] = None   # Sampled but not yet fed through the model
+        self.finished = False
+
+class QwenBatchScheduler:
+    """
+    Runs every generation request through one background thread that keeps a single padded batch.
+    New prompts are prefilled on their own and then merged into the running batch (left-padded KV),
+    all running sequences are decoded together one token per step, and a sequence leaves the batch
+    as soon as it samples an EOS/<|im_end|> token or hits its max_new_tokens. Callers get a Future
+    resolving to the generated token ids. A request may carry a cached prefix, in which case only
+    the tokens after it are prefilled, and an on_complete hook that receives the sequence's own KV
+    rows when it leaves the batch.
+    """
+    def __init__(
+        self, model: Any, eos_token_ids: List[int],
+        max_batch_size: int = 8, max_wait_ms: float = 10.0,
+        temperature: float = 0.7, top_p: float = 0.8, repetition_penalty: float = 1.05,
+    ):
+        self.model = model
+        self.eos_token_ids = set(eos_token_ids)
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_s = max(0.0, max_wait_ms) / 1000.0
+        self.temperature = temperature
+        self.top_p = top_p
+        self.repetition_penalty = repetition_penalty
+
+        self._pending: "queue.Queue[Optional[_QwenGenerationRequest]]" = queue.Queue()
+        self._running: List[_QwenGenerationRequest] = []
+        self._past: Optional[tuple] = None      # Legacy KV of the running batch
+        self._attention_mask: Any = None        # [batch, kv_len]; zeros mark padding
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run_loop, name="qwen-batch-scheduler", daemon=True)
+        self._thread.start()
+        logger.info(f"QwenBatchScheduler started (max_batch_size={self.max_batch_size}, max_wait_ms={max_wait_ms}).")
+
+    def submit(
+        self, input_ids: List[int], max_new_tokens: int, prefix: Optional[_QwenPrefixCacheEntry] = None,
+        on_complete: Optional[Callable[[List[int], tuple], None]] = None,
+        on_token: Optional[Callable[[int], None]] = None,
+    ) -> Future:
+        if self._stop_event.is_set():
+            raise RuntimeError("QwenBatchScheduler has been shut down.")
+        if prefix is not None and (
+            len(prefix.token_ids) >= len(input_ids) or input_ids[:len(prefix.token_ids)] != prefix.token_ids
+        ):
+            prefix = None # Needs at least one uncached token to produce logits
+        request = _QwenGenerationRequest(list(input_ids), max_new_tokens, prefix, on_complete, on_token)
+        self._pending.put(request)
+        return request.future
+
+    def pending_count(self) -> int:
+        return self._pending.qsize()
+
+    def running_count(self) -> int:
+        return len(self._running)
+
+    def shutdown(self, timeout: float = 5.0):
+        self._stop_event.set()
+        self._pending.put(None) # Wake the loop if it is idle
+        self._thread.join(timeout=timeout)
+        error = RuntimeError("QwenBatchScheduler shut down before the request completed.")
+        self._fail_running(error)
+        while True:
+            try:
+                request = self._pending.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None and not request.future.done():
+                request.future.set_exception(error)
+
+    def _run_loop(self):
+        while not self._stop_event.is_set():
+            try:
+                self._admit_pending_requests()
+                if self._running:
+                    self._decode_step()
+            except Exception as e:
+                logger.error(f"QwenBatchScheduler step failed; failing {len(self._running)} running request(s).", exc_info=True)
+                self._fail_running(e)
+
+    def _admit_pending_requests(self):
+        free_slots = self.max_batch_size - len(self._running)
+        if free_slots <= 0:
+            return
+        joiners: List[_QwenGenerationRequest] = []
+        if not self._running:
+            # Idle: block for the first request, then give others up to max_wait to join it.
+            try:
+                first = self._pending.get(timeout=0.5)
+            except queue.Empty:
+                return
+            if first is not None:
+                joiners.append(first)
+            deadline = time.monotonic() + self.max_wait_s
+            while joiners and len(joiners) < free_slots:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._pending.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if request is not None:
+                    joiners.append(request)
+        else:
+            # Busy: take whatever is already queued without stalling the in-flight sequences.
+            while len(joiners) < free_slots:
+                try:
+                    request = self._pending.get_nowait()
+                except queue.Empty:
+                    break
+                if request is not None:
+                    joiners.append(request)
+
+        for request in joiners:
+            if not request.future.set_running_or_notify_cancel():
+                continue # Caller cancelled while queued
+            try:
+                self._prefill_and_join(request)
+            except Exception as e:
+                logger.error("QwenBatchScheduler prefill failed for one request.", exc_info=True)
+                request.future.set_exception(e)
+        self._retire_finished()
+
+    def _prefill_and_join(self, request: _QwenGenerationRequest):
+        cached_len = len(request.prefix.token_ids) if request.prefix else 0
+        with torch.no_grad():
+            input_tensor = torch.tensor([request.input_ids[cached_len:]], dtype=torch.long, device=self.model.device)
+            outputs = self.model(
+                input_ids=input_tensor, use_cache=True,
+                past_key_values=_kv_from_legacy(request.prefix.past) if request.prefix else None,
+            )
+        past = _kv_to_legacy(outputs.past_key_values)
+        mask = torch.ones((1, len(request.input_ids)), dtype=torch.long, device=self.model.device)
+        # Sample the first token before joining: a failure here must not leave the row in the running batch.
+        next_id = _sample_next_token_ids(
+            outputs.logits[:, -1, :], [request.seen_token_ids],
+            self.temperature, self.top_p, self.repetition_penalty
+        )[0]
+        self._append_token(request, next_id)
+        self._merge_into_batch(request, past, mask)
+
+    def _merge_into_batch(self, request: _QwenGenerationRequest, past: tuple, mask: Any):
+        # The merged KV and mask are built first, so the batch is unchanged if this raises.
+        if self._past is None:
+            merged_past, merged_mask = past, mask
+        else:
+            running_len, new_len = self._attention_mask.shape[1], mask.shape[1]
+            width = max(running_len, new_len)
+            running_past = _left_pad_kv(self._past, width - running_len)
+            new_past = _left_pad_kv(past, width - new_len)
+            merged_past = tuple(
+                (torch.cat([rk, nk], dim=0), torch.cat([rv, nv], dim=0))
+                for (rk, rv), (nk, nv) in zip(running_past, new_past)
+            )
+            merged_mask = torch.cat([
+                torch.nn.functional.pad(self._attention_mask, (width - running_len, 0)),
+                torch.nn.functional.pad(mask, (width - new_len, 0)),
+            ], dim=0)
+        self._past, self._attention_mask = merged_past, merged_mask
+        self._running.append(request)
+
+    def _append_token(self, request: _QwenGenerationRequest, token_id: int):
+        if not request.generated_ids:
+            request.first_token_at = time.perf_counter()
+        request.generated_ids.append(token_id)
+        request.seen_token_ids.add(token_id)
+        request.pending_token_id = token_id
+        if request.on_token is not None:
+            try:
+                request.on_token(token_id)
+            except Exception:
+                logger.warning("QwenBatchScheduler: on_token hook failed; dropping it for this request.", exc_info=True)
+                request.on_token = None
+        if token_id in self.eos_token_ids or len(request.generated_ids) >= request.max_new_tokens:
+            request.finished = True
+
+    def _decode_step(self):
+        LLM_BATCH_SIZE.observe(len(self._running))
+        input_ids = torch.tensor(
+            [[r.pending_token_id] for r in self._running], dtype=torch.long, device=self.model.device
+        )
+        # Position of the new token = number of real (unpadded) tokens already in the cache.
+        position_ids = self._attention_mask.sum(dim=-1, keepdim=True)
+        attention_mask = torch.cat([self._attention_mask, torch.ones_like(position_ids)], dim=1)
+        with torch.no_grad():
+            outputs = self.model(
+                input_ids=input_ids, attention_mask=attention_mask, position_ids=position_ids,
+                past_key_values=_kv_from_legacy(self._past), use_cache=True
+            )
+        self._past = _kv_to_legacy(outputs.past_key_values)
+        self._attention_mask = attention_mask
+        next_ids = _sample_next_token_ids(
+            outputs.logits[:, -1, :], [r.seen_token_ids for r in self._running],
+            self.temperature, self.top_p, self.repetition_penalty
+        )
+        for request, token_id in zip(self._running, next_ids):
+            self._append_token(request, token_id)
+        self._retire_finished()
+
+    def _retire_finished(self):
+        keep = [i for i, r in enumerate(self._running) if not r.finished]
+        if len(keep) == len(self._running):
+            return
+        for row, request in enumerate(self._running):
+            if request.finished and not request.future.done():
+                if request.on_complete is not None:
+                    self._run_on_complete(row, request)
+                _record_generation_metrics("batched", request.started_at, request.first_token_at, len(request.generated_ids))
+                request.future.set_result(request.generated_ids)
+        if not keep:
+            self._running, self._past, self._attention_mask = [], None, None
+            return
+        index = torch.tensor(keep, dtype=torch.long, device=self._attention_mask.device)
+        mask = self._attention_mask.index_select(0, index)
+        # Columns that are padding for every remaining row can be dropped from the cache.
+        first_used = int(mask.any(dim=0).nonzero()[0])
+        self._attention_mask = mask[:, first_used:]
+        self._past = tuple(
+            (k.index_select(0, index)[:, :, first_used:, :], v.index_select(0, index)[:, :, first_used:, :])
+            for k, v in self._past
+        )
+        self._running = [self._running[i] for i in keep]
+
+    def _run_on_complete(self, row: int, request: _QwenGenerationRequest):
+        # The last sampled token was never fed through the model, so it has no KV entry.
+        token_ids = request.input_ids + request.generated_ids[:-1]
+        keep = self._attention_mask[row].bool()
+        try:
+            row_past = tuple((k[row:row + 1][:, :, keep, :], v[row:row + 1][:, :, keep, :]) for k, v in self._past)
+            request.on_complete(token_ids, row_past)
+        except Exception:
+            logger.warning("QwenBatchScheduler: on_complete hook failed; result is unaffected.", exc_info=True)
+
+    def _fail_running(self, error: Exception):
+        for request in self._running:
+            if not request.future.done():
+                request.future.set_exception(error)
+        self._running, self._past, self._attention_mask = [], None, None
+
+
 # --- Custom LangChain LLM Wrapper for Local Qwen ---
 class LocalQwenLLM(LLM):
     model_id: str = settings.LLM_MODEL_REPO_ID
@@ -36,6 +509,13 @@ class LocalQwenLLM(LLM):
     device: str = "cpu"   # Default to CPU
     max_new_tokens_generation: int = 180
     max_new_tokens_greeting: int = 100
+    batch_scheduler: Any = None # QwenBatchScheduler when settings.LLM_BATCHING_ENABLED
+    system_prefix_cache: Any = None # _QwenPrefixCacheEntry for QWEN_SYSTEM_PROMPT_PREFIX
+    system_prefix_ids: Any = None   # Token ids of QWEN_SYSTEM_PROMPT_PREFIX, tokenized once at load
+    eos_token_ids: Any = None       # eos + <|im_end|> ids, resolved once at load
+    call_kv_cache: Any = None       # QwenCallKVCache holding each call's cache from its previous turn
+    worker_pool: Any = None         # ModelWorkerPool doing the generation when MODEL_WORKERS > 0
+    generation_executor: Any = None # Threads for unbatched async generations (kept off the default threadpool)
 
     # For LangChain's an L C MetaData
     @property
@@ -49,52 +529,253 @@ class LocalQwenLLM(LLM):
 
         logger.info(f"Initializing LocalQwenLLM with model: {self.model_id} on device: {self.device}")
         try:
+            # The tokenizer is also needed when generation runs in the worker pool (prompt token budgeting).
             self.tokenizer = AutoTokenizer.from_pretrained(self.model_id, trust_remote_code=True)
             if self.tokenizer.pad_token_id is None:
                 self.tokenizer.pad_token_id = self.tokenizer.eos_token_id
                 logger.info(f"Set pad_token_id to eos_token_id ({self.tokenizer.pad_token_id}) for Qwen tokenizer.")
+            self.eos_token_ids = self._resolve_eos_token_ids()
+            self.system_prefix_ids = self.encode(QWEN_SYSTEM_PROMPT_PREFIX)
 
-            self.model = AutoModelForCausalLM.from_pretrained(
-                self.model_id,
-                device_map=self.device, # Explicitly CPU
-                trust_remote_code=True,
-                torch_dtype=torch.float32 # Use float32 for CPU
-            )
+            pool = get_model_worker_pool()
+            if pool is not None and pool.serves("llm"):
+                self.worker_pool = pool
+                logger.info(f"LocalQwenLLM: Generation for {self.model_id} runs in the model worker pool.")
+                return
+
+            preloaded_model = take_preloaded_model("llm") # Weights shared by the worker pool parent, if any
+            self.model = preloaded_model if preloaded_model is not None else load_qwen_model(self.model_id, self.device)
             logger.info(f"LocalQwenLLM: Model {self.model_id} loaded successfully on {self.model.device}.")
+
+            if settings.LLM_PREFIX_CACHE_ENABLED:
+                self.system_prefix_cache = self._encode_prefix(QWEN_SYSTEM_PROMPT_PREFIX, self.system_prefix_ids)
+                logger.info(f"LocalQwenLLM: System prompt prefix cached ({len(self.system_prefix_cache.token_ids)} tokens).")
+
+            if settings.LLM_CALL_KV_CACHE_MAX_MB > 0:
+                self.call_kv_cache = QwenCallKVCache(settings.LLM_CALL_KV_CACHE_MAX_MB * 1024 * 1024)
+
+            self.generation_executor = ThreadPoolExecutor(
+                max_workers=max(1, settings.LLM_GENERATION_THREADS), thread_name_prefix="llm-generate"
+            )
+            if settings.LLM_BATCHING_ENABLED:
+                self.batch_scheduler = QwenBatchScheduler(
+                    self.model, self.eos_token_ids,
+                    max_batch_size=settings.LLM_MAX_BATCH_SIZE,
+                    max_wait_ms=settings.LLM_BATCH_MAX_WAIT_MS,
+                )
         except Exception as e:
             logger.error(f"--- FAILED to initialize LocalQwenLLM model ({self.model_id}) ---", exc_info=True)
             traceback.print_exc()
             raise RuntimeError(f"Could not load local Qwen model: {e}") from e
 
-    def _generate_raw_qwen_response(self, prompt_string: str, max_tokens: int) -> str:
+    def _resolve_eos_token_ids(self) -> List[int]:
+        eos_token_ids_list = []
+        if self.tokenizer.eos_token_id is not None:
+            eos_token_ids_list.append(self.tokenizer.eos_token_id)
+        im_end_token_id = self.tokenizer.convert_tokens_to_ids(IM_END_TOKEN)
+        if im_end_token_id != self.tokenizer.unk_token_id and im_end_token_id not in eos_token_ids_list:
+            eos_token_ids_list.append(im_end_token_id)
+        return eos_token_ids_list
+
+    def _encode_prefix(self, prefix_text: str, token_ids: Optional[List[int]] = None) -> _QwenPrefixCacheEntry:
+        if token_ids is None:
+            token_ids = self.tokenizer(prefix_text, truncation=False)["input_ids"]
+        with torch.no_grad():
+            outputs = self.model(
+                input_ids=torch.tensor([token_ids], dtype=torch.long, device=self.model.device), use_cache=True
+            )
+        return _QwenPrefixCacheEntry(prefix_text, token_ids, _kv_to_legacy(outputs.past_key_values))
+
+    def _tokenize_prompt(self, prompt_string: str) -> List[int]:
+        if self.system_prefix_ids is not None and prompt_string.startswith(QWEN_SYSTEM_PROMPT_PREFIX):
+            # The prefix ends right before an <|im_start|> special token, so tokenizing the two
+            # halves separately yields the same ids as tokenizing the whole string.
+            suffix = prompt_string[len(QWEN_SYSTEM_PROMPT_PREFIX):]
+            return self.system_prefix_ids + self.tokenizer(suffix, truncation=False)["input_ids"]
+        return self.tokenizer(prompt_string, truncation=False)["input_ids"]
+
+    def _select_prefix(self, input_ids: List[int], cache_key: Optional[str]) -> Optional[_QwenPrefixCacheEntry]:
+        """Picks the longest cached prefix of input_ids: this call's previous turn or the shared system prompt."""
+        best = self.system_prefix_cache
+        if best is not None and input_ids[:len(best.token_ids)] != best.token_ids:
+            best = None
+        if cache_key and self.call_kv_cache is not None:
+            entry = self.call_kv_cache.get(cache_key)
+            if entry is not None:
+                # Keep at least one token uncached so the prefill produces next-token logits.
+                shared = min(_common_prefix_length(entry.token_ids, input_ids), len(input_ids) - 1)
+                if shared > (len(best.token_ids) if best else 0):
+                    best = entry.cropped(shared)
+        return best
+
+    def _store_call_cache(self, cache_key: str, token_ids: List[int], past: tuple):
+        self.call_kv_cache.put(cache_key, _QwenPrefixCacheEntry(None, token_ids, past))
+
+    def release_call_cache(self, cache_key: Optional[str]):
+        if cache_key and self.worker_pool is not None:
+            self.worker_pool.submit("llm.release_call_cache", cache_key, affinity_key=cache_key)
+            return
+        if cache_key and self.call_kv_cache is not None:
+            self.call_kv_cache.drop(cache_key)
+
+    def _generate_raw_qwen_response(
+        self, prompt_string: str, max_tokens: int, cache_key: Optional[str] = None, streamer: Any = None,
+        input_ids: Optional[List[int]] = None,
+    ) -> str:
+        # input_ids, when given, are the already tokenized prompt_string (see CallPromptCache) and skip tokenization.
+        if self.worker_pool is not None:
+            try:
+                return self.worker_pool.call(
+                    "llm.generate", prompt_string, max_tokens, cache_key, input_ids=input_ids, affinity_key=cache_key
+                )
+            except Exception:
+                logger.error("Error during model worker generation:", exc_info=True)
+                return "Error during generation."
         if not self.model or not self.tokenizer:
             logger.error("LocalQwenLLM: Model or tokenizer not loaded.")
+            if streamer is not None:
+                streamer.end()
             return "Error: Model not available."
         try:
-            inputs = self.tokenizer(prompt_string, return_tensors="pt", padding=True, truncation=False).to(self.model.device)
-
-            eos_token_ids_list = []
-            if self.tokenizer.eos_token_id is not None:
-                eos_token_ids_list.append(self.tokenizer.eos_token_id)
-            im_end_token_id = self.tokenizer.convert_tokens_to_ids(IM_END_TOKEN)
-            if im_end_token_id != self.tokenizer.unk_token_id and im_end_token_id not in eos_token_ids_list:
-                eos_token_ids_list.append(im_end_token_id)
-            final_eos_token_id = eos_token_ids_list if eos_token_ids_list else self.tokenizer.eos_token_id
-
-            output_sequences = self.model.generate(
-                inputs.input_ids,
-                attention_mask=inputs.attention_mask,
+            if input_ids is None:
+                input_ids = self._tokenize_prompt(prompt_string)
+            if self.batch_scheduler is not None:
+                generated_ids = self._submit_batched(input_ids, max_tokens, cache_key, streamer).result()
+                return self.tokenizer.decode(generated_ids, skip_special_tokens=False)
+
+            prefix = self._select_prefix(input_ids, cache_key)
+            keep_call_cache = cache_key is not None and self.call_kv_cache is not None
+            input_tensor = torch.tensor([input_ids], dtype=torch.long, device=self.model.device)
+            final_eos_token_id = self.eos_token_ids if self.eos_token_ids else self.tokenizer.eos_token_id
+            clock = _FirstTokenClock()
+            started = time.perf_counter()
+            LLM_PROMPT_TOKENS.observe(len(input_ids))
+
+            outputs = self.model.generate(
+                input_tensor,
+                attention_mask=torch.ones_like(input_tensor),
+                past_key_values=_kv_from_legacy(prefix.past) if prefix else None,
                 max_new_tokens=max_tokens,
                 pad_token_id=self.tokenizer.pad_token_id,
                 eos_token_id=final_eos_token_id,
                 do_sample=True, temperature=0.7, top_p=0.8, repetition_penalty=1.05,
+                return_dict_in_generate=True,
+                streamer=streamer,
+                stopping_criteria=StoppingCriteriaList([clock]),
             )
-            response_text = self.tokenizer.decode(output_sequences[0, inputs["input_ids"].shape[-1]:], skip_special_tokens=False)
+            output_sequence = outputs.sequences[0]
+            _record_generation_metrics("generate", started, clock.first_token_at, len(output_sequence) - len(input_ids))
+            if keep_call_cache and outputs.past_key_values is not None:
+                # generate() never feeds the last sampled token, so the cache stops one short.
+                self._store_call_cache(cache_key, output_sequence[:-1].tolist(), _kv_to_legacy(outputs.past_key_values))
+            response_text = self.tokenizer.decode(output_sequence[len(input_ids):], skip_special_tokens=False)
             return response_text
         except Exception as e:
             logger.error(f"Error during LocalQwenLLM raw generation:", exc_info=True)
+            if streamer is not None:
+                streamer.end()
             return "Error during generation."
 
+    def _submit_batched(
+        self, input_ids: List[int], max_tokens: int, cache_key: Optional[str] = None, streamer: Any = None
+    ) -> Future:
+        """Queues a generation on the batch scheduler. The future resolves to the generated token ids."""
+        LLM_PROMPT_TOKENS.observe(len(input_ids))
+        prefix = self._select_prefix(input_ids, cache_key)
+        on_complete = None
+        if cache_key is not None and self.call_kv_cache is not None:
+            on_complete = lambda ids, past: self._store_call_cache(cache_key, ids, past)
+        on_token = None
+        if streamer is not None:
+            streamer.put(torch.tensor(input_ids)) # The first put is the prompt, skipped like in generate()
+            on_token = lambda token_id: streamer.put(torch.tensor([token_id]))
+        try:
+            future = self.batch_scheduler.submit(
+                input_ids, max_tokens, prefix=prefix, on_complete=on_complete, on_token=on_token
+            )
+        except Exception:
+            if streamer is not None:
+                streamer.end()
+            raise
+        if streamer is not None:
+            future.add_done_callback(lambda _: streamer.end())
+        return future
+
+    async def agenerate_raw_qwen_response(
+        self, prompt_string: str, max_tokens: int, cache_key: Optional[str] = None,
+        input_ids: Optional[List[int]] = None,
+    ) -> str:
+        """
+        Async _generate_raw_qwen_response. Worker-pool and batched generations are awaited as futures, so a
+        waiting call holds no thread; unbatched local generation runs on generation_executor.
+        """
+        try:
+            if self.worker_pool is not None:
+                return await asyncio.wrap_future(self.worker_pool.submit(
+                    "llm.generate", prompt_string, max_tokens, cache_key, input_ids=input_ids, affinity_key=cache_key
+                ))
+            if self.batch_scheduler is not None and self.model is not None:
+                if input_ids is None:
+                    input_ids = self._tokenize_prompt(prompt_string)
+                generated_ids = await asyncio.wrap_future(self._submit_batched(input_ids, max_tokens, cache_key))
+                return self.tokenizer.decode(generated_ids, skip_special_tokens=False)
+        except Exception:
+            logger.error("Error during async LocalQwenLLM generation:", exc_info=True)
+            return "Error during generation."
+        return await asyncio.get_running_loop().run_in_executor(
+            self.generation_executor, timed_call(
+                THREADPOOL_WAIT_SECONDS.labels("llm-generate"),
+                functools.partial(self._generate_raw_qwen_response, prompt_string, max_tokens, cache_key, None, input_ids),
+            ),
+        )
+
+    async def astream_raw_qwen_response(
+        self, prompt_string: str, max_tokens: int, cache_key: Optional[str] = None,
+        input_ids: Optional[List[int]] = None,
+    ) -> AsyncIterator[str]:
+        """Yields text deltas (special tokens removed) while the generation runs on a worker thread."""
+        if self.worker_pool is not None:
+            async for text in self.worker_pool.astream(
+                "llm.stream", prompt_string, max_tokens, cache_key, input_ids=input_ids, affinity_key=cache_key
+            ):
+                yield text
+            return
+        loop = asyncio.get_running_loop()
+        streamer = _AsyncQueueTextStreamer(self.tokenizer, loop)
+        if self.batch_scheduler is not None and self.model is not None:
+            # The scheduler thread feeds the streamer directly; nothing blocks on this generation.
+            if input_ids is None:
+                input_ids = self._tokenize_prompt(prompt_string)
+            generation = asyncio.wrap_future(self._submit_batched(input_ids, max_tokens, cache_key, streamer))
+        else:
+            generation = loop.run_in_executor(
+                self.generation_executor, timed_call(THREADPOOL_WAIT_SECONDS.labels("llm-generate"), functools.partial(
+                    self._generate_raw_qwen_response, prompt_string, max_tokens, cache_key, streamer, input_ids
+                ))
+            )
+        while True:
+            text = await streamer.queue.get()
+            if text is None:
+                break
+            yield text
+        try:
+            raw_response = await generation
+        except Exception as e:
+            raise RuntimeError(f"LocalQwenLLM streaming generation failed: {e}") from e
+        if isinstance(raw_response, str) and raw_response.startswith("Error"):
+            raise RuntimeError(f"LocalQwenLLM streaming generation failed: {raw_response}")
+
+    def stream_raw_qwen_response(
+        self, prompt_string: str, max_tokens: int, cache_key: Optional[str] = None,
+        on_text: Optional[Callable[[str], None]] = None, input_ids: Optional[List[int]] = None,
+    ) -> str:
+        """Blocking streaming generation (used inside model workers): on_text receives each text delta."""
+        streamer = _CallbackTextStreamer(self.tokenizer, lambda text: on_text(text) if text and on_text else None)
+        raw_response = self._generate_raw_qwen_response(prompt_string, max_tokens, cache_key, streamer, input_ids)
+        if raw_response.startswith("Error"):
+            raise RuntimeError(f"LocalQwenLLM streaming generation failed: {raw_response}")
+        return raw_response
+
     def _call(
         self,
         prompt: str, # LangChain's LLM._call expects a single prompt string
@@ -106,7 +787,14 @@ class LocalQwenLLM(LLM):
         # if this _call method is invoked directly by a simple LangChain chain.
         # The formatting from List[BaseMessage] to Qwen string happens *before* this.
         logger.debug(f"LocalQwenLLM._call received prompt (first 100 chars): {prompt[:100]}")
-        raw_response = self._generate_raw_qwen_response(prompt, self.max_new_tokens_generation)
+        # Per-call KV reuse and the already tokenized prompt come from the caller as invoke() kwargs,
+        # e.g. invoke(prompt, kv_cache_key=..., input_ids=...); the run metadata may also name the cache key.
+        metadata = getattr(run_manager, "metadata", None) or {}
+        cache_key = kwargs.get("kv_cache_key") or metadata.get("kv_cache_key")
+        input_ids = kwargs.get("input_ids")
+        raw_response = self._generate_raw_qwen_response(
+            prompt, self.max_new_tokens_generation, cache_key=cache_key, input_ids=input_ids
+        )
         cleaned_response = self._clean_qwen_response(raw_response, is_greeting=False) # Generic cleaning
         logger.debug(f"LocalQwenLLM._call cleaned response: {cleaned_response}")
         return cleaned_response
@@ -125,6 +813,14 @@ class LocalQwenLLM(LLM):
         return cleaned_text
 
     # --- Specific methods for your application, not part of standard LLM interface ---
+    def encode(self, text: str) -> List[int]:
+        return self.tokenizer(text, add_special_tokens=False)["input_ids"]
+
+    def generate_qwen_history_summary(self, previous_summary: Optional[str], transcript: str, max_tokens: int) -> str:
+        prompt_str = get_qwen_history_summary_prompt_string(previous_summary, transcript)
+        raw_response = self._generate_raw_qwen_response(prompt_str, max_tokens)
+        return self._clean_qwen_response(raw_response)
+
     def generate_qwen_initial_greeting(self, customer_name: str) -> str:
         prompt_str = get_qwen_initial_greeting_prompt_string(customer_name)
         raw_response = self._generate_raw_qwen_response(prompt_str, self.max_new_tokens_greeting)
@@ -136,7 +832,11 @@ class LLMService:
         self.llm_mode: str = "None" # Will become "local_qwen_wrapper"
         self.custom_llm: Optional[LocalQwenLLM] = None
         try:
-            self.custom_llm = LocalQwenLLM() # Instantiate our LangChain compatible LLM
+            if settings.BACKEND_MODE == "fake":
+                from app.services.fake_backends import FakeQwenLLM # Imports this module, so not at the top
+                self.custom_llm = FakeQwenLLM()
+            else:
+                self.custom_llm = LocalQwenLLM() # Instantiate our LangChain compatible LLM
             self.llm_mode = self.custom_llm._llm_type
             logger.info(f"LLMService initialized with {self.llm_mode}.")
         except Exception as e:
@@ -144,7 +844,21 @@ class LLMService:
             self.custom_llm = None # Ensure it's None on failure
 
     def is_ready(self) -> bool:
-        return self.custom_llm is not None and self.custom_llm.model is not None
+        return self.custom_llm is not None and (
+            self.custom_llm.model is not None or self.custom_llm.worker_pool is not None
+        )
+
+    def shutdown(self):
+        if self.custom_llm and self.custom_llm.batch_scheduler:
+            self.custom_llm.batch_scheduler.shutdown()
+            logger.info("LLMService: batch scheduler stopped.")
+        if self.custom_llm and self.custom_llm.generation_executor:
+            self.custom_llm.generation_executor.shutdown(wait=False)
+
+    def release_call_cache(self, cache_key: Optional[str]):
+        """Frees the per-call KV-cache kept between turns (call ended or session evicted)."""
+        if self.custom_llm:
+            self.custom_llm.release_call_cache(cache_key)
 
     def get_langchain_llm_instance(self) -> Optional[LocalQwenLLM]:
         """Returns the underlying LangChain LLM instance for use in LCEL chains."""
@@ -153,9 +867,36 @@ class LLMService:
     def generate_initial_greeting(self, customer_name: str) -> str:
         if not self.is_ready() or not self.custom_llm:
             logger.error("LLM not ready for generating initial greeting.")
-            return "Hello! Our AI is temporarily unavailable (LLM not ready)."
+            return GREETING_UNAVAILABLE_MESSAGE
         return self.custom_llm.generate_qwen_initial_greeting(customer_name)
 
+    def encode(self, text: str) -> Optional[List[int]]:
+        """Qwen token ids of text (no special tokens added), or None if the tokenizer is unavailable."""
+        if self.custom_llm and self.custom_llm.tokenizer is not None:
+            return self.custom_llm.encode(text)
+        return None
+
+    def system_prefix_ids(self) -> Optional[List[int]]:
+        """Token ids of QWEN_SYSTEM_PROMPT_PREFIX (tokenized once at load), or None without a tokenizer."""
+        return self.custom_llm.system_prefix_ids if self.custom_llm else None
+
+    def count_tokens(self, text: str) -> int:
+        """Qwen token count of text (a chars/4 estimate if the tokenizer is unavailable)."""
+        token_ids = self.encode(text)
+        return len(token_ids) if token_ids is not None else max(1, len(text) // 4)
+
+    def summarize_history(self, previous_summary: Optional[str], transcript: str) -> Optional[str]:
+        """Folds a transcript excerpt into the rolling summary of a call. None if the LLM fails."""
+        if not self.is_ready() or not self.custom_llm:
+            return None
+        summary = self.custom_llm.generate_qwen_history_summary(
+            previous_summary, transcript, settings.LLM_HISTORY_SUMMARY_MAX_TOKENS
+        )
+        if not summary or summary.startswith("Error"):
+            logger.warning(f"History summarization failed: '{summary}'")
+            return None
+        return summary
+
     def generate_response(self, customer_input: str, chat_history_messages: List[BaseMessage]) -> str:
         """
         Generates a response using the custom LLM.
@@ -185,6 +926,49 @@ class LLMService:
         # Since _call expects already formatted Qwen string, this is correct.
         return self.custom_llm._call(prompt=qwen_prompt_string)
 
+    async def agenerate_prompt(
+        self, qwen_prompt_string: str, cache_key: Optional[str] = None, input_ids: Optional[List[int]] = None
+    ) -> str:
+        """
+        Async counterpart of the sales chain: the cleaned reply to an already Qwen-formatted prompt.
+        Raises RuntimeError if the LLM is not ready or generation fails.
+        """
+        if not self.is_ready() or not self.custom_llm:
+            raise RuntimeError("LLM not ready for generation.")
+        raw_response = await self.custom_llm.agenerate_raw_qwen_response(
+            qwen_prompt_string, self.custom_llm.max_new_tokens_generation, cache_key=cache_key, input_ids=input_ids
+        )
+        if raw_response.startswith("Error"):
+            raise RuntimeError(f"LocalQwenLLM generation failed: {raw_response}")
+        return self.custom_llm._clean_qwen_response(raw_response, is_greeting=False)
+
+    async def astream_prompt(
+        self, qwen_prompt_string: str, cache_key: Optional[str] = None, input_ids: Optional[List[int]] = None
+    ) -> AsyncIterator[str]:
+        """
+        Streams the reply to an already Qwen-formatted prompt (optionally with its token ids) as text deltas.
+        Raises RuntimeError if the LLM is not ready or generation fails.
+        """
+        if not self.is_ready() or not self.custom_llm:
+            raise RuntimeError("LLM not ready for streaming generation.")
+        async for delta in self.custom_llm.astream_raw_qwen_response(
+            qwen_prompt_string, self.custom_llm.max_new_tokens_generation, cache_key=cache_key, input_ids=input_ids
+        ):
+            yield delta
+
+    async def astream_response(
+        self, customer_input: str, chat_history_messages: List[BaseMessage], cache_key: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """Streaming counterpart of generate_response: an async iterator of text deltas."""
+        from app.prompts.sales_prompts import QWEN_SYSTEM_PROMPT_CONTENT
+
+        full_messages_for_qwen_format: List[BaseMessage] = [SystemMessage(content=QWEN_SYSTEM_PROMPT_CONTENT)]
+        full_messages_for_qwen_format.extend(chat_history_messages)
+        full_messages_for_qwen_format.append(HumanMessage(content=customer_input))
+        qwen_prompt_string = format_lc_messages_to_qwen_prompt_string(full_messages_for_qwen_format)
+        async for delta in self.astream_prompt(qwen_prompt_string, cache_key=cache_key):
+            yield delta
+
 
 llm_service_instance: Optional[LLMService] = None
 def get_llm_service(recreate_instance: bool = False) -> Optional[LLMService]:
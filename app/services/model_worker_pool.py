@@ -0,0 +1,424 @@
+# app/services/model_worker_pool.py
+import asyncio
+import multiprocessing as mp
+import os
+import queue
+import threading
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import settings, logger
+
+MODEL_SERVICES = ("llm", "stt", "tts")
+
+# Worker -> parent message kinds
+_READY = "ready"
+_DELTA = "delta"
+_RESULT = "result"
+_ERROR = "error"
+
+_in_model_worker = False # Set inside pool worker processes, where services load their models locally
+_preloaded_models: Dict[str, Any] = {} # Weights handed over by the parent, consumed once by the services
+
+
+def is_model_worker_process() -> bool:
+    return _in_model_worker
+
+
+def take_preloaded_model(name: str) -> Any:
+    """Returns (and forgets) weights the parent loaded for this worker, or None."""
+    return _preloaded_models.pop(name, None)
+
+
+def _preload_models(services: Sequence[str], share_memory: bool) -> Dict[str, Any]:
+    """
+    Loads the model weights once in the parent. With fork the workers inherit them copy-on-write;
+    with spawn the tensors are moved to shared memory and only handles are pickled to the workers.
+    """
+    preloaded: Dict[str, Any] = {}
+    if settings.BACKEND_MODE == "fake":
+        return preloaded # Fake backends have no weights; every worker builds its own
+    if "llm" in services:
+        from app.services.llm_service import load_qwen_model
+        preloaded["llm"] = load_qwen_model(settings.LLM_MODEL_REPO_ID)
+    if "stt" in services:
+        from app.services.stt_service import load_whisper_model
+        preloaded["stt"] = load_whisper_model(settings.WHISPER_MODEL_SIZE)
+    if share_memory and preloaded:
+        import torch.multiprocessing # Registers the shared-memory tensor reducers used when pickling to workers
+        for model in preloaded.values():
+            model.share_memory()
+    return preloaded
+
+
+def _build_worker_handlers(services: Sequence[str]) -> Tuple[Dict[str, Callable], Dict[str, Callable]]:
+    """Creates the in-process services of one worker. Stream handlers get an emit(text) callback first."""
+    handlers: Dict[str, Callable] = {}
+    stream_handlers: Dict[str, Callable] = {}
+    if "llm" in services:
+        from app.services.llm_service import get_llm_service
+        llm_service = get_llm_service()
+        if not llm_service or not llm_service.is_ready():
+            raise RuntimeError("LLM service failed to initialize in model worker.")
+        custom_llm = llm_service.custom_llm
+        handlers["llm.generate"] = custom_llm._generate_raw_qwen_response # type: ignore
+        handlers["llm.release_call_cache"] = llm_service.release_call_cache
+        stream_handlers["llm.stream"] = lambda emit, *args, **kwargs: custom_llm.stream_raw_qwen_response(*args, on_text=emit, **kwargs) # type: ignore
+    if "stt" in services:
+        from app.services.stt_service import get_stt_service
+        stt_service = get_stt_service()
+        if not stt_service or not stt_service.is_ready():
+            raise RuntimeError("STT service failed to initialize in model worker.")
+        handlers["stt.transcribe_audio"] = stt_service.transcribe_audio
+        handlers["stt.transcribe_array"] = stt_service.transcribe_array
+    if "tts" in services:
+        from app.services.tts_service import get_tts_service
+        tts_service = get_tts_service()
+        if not tts_service or not tts_service.is_ready():
+            raise RuntimeError("TTS service failed to initialize in model worker.")
+        handlers["tts.synthesize_to_wav_bytes"] = tts_service.synthesize_to_wav_bytes
+        handlers["tts.voice_settings"] = tts_service.voice_settings
+    return handlers, stream_handlers
+
+
+def _shutdown_worker_services(services: Sequence[str]):
+    # Use the module singletons directly: get_*_service() would build a service that never started.
+    if "llm" in services:
+        from app.services import llm_service as llm_service_module
+        if llm_service_module.llm_service_instance:
+            llm_service_module.llm_service_instance.shutdown()
+    if "stt" in services:
+        from app.services import stt_service as stt_service_module
+        if stt_service_module.stt_service_instance:
+            stt_service_module.stt_service_instance.shutdown()
+
+
+def _run_worker_request(
+    handlers: Dict[str, Callable], stream_handlers: Dict[str, Callable], response_queue: Any,
+    request_id: int, method: str, args: tuple, kwargs: Dict[str, Any],
+):
+    try:
+        if method in stream_handlers:
+            emit = lambda text: response_queue.put((_DELTA, request_id, text))
+            result = stream_handlers[method](emit, *args, **kwargs)
+        elif method in handlers:
+            result = handlers[method](*args, **kwargs)
+        else:
+            raise ValueError(f"Unknown model worker method '{method}'.")
+        response_queue.put((_RESULT, request_id, result))
+    except Exception as e:
+        logger.error(f"Model worker request {method} failed.", exc_info=True)
+        response_queue.put((_ERROR, request_id, f"{type(e).__name__}: {e}"))
+
+
+def _worker_main(
+    worker_index: int, services: Sequence[str], torch_threads: int, request_threads: int,
+    request_queue: Any, response_queue: Any, preloaded: Dict[str, Any],
+):
+    global _in_model_worker
+    _in_model_worker = True
+    # Pin intra-op threads so N workers do not oversubscribe the cores (must happen before torch spins up its pool).
+    os.environ["OMP_NUM_THREADS"] = str(torch_threads)
+    os.environ["MKL_NUM_THREADS"] = str(torch_threads)
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+    except ImportError:
+        pass
+    _preloaded_models.update(preloaded)
+    del preloaded
+
+    try:
+        handlers, stream_handlers = _build_worker_handlers(services)
+    except Exception as e:
+        logger.error(f"Model worker {worker_index} failed to start.", exc_info=True)
+        response_queue.put((_READY, worker_index, f"{type(e).__name__}: {e}"))
+        return
+    logger.info(f"Model worker {worker_index} (pid {os.getpid()}) ready: services={list(services)}, torch_threads={torch_threads}.")
+    response_queue.put((_READY, worker_index, None))
+
+    # Requests run on threads so the in-worker batchers (Qwen scheduler, Whisper worker) see concurrent submissions.
+    executor = ThreadPoolExecutor(max_workers=request_threads, thread_name_prefix=f"model-worker-{worker_index}")
+    try:
+        while True:
+            message = request_queue.get()
+            if message is None:
+                break
+            executor.submit(_run_worker_request, handlers, stream_handlers, response_queue, *message)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        _shutdown_worker_services(services)
+
+
+class _PendingModelCall:
+    """A request sent to a worker process and not yet answered."""
+    def __init__(self, worker_index: int, on_delta: Optional[Callable[[str], None]] = None):
+        self.worker_index = worker_index
+        self.on_delta = on_delta
+        self.future: Future = Future()
+
+
+class ModelWorkerPool:
+    """
+    Runs model inference in N worker processes instead of the API process, so CPU-bound work is not
+    serialized by the GIL. Weights are loaded once in the parent and shared with the workers (fork:
+    copy-on-write; spawn: torch shared memory). Each worker pins its torch thread count. Requests
+    carrying an affinity_key (the call id) always go to the same worker so that worker's per-call
+    KV-cache is reused; other requests go to the least busy worker.
+    """
+    def __init__(
+        self, num_workers: int, services: Sequence[str] = MODEL_SERVICES, start_method: str = "auto",
+        torch_threads: int = 0, request_threads: int = 16,
+    ):
+        self.num_workers = max(1, num_workers)
+        self.services = tuple(s for s in services if s in MODEL_SERVICES)
+        if start_method == "auto":
+            start_method = "fork" if "fork" in mp.get_all_start_methods() else "spawn"
+        self.start_method = start_method
+        self.torch_threads = torch_threads if torch_threads > 0 else max(1, (os.cpu_count() or 1) // self.num_workers)
+        self.request_threads = max(1, request_threads)
+
+        self._ctx = mp.get_context(self.start_method)
+        self._response_queue: Any = self._ctx.Queue()
+        self._request_queues: List[Any] = []
+        self._processes: List[Any] = []
+        self._alive: List[bool] = []
+        self._pending: Dict[int, _PendingModelCall] = {}
+        self._outstanding: List[int] = [0] * self.num_workers
+        self._next_request_id = 0
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._reader_thread: Optional[threading.Thread] = None
+
+    def serves(self, service: str) -> bool:
+        return service in self.services
+
+    def start(self, ready_timeout_s: float = 900.0):
+        preloaded = _preload_models(self.services, share_memory=self.start_method != "fork")
+        ready_events: Dict[int, Optional[str]] = {}
+        for worker_index in range(self.num_workers):
+            request_queue = self._ctx.Queue()
+            process = self._ctx.Process(
+                target=_worker_main, name=f"model-worker-{worker_index}", daemon=True,
+                args=(worker_index, self.services, self.torch_threads, self.request_threads,
+                      request_queue, self._response_queue, preloaded),
+            )
+            process.start()
+            self._request_queues.append(request_queue)
+            self._processes.append(process)
+            self._alive.append(True)
+
+        # Wait until every worker has taken over the weights before dropping the parent's references.
+        while len(ready_events) < self.num_workers:
+            kind, worker_index, error = self._response_queue.get(timeout=ready_timeout_s)
+            if kind == _READY:
+                ready_events[worker_index] = error
+        del preloaded
+        failed = {i: e for i, e in ready_events.items() if e}
+        for worker_index in failed:
+            self._alive[worker_index] = False
+        if len(failed) == self.num_workers:
+            self.shutdown()
+            raise RuntimeError(f"All model workers failed to start: {failed}")
+        if failed:
+            logger.error(f"Some model workers failed to start and will not receive requests: {failed}")
+
+        self._reader_thread = threading.Thread(target=self._reader_loop, name="model-worker-reader", daemon=True)
+        self._reader_thread.start()
+        logger.info(
+            f"ModelWorkerPool started {self.num_workers} worker(s) via {self.start_method} "
+            f"(services={list(self.services)}, torch_threads={self.torch_threads})."
+        )
+
+    def worker_for(self, affinity_key: Optional[str] = None) -> int:
+        alive = [i for i in range(self.num_workers) if self._alive[i]]
+        if not alive:
+            raise RuntimeError("No model workers are running.")
+        if affinity_key:
+            preferred = zlib.crc32(affinity_key.encode("utf-8")) % self.num_workers
+            if self._alive[preferred]:
+                return preferred
+            return alive[preferred % len(alive)]
+        return min(alive, key=lambda i: self._outstanding[i])
+
+    def submit(
+        self, method: str, *args: Any, affinity_key: Optional[str] = None,
+        on_delta: Optional[Callable[[str], None]] = None, **kwargs: Any,
+    ) -> Future:
+        if self._stop_event.is_set():
+            raise RuntimeError("ModelWorkerPool has been shut down.")
+        with self._lock:
+            worker_index = self.worker_for(affinity_key)
+            request_id = self._next_request_id
+            self._next_request_id += 1
+            call = _PendingModelCall(worker_index, on_delta)
+            self._pending[request_id] = call
+            self._outstanding[worker_index] += 1
+        self._request_queues[worker_index].put((request_id, method, args, kwargs))
+        return call.future
+
+    def call(self, method: str, *args: Any, affinity_key: Optional[str] = None, timeout: Optional[float] = None, **kwargs: Any) -> Any:
+        return self.submit(method, *args, affinity_key=affinity_key, **kwargs).result(timeout=timeout)
+
+    async def astream(self, method: str, *args: Any, affinity_key: Optional[str] = None, **kwargs: Any) -> AsyncIterator[str]:
+        """Yields the text deltas a streaming worker method emits; raises if the method fails."""
+        loop = asyncio.get_running_loop()
+        deltas: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+        future = self.submit(
+            method, *args, affinity_key=affinity_key,
+            on_delta=lambda text: loop.call_soon_threadsafe(deltas.put_nowait, text), **kwargs,
+        )
+        # Deltas and the final result arrive in order on one reader thread, so None always comes last.
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(deltas.put_nowait, None))
+        while True:
+            text = await deltas.get()
+            if text is None:
+                break
+            yield text
+        future.result()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.num_workers,
+                "alive": sum(self._alive),
+                "start_method": self.start_method,
+                "outstanding": list(self._outstanding),
+            }
+
+    def shutdown(self, timeout: float = 10.0):
+        if self._stop_event.is_set():
+            return
+        self._stop_event.set()
+        for request_queue in self._request_queues:
+            try:
+                request_queue.put(None)
+            except Exception:
+                pass
+        for process in self._processes:
+            process.join(timeout=timeout)
+            if process.is_alive():
+                process.terminate()
+        if self._reader_thread is not None:
+            self._reader_thread.join(timeout=2.0)
+        self._fail_pending(lambda call: True, RuntimeError("ModelWorkerPool shut down before the request completed."))
+        logger.info("ModelWorkerPool stopped.")
+
+    def _reader_loop(self):
+        while not self._stop_event.is_set():
+            try:
+                kind, request_id, payload = self._response_queue.get(timeout=1.0)
+            except queue.Empty:
+                self._check_workers()
+                continue
+            except (EOFError, OSError):
+                break
+            if kind == _DELTA:
+                call = self._pending.get(request_id)
+                if call is not None and call.on_delta is not None:
+                    call.on_delta(payload)
+                continue
+            with self._lock:
+                call = self._pending.pop(request_id, None)
+                if call is not None:
+                    self._outstanding[call.worker_index] -= 1
+            if call is None or call.future.done():
+                continue
+            if kind == _RESULT:
+                call.future.set_result(payload)
+            else:
+                call.future.set_exception(RuntimeError(f"Model worker {call.worker_index} failed: {payload}"))
+
+    def _check_workers(self):
+        if self._stop_event.is_set():
+            return # Workers exiting during shutdown are expected
+        for worker_index, process in enumerate(self._processes):
+            if self._alive[worker_index] and not process.is_alive():
+                self._alive[worker_index] = False
+                logger.error(f"Model worker {worker_index} exited unexpectedly (exit code {process.exitcode}).")
+                self._fail_pending(
+                    lambda call, i=worker_index: call.worker_index == i,
+                    RuntimeError(f"Model worker {worker_index} exited before the request completed."),
+                )
+
+    def _fail_pending(self, predicate: Callable[[_PendingModelCall], bool], error: Exception):
+        with self._lock:
+            failed = [(rid, call) for rid, call in self._pending.items() if predicate(call)]
+            for request_id, call in failed:
+                del self._pending[request_id]
+                self._outstanding[call.worker_index] -= 1
+        for _, call in failed:
+            if not call.future.done():
+                call.future.set_exception(error)
+
+
+model_worker_pool_instance: Optional[ModelWorkerPool] = None
+_pool_start_failed = False
+_pool_lock = threading.Lock()
+
+def get_model_worker_pool() -> Optional[ModelWorkerPool]:
+    """
+    The shared pool when MODEL_WORKERS > 0 (started on first use). None in-process, inside a worker,
+    or if the pool failed to start, in which case the services load their models in the API process.
+    """
+    global model_worker_pool_instance, _pool_start_failed
+    if settings.MODEL_WORKERS <= 0 or _in_model_worker:
+        return None
+    with _pool_lock:
+        if model_worker_pool_instance is None and not _pool_start_failed:
+            services = [s.strip() for s in settings.MODEL_WORKER_SERVICES.split(",") if s.strip()]
+            pool = ModelWorkerPool(
+                settings.MODEL_WORKERS, services=services,
+                start_method=settings.MODEL_WORKER_START_METHOD,
+                torch_threads=settings.MODEL_WORKER_TORCH_THREADS,
+                request_threads=settings.MODEL_WORKER_REQUEST_THREADS,
+            )
+            try:
+                pool.start()
+                model_worker_pool_instance = pool
+            except Exception:
+                _pool_start_failed = True
+                logger.error("ModelWorkerPool failed to start; running inference in the API process.", exc_info=True)
+                pool.shutdown()
+    return model_worker_pool_instance
+
+
+tts_worker_pool_instance: Optional[ModelWorkerPool] = None
+_tts_pool_start_failed = False
+
+def get_tts_worker_pool() -> Optional[ModelWorkerPool]:
+    """
+    Dedicated pyttsx3 worker processes when TTS_WORKERS > 0. pyttsx3 keeps one engine per process,
+    so separate processes are the only way to synthesize concurrently. Each worker handles one request at a time.
+    """
+    global tts_worker_pool_instance, _tts_pool_start_failed
+    if settings.TTS_WORKERS <= 0 or _in_model_worker:
+        return None
+    with _pool_lock:
+        if tts_worker_pool_instance is None and not _tts_pool_start_failed:
+            pool = ModelWorkerPool(
+                settings.TTS_WORKERS, services=("tts",),
+                start_method=settings.MODEL_WORKER_START_METHOD,
+                torch_threads=1, request_threads=1,
+            )
+            try:
+                pool.start()
+                tts_worker_pool_instance = pool
+            except Exception:
+                _tts_pool_start_failed = True
+                logger.error("TTS worker pool failed to start; synthesizing in the API process.", exc_info=True)
+                pool.shutdown()
+    return tts_worker_pool_instance
+
+
+def shutdown_model_worker_pool():
+    global model_worker_pool_instance, tts_worker_pool_instance
+    with _pool_lock:
+        for pool in (model_worker_pool_instance, tts_worker_pool_instance):
+            if pool is not None:
+                pool.shutdown()
+        model_worker_pool_instance = None
+        tts_worker_pool_instance = None
@@ -0,0 +1,122 @@
+# app/services/speech_pipeline.py
+import asyncio
+import re
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+from app.core.config import settings, logger
+from app.core.tracing import get_tracer
+from app.services.audio_utils import wav_duration_seconds
+from app.services.tts_service import TTSService
+
+# A sentence ends at ., ! or ? (optionally followed by closing quotes/brackets) and then whitespace.
+_SENTENCE_END_RE = re.compile(r"[.!?]+[\"')\]]*\s+")
+# Abbreviations whose trailing period must not end a sentence ("Dr. Smith", "e.g. this").
+_NON_TERMINAL_ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc", "e.g", "i.e", "approx"}
+# Abbreviations that only continue the sentence before a number ("No. 5", but "No. I can send it today.").
+_NUMBER_ABBREVIATIONS = {"no"}
+
+
+class SentenceChunker:
+    """
+    Turns a stream of text deltas into complete sentences. Sentences shorter than
+    min_chars are merged with the next one so TTS is not called for tiny fragments.
+    """
+    def __init__(self, min_chars: int = 0):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, delta: str) -> List[str]:
+        self._buffer += delta
+        sentences: List[str] = []
+        search_from = 0
+        while True:
+            match = _SENTENCE_END_RE.search(self._buffer, search_from)
+            if not match:
+                break
+            candidate = self._buffer[:match.end()].strip()
+            last_word = candidate.rstrip(".!?\"')]").rsplit(" ", 1)[-1].lower()
+            if candidate.endswith(".") and last_word in _NON_TERMINAL_ABBREVIATIONS:
+                search_from = match.end()
+                continue
+            if candidate.endswith(".") and last_word in _NUMBER_ABBREVIATIONS:
+                if match.end() == len(self._buffer):
+                    break # Depends on the next character, which has not arrived yet
+                if self._buffer[match.end()].isdigit():
+                    search_from = match.end()
+                    continue
+            if len(candidate) < self.min_chars:
+                search_from = match.end()
+                continue
+            sentences.append(candidate)
+            self._buffer = self._buffer[match.end():]
+            search_from = 0
+        return sentences
+
+    def flush(self) -> Optional[str]:
+        remaining, self._buffer = self._buffer.strip(), ""
+        return remaining or None
+
+
+async def synthesize_sentences_as_generated(
+    text_deltas: AsyncIterator[str],
+    tts_service: TTSService,
+    on_text_delta: Optional[Callable[[str], Awaitable[None]]] = None,
+) -> AsyncIterator[Tuple[str, Optional[bytes]]]:
+    """
+    Pipelines generation and speech: sentences are cut from the text stream as soon as they are
+    complete and synthesized while the LLM keeps generating. Yields (sentence, wav_bytes or None)
+    in reply order. The bounded queues between stages apply backpressure, so a slow consumer
+    stalls synthesis and a slow synthesizer stalls reading further text.
+    """
+    max_pending = max(1, settings.TTS_PIPELINE_MAX_PENDING_SENTENCES)
+    sentence_queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue(maxsize=max_pending)
+    audio_queue: "asyncio.Queue[Optional[Tuple[str, Optional[bytes]]]]" = asyncio.Queue(maxsize=max_pending)
+    stage_errors: List[BaseException] = []
+
+    async def split_stage():
+        chunker = SentenceChunker(min_chars=settings.TTS_PIPELINE_MIN_SENTENCE_CHARS)
+        try:
+            async for delta in text_deltas:
+                if on_text_delta is not None:
+                    await on_text_delta(delta)
+                for sentence in chunker.feed(delta):
+                    await sentence_queue.put(sentence)
+            tail = chunker.flush()
+            if tail:
+                await sentence_queue.put(tail)
+        except Exception as e:
+            stage_errors.append(e)
+        finally:
+            await sentence_queue.put(None)
+
+    async def synthesis_stage():
+        try:
+            while True:
+                sentence = await sentence_queue.get()
+                if sentence is None:
+                    break
+                with get_tracer().span("tts.synthesize", chars=len(sentence)) as tts_span:
+                    audio = await tts_service.asynthesize_to_wav_bytes(sentence)
+                    if audio and tts_span.recording:
+                        tts_span.set(audio_s=wav_duration_seconds(audio))
+                await audio_queue.put((sentence, audio))
+        except Exception as e:
+            stage_errors.append(e)
+        finally:
+            await audio_queue.put(None)
+
+    tasks = [asyncio.create_task(split_stage()), asyncio.create_task(synthesis_stage())]
+    try:
+        while True:
+            item = await audio_queue.get()
+            if item is None:
+                break
+            yield item
+        if stage_errors:
+            raise stage_errors[0]
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        logger.debug("Sentence TTS pipeline finished.")
@@ -0,0 +1,220 @@
+# app/services/streaming_stt.py
+import asyncio
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.admission import AdmissionRejected, get_admission_controller
+from app.core.config import settings, logger
+from app.services.audio_utils import WHISPER_SAMPLE_RATE, pcm16_bytes_to_float32
+from app.services.stt_service import STTService
+
+try:
+    import webrtcvad
+    WEBRTCVAD_AVAILABLE = True
+except ImportError:
+    webrtcvad = None
+    WEBRTCVAD_AVAILABLE = False
+
+# Streamed audio is raw little-endian PCM16 mono at Whisper's native rate, so no resampling is needed.
+STREAM_SAMPLE_RATE = WHISPER_SAMPLE_RATE
+VAD_FRAME_MS = 30 # webrtcvad accepts 10/20/30 ms frames
+_BYTES_PER_SAMPLE = 2
+
+SEGMENT_EVENT = "segment"         # A speech segment closed after a short pause; payload is its audio
+END_OF_TURN_EVENT = "end_of_turn" # Silence long enough to end the customer's turn
+
+
+class VoiceActivityDetector:
+    """Per-frame speech/non-speech decision. Uses webrtcvad when installed, an RMS energy gate otherwise."""
+    def __init__(self, aggressiveness: int = 2, energy_threshold: float = 0.01):
+        self.energy_threshold = energy_threshold
+        self._vad = webrtcvad.Vad(aggressiveness) if WEBRTCVAD_AVAILABLE else None
+
+    def is_speech(self, frame: bytes) -> bool:
+        if self._vad is not None:
+            return self._vad.is_speech(frame, STREAM_SAMPLE_RATE)
+        samples = pcm16_bytes_to_float32(frame)
+        return samples.size > 0 and float(np.sqrt(np.mean(samples * samples))) >= self.energy_threshold
+
+
+class SpeechSegmenter:
+    """
+    Splits a continuous PCM16 stream into speech segments. A pause of segment_pause_ms closes the
+    current segment (so it can be transcribed while the customer keeps talking); end_of_turn_ms of
+    silence after speech ends the turn. Bursts shorter than min_speech_ms are treated as noise.
+    """
+    def __init__(self, vad: Optional[VoiceActivityDetector] = None):
+        self.vad = vad or VoiceActivityDetector(settings.STT_VAD_AGGRESSIVENESS, settings.STT_VAD_ENERGY_THRESHOLD)
+        self.frame_bytes = STREAM_SAMPLE_RATE * VAD_FRAME_MS // 1000 * _BYTES_PER_SAMPLE
+        self.segment_pause_frames = max(1, settings.STT_VAD_SEGMENT_PAUSE_MS // VAD_FRAME_MS)
+        self.end_of_turn_frames = max(self.segment_pause_frames, settings.STT_VAD_END_OF_TURN_MS // VAD_FRAME_MS)
+        self.min_speech_frames = max(1, settings.STT_VAD_MIN_SPEECH_MS // VAD_FRAME_MS)
+        self.pre_roll_frames = max(0, settings.STT_VAD_PRE_ROLL_MS // VAD_FRAME_MS)
+        self.reset()
+
+    def reset(self):
+        self._pending = b""                 # Bytes not yet forming a whole frame
+        self._pre_roll: List[bytes] = []    # Recent silent frames, prepended when speech starts
+        self._segment: List[bytes] = []     # Frames of the open segment (speech plus trailing silence)
+        self._speech_frames = 0             # Voiced frames in the open segment
+        self._silence_run = 0               # Consecutive silent frames since the last voiced one
+        self._turn_has_speech = False       # A segment has been emitted (or is open) in this turn
+
+    @property
+    def in_segment(self) -> bool:
+        return self._speech_frames >= self.min_speech_frames
+
+    def current_segment_audio(self) -> np.ndarray:
+        return pcm16_bytes_to_float32(b"".join(self._segment))
+
+    def feed(self, pcm: bytes) -> List[Tuple[str, Optional[np.ndarray]]]:
+        events: List[Tuple[str, Optional[np.ndarray]]] = []
+        data = self._pending + pcm
+        usable = len(data) - len(data) % self.frame_bytes
+        self._pending = data[usable:]
+        for offset in range(0, usable, self.frame_bytes):
+            frame = data[offset:offset + self.frame_bytes]
+            voiced = self.vad.is_speech(frame)
+            if not self._segment:
+                if voiced:
+                    self._segment = self._pre_roll + [frame]
+                    self._pre_roll = []
+                    self._speech_frames, self._silence_run = 1, 0
+                else:
+                    self._silence_run += 1
+                    self._pre_roll = (self._pre_roll + [frame])[-self.pre_roll_frames:] if self.pre_roll_frames else []
+                    if self._turn_has_speech and self._silence_run >= self.end_of_turn_frames:
+                        events.append((END_OF_TURN_EVENT, None))
+                        self._turn_has_speech = False
+                continue
+
+            self._segment.append(frame)
+            if voiced:
+                self._speech_frames += 1
+                self._silence_run = 0
+                if self.in_segment:
+                    self._turn_has_speech = True
+                continue
+
+            self._silence_run += 1
+            if self._silence_run >= self.segment_pause_frames:
+                if self.in_segment:
+                    events.append((SEGMENT_EVENT, self.current_segment_audio()))
+                # else: a click or cough too short to be speech; drop it.
+                self._segment, self._speech_frames = [], 0
+                # _silence_run keeps counting towards end-of-turn from here.
+                if self._turn_has_speech and self._silence_run >= self.end_of_turn_frames:
+                    events.append((END_OF_TURN_EVENT, None))
+                    self._turn_has_speech = False
+        return events
+
+    def flush(self) -> Optional[np.ndarray]:
+        """Closes the open segment (if it holds real speech) and starts a fresh turn."""
+        audio = self.current_segment_audio() if self.in_segment else None
+        self.reset()
+        return audio
+
+
+class StreamingTranscriber:
+    """
+    Incremental transcription of one WebSocket caller. Every closed speech segment is transcribed in the
+    background as soon as the VAD closes it, so at end-of-turn only the last segment is still outstanding.
+    While a segment is open, a partial transcript of it is produced every STT_PARTIAL_INTERVAL_MS of new
+    audio (at most one partial in flight) and passed to on_partial together with the committed text.
+    """
+    def __init__(self, stt_service: STTService, on_partial: Optional[Callable[[str], Awaitable[None]]] = None):
+        self.stt_service = stt_service
+        self.on_partial = on_partial
+        self.segmenter = SpeechSegmenter()
+        self.partial_interval_samples = STREAM_SAMPLE_RATE * settings.STT_PARTIAL_INTERVAL_MS // 1000
+        # Timing of the last finalized turn, for its trace: end of speech, transcript ready, speech seconds.
+        self.last_turn_end_ns = 0
+        self.last_turn_transcribed_ns = 0
+        self.last_turn_audio_s = 0.0
+        self._reset_turn()
+
+    def _reset_turn(self):
+        self._segment_tasks: List["asyncio.Task[str]"] = []
+        self._partial_task: Optional["asyncio.Task[None]"] = None
+        self._samples_at_last_partial = 0
+        self._turn_audio_samples = 0
+        self._turn_generation = getattr(self, "_turn_generation", 0) + 1 # Invalidates partials of earlier turns
+
+    async def _transcribe(self, audio: np.ndarray) -> str:
+        try:
+            async with get_admission_controller().stage("stt").admit():
+                text = await run_in_threadpool(self.stt_service.transcribe_array, audio)
+        except AdmissionRejected as e:
+            logger.warning(f"[Streaming STT] Segment dropped, STT overloaded ({e.reason}).")
+            return ""
+        if text is None or text.startswith("Error"):
+            logger.warning(f"[Streaming STT] Segment transcription failed: {text}")
+            return ""
+        return text.strip()
+
+    def _committed_text(self) -> str:
+        return " ".join(t.result() for t in self._segment_tasks if t.done() and not t.cancelled() and t.result())
+
+    async def _run_partial(self, audio: np.ndarray, generation: int):
+        text = await self._transcribe(audio)
+        if generation != self._turn_generation or self.on_partial is None:
+            return # The turn was finalized meanwhile; this partial is stale.
+        combined = " ".join(part for part in (self._committed_text(), text) if part)
+        if combined:
+            await self.on_partial(combined)
+
+    def _maybe_start_partial(self):
+        if self.on_partial is None or not self.segmenter.in_segment:
+            return
+        if self._partial_task is not None and not self._partial_task.done():
+            return
+        audio = self.segmenter.current_segment_audio()
+        if audio.size - self._samples_at_last_partial < self.partial_interval_samples:
+            return
+        if not get_admission_controller().stage("stt").has_capacity():
+            return # Partials are optional; never queue them behind final transcriptions
+        self._samples_at_last_partial = audio.size
+        self._partial_task = asyncio.create_task(self._run_partial(audio, self._turn_generation))
+
+    async def feed(self, pcm: bytes) -> Optional[str]:
+        """Feeds raw PCM16 frames. Returns the final transcript when the VAD detects end-of-turn, else None."""
+        for kind, audio in self.segmenter.feed(pcm):
+            if kind == SEGMENT_EVENT:
+                self._segment_tasks.append(asyncio.create_task(self._transcribe(audio)))
+                self._turn_audio_samples += audio.size
+                self._samples_at_last_partial = 0
+            elif kind == END_OF_TURN_EVENT:
+                return await self._finalize_turn()
+        self._maybe_start_partial()
+        return None
+
+    async def finish_turn(self) -> str:
+        """Forces end-of-turn (e.g. the client signalled it stopped talking) and returns the transcript."""
+        audio = self.segmenter.flush()
+        if audio is not None:
+            self._segment_tasks.append(asyncio.create_task(self._transcribe(audio)))
+            self._turn_audio_samples += audio.size
+        return await self._finalize_turn()
+
+    async def _finalize_turn(self) -> str:
+        segment_tasks = self._segment_tasks
+        self.last_turn_end_ns = time.time_ns()
+        self.last_turn_audio_s = self._turn_audio_samples / STREAM_SAMPLE_RATE
+        self._reset_turn()
+        texts = await asyncio.gather(*segment_tasks)
+        self.last_turn_transcribed_ns = time.time_ns()
+        transcript = " ".join(t for t in texts if t)
+        logger.info(f"[Streaming STT] Turn finalized from {len(segment_tasks)} segment(s): '{transcript}'")
+        return transcript
+
+    async def aclose(self):
+        tasks = list(self._segment_tasks)
+        if self._partial_task is not None:
+            tasks.append(self._partial_task)
+        self._reset_turn()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,42 +1,228 @@
 import whisper 
 from app.core.config import settings, logger
 import os
+import queue
 import tempfile
+import threading
+import time
+from concurrent.futures import Future
 import numpy as np 
-from typing import Optional # Added for type hint
+import torch
+from typing import Any, List, Optional # Added for type hint
+
+from app.core.metrics import STT_DECODE_SECONDS, STT_TRANSCRIBE_SECONDS
+from app.services.audio_utils import decode_audio_for_whisper
+from app.services.model_worker_pool import get_model_worker_pool, take_preloaded_model
+
+def load_whisper_model(model_size: str) -> Any:
+    if settings.BACKEND_MODE == "fake":
+        from app.services.fake_backends import FakeWhisperModel
+        return FakeWhisperModel()
+    return whisper.load_model(model_size)
+
+
+# Whisper flags a window as silence when both hold (same thresholds as whisper.transcribe).
+_NO_SPEECH_THRESHOLD = 0.6
+_LOGPROB_THRESHOLD = -1.0
+
+
+class _WhisperTranscriptionRequest:
+    """One utterance waiting for a batched Whisper pass."""
+    def __init__(self, audio: np.ndarray):
+        self.audio = audio
+        self.future: Future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class WhisperBatchWorker:
+    """
+    Serves transcriptions from all calls with one background thread. Utterances queued by different
+    callers within max_wait_ms of each other are padded to Whisper's 30 s window, stacked into one
+    log-mel batch, and encoded and decoded together. Callers get a Future resolving to the text.
+    Clips longer than one window are transcribed on their own with model.transcribe.
+    """
+    def __init__(self, model: Any, max_batch_size: int = 8, max_wait_ms: float = 20.0):
+        self.model = model
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_s = max(0.0, max_wait_ms) / 1000.0
+        self.decoding_options = whisper.DecodingOptions(fp16=False, without_timestamps=True)
+
+        self._pending: "queue.Queue[Optional[_WhisperTranscriptionRequest]]" = queue.Queue()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run_loop, name="whisper-batch-worker", daemon=True)
+        self._thread.start()
+        logger.info(f"WhisperBatchWorker started (max_batch_size={self.max_batch_size}, max_wait_ms={max_wait_ms}).")
+
+    def submit(self, audio: np.ndarray) -> Future:
+        if self._stop_event.is_set():
+            raise RuntimeError("WhisperBatchWorker has been shut down.")
+        request = _WhisperTranscriptionRequest(audio.astype(np.float32, copy=False))
+        self._pending.put(request)
+        return request.future
+
+    def pending_count(self) -> int:
+        return self._pending.qsize()
+
+    def shutdown(self, timeout: float = 5.0):
+        self._stop_event.set()
+        self._pending.put(None) # Wake the loop if it is idle
+        self._thread.join(timeout=timeout)
+        error = RuntimeError("WhisperBatchWorker shut down before the request completed.")
+        while True:
+            try:
+                request = self._pending.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None and not request.future.done():
+                request.future.set_exception(error)
+
+    def _run_loop(self):
+        while not self._stop_event.is_set():
+            batch = self._collect_batch()
+            if not batch:
+                continue
+            try:
+                self._transcribe_batch(batch)
+            except Exception as e:
+                logger.error(f"WhisperBatchWorker failed a batch of {len(batch)} utterance(s).", exc_info=True)
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+
+    def _collect_batch(self) -> List[_WhisperTranscriptionRequest]:
+        # Block for the first utterance, then give others up to max_wait to join it.
+        try:
+            first = self._pending.get(timeout=0.5)
+        except queue.Empty:
+            return []
+        batch = [first] if first is not None else []
+        deadline = time.monotonic() + self.max_wait_s
+        while batch and len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._pending.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is not None:
+                batch.append(request)
+        return [request for request in batch if request.future.set_running_or_notify_cancel()]
+
+    def _transcribe_batch(self, batch: List[_WhisperTranscriptionRequest]):
+        windowed: List[_WhisperTranscriptionRequest] = []
+        for request in batch:
+            if request.audio.size == 0:
+                request.future.set_result("")
+            elif request.audio.size > whisper.audio.N_SAMPLES:
+                result = self.model.transcribe(request.audio, fp16=False)
+                request.future.set_result(result["text"].strip())
+            else:
+                windowed.append(request)
+        if not windowed:
+            return
+
+        mels = torch.stack([
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(request.audio), n_mels=self.model.dims.n_mels)
+            for request in windowed
+        ]).to(self.model.device)
+        with torch.inference_mode():
+            results = whisper.decode(self.model, mels, self.decoding_options)
+        for request, result in zip(windowed, results):
+            is_silence = result.no_speech_prob > _NO_SPEECH_THRESHOLD and result.avg_logprob < _LOGPROB_THRESHOLD
+            request.future.set_result("" if is_silence else result.text.strip())
+        logger.debug(
+            f"WhisperBatchWorker decoded {len(windowed)} utterance(s); "
+            f"oldest waited {time.monotonic() - min(r.enqueued_at for r in windowed):.3f}s."
+        )
+
 
 class STTService:
     def __init__(self):
         self.model = None
+        self.batch_worker: Optional[WhisperBatchWorker] = None
+        self.worker_pool = None # ModelWorkerPool doing the transcription when MODEL_WORKERS > 0
         try:
+            pool = get_model_worker_pool()
+            if pool is not None and pool.serves("stt"):
+                self.worker_pool = pool
+                logger.info("Whisper STT runs in the model worker pool.")
+                return
             logger.info(f"Loading Whisper STT model: {settings.WHISPER_MODEL_SIZE}")
-            self.model = whisper.load_model(settings.WHISPER_MODEL_SIZE)
+            preloaded_model = take_preloaded_model("stt") # Weights shared by the worker pool parent, if any
+            self.model = preloaded_model if preloaded_model is not None else load_whisper_model(settings.WHISPER_MODEL_SIZE)
             logger.info(f"Whisper STT Service initialized with model: {settings.WHISPER_MODEL_SIZE}.")
+            if settings.STT_BATCHING_ENABLED and settings.BACKEND_MODE != "fake": # Batches need Whisper's decoder
+                self.batch_worker = WhisperBatchWorker(
+                    self.model, max_batch_size=settings.STT_MAX_BATCH_SIZE, max_wait_ms=settings.STT_BATCH_MAX_WAIT_MS,
+                )
         except Exception as e:
             logger.error(f"Failed to initialize Whisper STTService: {e}")
             logger.error("Ensure ffmpeg is installed and in PATH. For GPU, ensure CUDA and PyTorch are correctly set up.")
             self.model = None
 
+    def is_ready(self) -> bool:
+        return self.model is not None or self.worker_pool is not None
+
+    def _call_worker_pool(self, method: str, *args: Any) -> Optional[str]:
+        try:
+            return self.worker_pool.call(method, *args) # type: ignore
+        except Exception as e:
+            logger.error(f"Error during Whisper STT transcription in model worker: {e}")
+            return f"Error during transcription: {e}"
+
     def transcribe_audio(self, audio_data: bytes) -> Optional[str]:
+        if self.worker_pool is not None:
+            with STT_TRANSCRIBE_SECONDS.time(): # Decoding happens in the worker too
+                return self._call_worker_pool("stt.transcribe_audio", audio_data)
         if not self.model:
             logger.error("Whisper STT model not available.")
             return "Error: STT service not available."
 
         logger.info(f"[Whisper STT] Transcribing audio data (length: {len(audio_data)} bytes)")
-        
+
+        # Fast path: decode WAV/PCM in memory and hand Whisper the array directly (no temp file, no ffmpeg spawn).
+        with STT_DECODE_SECONDS.time():
+            audio_array = decode_audio_for_whisper(audio_data)
+        if audio_array is None:
+            logger.debug("[Whisper STT] Audio container not decodable in memory; falling back to ffmpeg.")
+            return self._transcribe_via_ffmpeg(audio_data)
+        return self.transcribe_array(audio_array)
+
+    def transcribe_array(self, audio_array: np.ndarray) -> Optional[str]:
+        """Transcribes float32 mono 16 kHz samples."""
+        if self.worker_pool is not None:
+            with STT_TRANSCRIBE_SECONDS.time():
+                return self._call_worker_pool("stt.transcribe_array", audio_array)
+        if not self.model:
+            logger.error("Whisper STT model not available.")
+            return "Error: STT service not available."
+        if audio_array.size == 0:
+            logger.warning("[Whisper STT] Received empty audio.")
+            return ""
+        try:
+            with STT_TRANSCRIBE_SECONDS.time():
+                if self.batch_worker is not None:
+                    transcribed_text = self.batch_worker.submit(audio_array).result()
+                else:
+                    transcribed_text = self.model.transcribe(audio_array, fp16=False)["text"]
+            logger.info(f"Whisper STT Result: '{transcribed_text}'")
+            return transcribed_text.strip()
+        except Exception as e:
+            logger.error(f"Error during Whisper STT transcription: {e}")
+            return f"Error during transcription: {e}"
+
+    def _transcribe_via_ffmpeg(self, audio_data: bytes) -> Optional[str]:
         tmp_audio_file_path = None # Initialize to ensure it's defined for finally block
         try:
-            # suffix needs to indicate the audio format if Whisper relies on it.
-            # For raw bytes, ensure they are in a format Whisper expects (e.g., WAV).
+            # Whisper reads file paths through ffmpeg, which sniffs the real container format.
             with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp_audio_file: 
                 tmp_audio_file.write(audio_data)
                 tmp_audio_file_path = tmp_audio_file.name
             
             logger.debug(f"Temporary audio file for Whisper: {tmp_audio_file_path}")
-            result = self.model.transcribe(tmp_audio_file_path, fp16=False)
-            transcribed_text = result["text"]
-            logger.info(f"Whisper STT Result: '{transcribed_text}'")
-            return transcribed_text.strip()
+            with STT_DECODE_SECONDS.time():
+                audio_array = whisper.load_audio(tmp_audio_file_path) # ffmpeg -> float32 16 kHz mono
         except Exception as e:
             logger.error(f"Error during Whisper STT transcription: {e}")
             return f"Error during transcription: {e}"
@@ -47,6 +233,12 @@ class STTService:
                     logger.debug(f"Deleted temporary audio file: {tmp_audio_file_path}")
                 except Exception as e_del:
                     logger.error(f"Error deleting temporary audio file {tmp_audio_file_path}: {e_del}")
+        return self.transcribe_array(audio_array)
+
+    def shutdown(self):
+        if self.batch_worker is not None:
+            self.batch_worker.shutdown()
+            self.batch_worker = None
 
 stt_service_instance: Optional[STTService] = None
 
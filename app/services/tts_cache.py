@@ -0,0 +1,108 @@
+# app/services/tts_cache.py
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.core.config import logger
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_tts_text(text: str) -> str:
+    """Texts that sound the same map to the same key: Unicode NFC, collapsed whitespace, no outer spaces."""
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+class TTSAudioCache:
+    """
+    Content-addressed cache of synthesized WAV audio. The key is a SHA-256 of the normalized text plus
+    the voice settings, so a change of voice, rate or volume never serves stale audio. The memory tier
+    is an LRU bounded by max_bytes; with disk_dir set, entries are also written there and survive
+    restarts (disk hits are promoted back into memory).
+    """
+    def __init__(self, max_bytes: int, disk_dir: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir or None
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(text: str, voice_settings: Dict[str, Any]) -> str:
+        payload = json.dumps({"text": normalize_tts_text(text), "voice": voice_settings}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.wav") # type: ignore[arg-type]
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            audio = self._entries.get(key)
+            if audio is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return audio
+        if self.disk_dir:
+            try:
+                with open(self._disk_path(key), "rb") as f:
+                    audio = f.read()
+            except FileNotFoundError:
+                audio = None
+            except OSError as e:
+                logger.warning(f"TTSAudioCache: could not read disk entry {key}: {e}")
+                audio = None
+            if audio:
+                with self._lock:
+                    self.disk_hits += 1
+                self._put_memory(key, audio)
+                return audio
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, audio: bytes):
+        if not audio:
+            return
+        self._put_memory(key, audio)
+        if self.disk_dir and not os.path.exists(self._disk_path(key)):
+            try:
+                # Write to a temp file first so a concurrent reader never sees a half-written WAV.
+                fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix=".part")
+                with os.fdopen(fd, "wb") as f:
+                    f.write(audio)
+                os.replace(tmp_path, self._disk_path(key))
+            except OSError as e:
+                logger.warning(f"TTSAudioCache: could not write disk entry {key}: {e}")
+
+    def _put_memory(self, key: str, audio: bytes):
+        if len(audio) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= len(previous)
+            self._entries[key] = audio
+            self._total_bytes += len(audio)
+            while self._total_bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= len(evicted)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries), "bytes": self._total_bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses, "evictions": self.evictions,
+            }
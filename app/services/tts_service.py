@@ -1,19 +1,50 @@
 # app/services/tts_service.py
 import pyttsx3
-from app.core.config import logger
-from typing import Optional
+from app.core.config import settings, logger
+from app.services.model_worker_pool import get_model_worker_pool, get_tts_worker_pool, is_model_worker_process
+from app.services.tts_cache import TTSAudioCache
+from app.core.admission import AdmissionRejected, get_admission_controller
+from app.core.metrics import TTS_SYNTHESIS_SECONDS, THREADPOOL_WAIT_SECONDS, timed_call
+from fastapi.concurrency import run_in_threadpool
+from typing import Any, Dict, Iterable, Optional
+import asyncio
 import os
+import tempfile
+import threading
 
 class TTSService:
     def __init__(self):
         self.engine = None
+        self.worker_pool = None # ModelWorkerPool doing the synthesis (MODEL_WORKERS or TTS_WORKERS > 0)
+        # pyttsx3 hands out one shared engine per process, so in-process synthesis is serialized.
+        self._engine_lock = threading.Lock()
+        self._voice_settings: Optional[Dict[str, Any]] = None
+        # The API process caches audio in front of the engines; worker processes never do.
+        self.audio_cache: Optional[TTSAudioCache] = None
+        if settings.TTS_CACHE_MAX_MB > 0 and not is_model_worker_process():
+            self.audio_cache = TTSAudioCache(settings.TTS_CACHE_MAX_MB * 1024 * 1024, settings.TTS_CACHE_DIR or None)
         try:
+            pool = get_model_worker_pool()
+            if pool is None or not pool.serves("tts"):
+                pool = get_tts_worker_pool()
+            if pool is not None:
+                self.worker_pool = pool
+                logger.info(f"TTS synthesis runs in worker processes ({pool.num_workers} worker(s)).")
+                return
+            if settings.BACKEND_MODE == "fake":
+                from app.services.fake_backends import FakeTTSEngine
+                self.engine = FakeTTSEngine()
+                logger.info("TTS Service initialized with the fake engine (BACKEND_MODE=fake).")
+                return
             self.engine = pyttsx3.init()
             logger.info("TTS Service initialized with pyttsx3.")
         except Exception as e:
             logger.error(f"Failed to initialize pyttsx3 TTSService: {e}")
             self.engine = None
 
+    def is_ready(self) -> bool:
+        return self.engine is not None or self.worker_pool is not None
+
     def synthesize_speech(self, text: str) -> Optional[bytes]: # Legacy mock method
         if not self.engine:
             logger.error("pyttsx3 engine not available for TTS.")
@@ -40,17 +71,115 @@ class TTSService:
             logger.error(f"Error speaking locally with pyttsx3: {e}")
             return False
 
-    def synthesize_to_wav_bytes(self, text: str, filename: str = "temp_tts_output.wav") -> Optional[bytes]:
+    def voice_settings(self) -> Dict[str, Any]:
+        """Engine properties that change the audio; part of every cache key."""
+        if self._voice_settings is None:
+            try:
+                if self.worker_pool is not None:
+                    self._voice_settings = self.worker_pool.call("tts.voice_settings")
+                elif self.engine is not None:
+                    self._voice_settings = {
+                        "engine": "pyttsx3",
+                        "voice": self.engine.getProperty("voice"),
+                        "rate": self.engine.getProperty("rate"),
+                        "volume": self.engine.getProperty("volume"),
+                    }
+            except Exception as e:
+                logger.warning(f"Could not read TTS voice settings ({e}); caching under the engine name only.")
+                self._voice_settings = {"engine": "pyttsx3"}
+        return self._voice_settings or {"engine": "pyttsx3"}
+
+    async def avoice_settings(self) -> Dict[str, Any]:
+        """voice_settings() for the event loop: the one-time lookup (a worker round trip or engine query) runs off the loop."""
+        if self._voice_settings is None:
+            if self.worker_pool is not None:
+                try:
+                    self._voice_settings = await asyncio.wrap_future(self.worker_pool.submit("tts.voice_settings"))
+                except Exception as e:
+                    logger.warning(f"Could not read TTS voice settings ({e}); caching under the engine name only.")
+                    self._voice_settings = {"engine": "pyttsx3"}
+            else:
+                await run_in_threadpool(self.voice_settings)
+        return self.voice_settings()
+
+    def _cache_key(self, text: str) -> str:
+        return TTSAudioCache.make_key(text, self.voice_settings())
+
+    def prewarm_cache(self, phrases: Iterable[str]) -> int:
+        """Synthesizes fixed phrases ahead of time so their first use is a cache hit. Returns how many were added."""
+        if self.audio_cache is None or not self.is_ready():
+            return 0
+        added = 0
+        for phrase in phrases:
+            if self.audio_cache.get(self._cache_key(phrase)) is None and self.synthesize_to_wav_bytes(phrase):
+                added += 1
+        logger.info(f"TTS cache pre-warmed with {added} phrase(s): {self.audio_cache.stats()}")
+        return added
+
+    async def asynthesize_to_wav_bytes(self, text: str) -> Optional[bytes]:
+        """
+        Async synthesis for request handlers. At most TTS_MAX_CONCURRENCY syntheses are in flight (the
+        admission controller's "tts" stage); further callers wait in FIFO order instead of piling up on the
+        workers. When that queue is full or its deadline passes, None is returned and callers send text instead.
+        """
+        cache_key = None
+        if self.audio_cache is not None:
+            cache_key = TTSAudioCache.make_key(text, await self.avoice_settings())
+            cached_audio = self.audio_cache.get(cache_key)
+            if cached_audio is not None:
+                return cached_audio
+        try:
+            async with get_admission_controller().stage("tts").admit():
+                if self.worker_pool is not None:
+                    try:
+                        # Awaiting the worker's Future directly keeps threadpool threads free while waiting.
+                        with TTS_SYNTHESIS_SECONDS.time():
+                            audio_bytes = await asyncio.wrap_future(self.worker_pool.submit("tts.synthesize_to_wav_bytes", text))
+                    except Exception as e:
+                        logger.error(f"Error synthesizing to WAV bytes in TTS worker: {e}")
+                        return None
+                else:
+                    audio_bytes = await run_in_threadpool(
+                        timed_call(THREADPOOL_WAIT_SECONDS.labels("anyio"), self._synthesize_uncached), text
+                    )
+        except AdmissionRejected as e:
+            logger.warning(f"TTS overloaded ({e.reason}); skipping synthesis of '{text[:40]}'.")
+            return None
+        if cache_key is not None and audio_bytes:
+            self.audio_cache.put(cache_key, audio_bytes) # type: ignore[union-attr]
+        return audio_bytes
+
+    def synthesize_to_wav_bytes(self, text: str, filename: Optional[str] = None) -> Optional[bytes]:
+        if filename is not None or self.audio_cache is None: # An explicit output file always synthesizes
+            return self._synthesize_uncached(text, filename)
+        cache_key = self._cache_key(text)
+        audio_bytes = self.audio_cache.get(cache_key)
+        if audio_bytes is None:
+            audio_bytes = self._synthesize_uncached(text)
+            if audio_bytes:
+                self.audio_cache.put(cache_key, audio_bytes)
+        return audio_bytes
+
+    def _synthesize_uncached(self, text: str, filename: Optional[str] = None) -> Optional[bytes]:
+        with TTS_SYNTHESIS_SECONDS.time():
+            return self._synthesize(text, filename)
+
+    def _synthesize(self, text: str, filename: Optional[str] = None) -> Optional[bytes]:
+        if self.worker_pool is not None:
+            try:
+                return self.worker_pool.call("tts.synthesize_to_wav_bytes", text)
+            except Exception as e:
+                logger.error(f"Error synthesizing to WAV bytes in model worker: {e}")
+                return None
         if not self.engine:
             logger.error("pyttsx3 engine not available. Cannot synthesize to WAV.")
             return None
         
+        if filename is None:
+            # pyttsx3 save_to_file needs a string path; a unique one per request keeps concurrent syntheses apart.
+            fd, filename = tempfile.mkstemp(prefix="tts_", suffix=".wav")
+            os.close(fd)
         try:
-            # Ensure filename is unique enough if multiple requests happen concurrently
-            # For simplicity, we'll keep it as is, but in a production system,
-            # consider using tempfile.NamedTemporaryFile for the filename.
-            # However, pyttsx3 save_to_file needs a string path.
-            
             # Ensure any previous file with the same name is gone (important for some OS/pyttsx3 quirks)
             if os.path.exists(filename):
                 try: os.remove(filename)
@@ -58,8 +187,9 @@ class TTSService:
 
 
             logger.info(f"Synthesizing to WAV file: '{text}' -> {filename}")
-            self.engine.save_to_file(text, filename)
-            self.engine.runAndWait() 
+            with self._engine_lock:
+                self.engine.save_to_file(text, filename)
+                self.engine.runAndWait() 
 
             if os.path.exists(filename):
                 with open(filename, 'rb') as f:
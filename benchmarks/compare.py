@@ -0,0 +1,128 @@
+# benchmarks/compare.py
+"""
+Diffs two benchmark results (load_test or micro_benchmarks JSON) metric by metric and fails when the
+current run regressed beyond a threshold, so a CI job can gate on it:
+
+    python -m benchmarks.compare baseline.json current.json --max-regression-pct 15
+
+Latencies, memory and error counts are better when lower; throughputs (keys ending in _per_s or
+containing "per_second" / "rtf_inverse") are better when higher. Metrics missing from either file are listed but
+never fail the comparison.
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+# Only these parts of a result are compared; config and environment are shown as context.
+COMPARED_SECTIONS = ("summary", "latency_ms", "memory", "results")
+HIGHER_IS_BETTER_MARKERS = ("_per_s", "per_second", "rtf_inverse", "completed")
+IGNORED_SUFFIXES = ("count", "server_pid", "available", "wall_s", "calls_started")
+
+
+def flatten(data: Any, prefix: str = "") -> Dict[str, float]:
+    values: Dict[str, float] = {}
+    if isinstance(data, dict):
+        for key, value in data.items():
+            values.update(flatten(value, f"{prefix}.{key}" if prefix else str(key)))
+    elif isinstance(data, list):
+        for index, value in enumerate(data):
+            label = value.get("name") if isinstance(value, dict) and "name" in value else str(index)
+            values.update(flatten(value, f"{prefix}[{label}]"))
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        values[prefix] = float(data)
+    return values
+
+
+def compared_metrics(result: Dict[str, Any]) -> Dict[str, float]:
+    metrics: Dict[str, float] = {}
+    for section in COMPARED_SECTIONS:
+        if section in result:
+            metrics.update(flatten(result[section], section))
+    return {k: v for k, v in metrics.items() if not k.rsplit(".", 1)[-1].endswith(IGNORED_SUFFIXES)}
+
+
+def higher_is_better(metric: str) -> bool:
+    return any(marker in metric for marker in HIGHER_IS_BETTER_MARKERS)
+
+
+def regression_pct(metric: str, baseline: float, current: float) -> Optional[float]:
+    """Positive = worse than the baseline, in percent of the baseline (infinite when it was zero, e.g. errors)."""
+    if baseline == 0:
+        if current == 0:
+            return None
+        worse = current < 0 if higher_is_better(metric) else current > 0
+        return float("inf") if worse else float("-inf")
+    change = (current - baseline) / abs(baseline) * 100.0
+    return -change if higher_is_better(metric) else change
+
+
+def compare(
+    baseline: Dict[str, Any], current: Dict[str, Any], max_regression_pct: float, only: Optional[List[str]] = None,
+    min_abs_change: float = 0.0,
+) -> Tuple[List[Dict[str, Any]], List[str]]:
+    base_metrics, current_metrics = compared_metrics(baseline), compared_metrics(current)
+    rows: List[Dict[str, Any]] = []
+    failures: List[str] = []
+    for metric in sorted(set(base_metrics) | set(current_metrics)):
+        if only and not any(pattern in metric for pattern in only):
+            continue
+        base_value, current_value = base_metrics.get(metric), current_metrics.get(metric)
+        row: Dict[str, Any] = {"metric": metric, "baseline": base_value, "current": current_value, "regression_pct": None}
+        if base_value is not None and current_value is not None:
+            pct = regression_pct(metric, base_value, current_value)
+            row["regression_pct"] = None if pct is None else round(pct, 2)
+            significant = abs(current_value - base_value) >= min_abs_change
+            if pct is not None and pct > max_regression_pct and significant:
+                row["status"] = "REGRESSED"
+                failures.append(metric)
+            elif pct is not None and pct < -max_regression_pct and significant:
+                row["status"] = "improved"
+            else:
+                row["status"] = "ok"
+        else:
+            row["status"] = "missing"
+        rows.append(row)
+    return rows, failures
+
+
+def _format_value(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.4g}"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--max-regression-pct", type=float, default=10.0, help="Fail above this regression.")
+    parser.add_argument("--min-abs-change", type=float, default=0.0,
+                        help="Ignore changes smaller than this (in the metric's unit), e.g. sub-millisecond jitter.")
+    parser.add_argument("--only", action="append", help="Compare only metrics containing this text (repeatable).")
+    parser.add_argument("--json", action="store_true", help="Print the comparison as JSON.")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+    if baseline.get("config") != current.get("config"):
+        print("warning: the runs used different configurations; see 'config' in both files.", file=sys.stderr)
+    rows, failures = compare(baseline, current, args.max_regression_pct, args.only, args.min_abs_change)
+
+    if args.json:
+        print(json.dumps({"rows": rows, "regressions": failures}, indent=2))
+    else:
+        width = max([len(r["metric"]) for r in rows] + [6])
+        print(f"{'metric':<{width}}  {'baseline':>10}  {'current':>10}  {'worse %':>8}  status")
+        for row in rows:
+            pct = "-" if row["regression_pct"] is None else f"{row['regression_pct']:+.1f}"
+            print(
+                f"{row['metric']:<{width}}  {_format_value(row['baseline']):>10}  {_format_value(row['current']):>10}"
+                f"  {pct:>8}  {row['status']}"
+            )
+        print(f"\n{len(failures)} regression(s) above {args.max_regression_pct}%.")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
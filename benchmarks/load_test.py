@@ -0,0 +1,469 @@
+# benchmarks/load_test.py
+"""
+End-to-end load generator: N simulated callers run scripted calls against the API concurrently and the
+run is summarized as JSON (turn latency percentiles, time to first audio/text, throughput, server memory
+per call). Compare two result files with `python -m benchmarks.compare`.
+
+Modes (how each customer turn is sent):
+    http         POST /respond with the turn's text
+    http-stream  POST /respond/{call_id}/stream (SSE); also measures time to first text
+    http-audio   POST /respond-audio with the turn's WAV fixture
+    ws           WebSocket, one WAV message per turn; measures time to first audio
+    ws-stream    WebSocket, the fixture streamed as 20 ms PCM16 frames and closed with END_OF_TURN
+
+Examples:
+    python -m benchmarks.load_test --base-url http://127.0.0.1:8000 --mode ws --callers 8 --out ws.json
+    python -m benchmarks.load_test --spawn-server --server-env MODEL_WORKERS=2 --mode http --callers 16
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+import wave
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+try:
+    import websockets
+    WEBSOCKETS_AVAILABLE = True
+except ImportError:
+    websockets = None
+    WEBSOCKETS_AVAILABLE = False
+
+API_PREFIX = "/api/v1/sales"
+SCENARIO_DIR = os.path.join(os.path.dirname(__file__), "scenarios")
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+MODES = ("http", "http-stream", "http-audio", "ws", "ws-stream")
+AUDIO_MODES = ("http-audio", "ws", "ws-stream")
+RESULT_FORMAT_VERSION = 1
+STREAM_FRAME_MS = 20
+
+
+class Scenario:
+    """A scripted call: the customer's details and their lines, each with an optional WAV fixture."""
+    def __init__(self, path: str, fixture_dir: str):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        self.path = path
+        self.name: str = data.get("name", os.path.splitext(os.path.basename(path))[0])
+        self.customer: Dict[str, str] = data["customer"]
+        self.turns: List[Dict[str, str]] = data["turns"]
+        self.fixture_dir = fixture_dir
+        self._audio: Dict[str, bytes] = {}
+
+    def load_audio(self):
+        """Reads every fixture once up front, so callers never touch the disk while measuring."""
+        missing = [t["audio"] for t in self.turns if not os.path.exists(os.path.join(self.fixture_dir, t["audio"]))]
+        if missing:
+            raise FileNotFoundError(
+                f"Missing WAV fixtures in {self.fixture_dir}: {', '.join(missing)}. "
+                f"Record them with: python -m benchmarks.make_fixtures --scenario {self.path}"
+            )
+        for turn in self.turns:
+            with open(os.path.join(self.fixture_dir, turn["audio"]), "rb") as f:
+                self._audio[turn["audio"]] = f.read()
+
+    def audio(self, turn: Dict[str, str]) -> bytes:
+        return self._audio[turn["audio"]]
+
+
+def wav_to_pcm16_frames(wav_bytes: bytes, frame_ms: int = STREAM_FRAME_MS) -> List[bytes]:
+    """Splits a 16 kHz mono PCM16 WAV (as written by make_fixtures) into raw frames for the streamed mode."""
+    with wave.open(io.BytesIO(wav_bytes), "rb") as reader:
+        if (reader.getnchannels(), reader.getsampwidth(), reader.getframerate()) != (1, 2, 16000):
+            raise ValueError("ws-stream fixtures must be 16 kHz mono PCM16 WAV (see benchmarks.make_fixtures).")
+        pcm = reader.readframes(reader.getnframes())
+    frame_bytes = 16000 * 2 * frame_ms // 1000
+    return [pcm[i:i + frame_bytes] for i in range(0, len(pcm), frame_bytes)]
+
+
+class Recorder:
+    """Collects latency samples (ms) per metric and outcome counters for the whole run."""
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Counter = Counter()
+        self.counts: Counter = Counter()
+
+    def observe(self, metric: str, seconds: float):
+        self.samples.setdefault(metric, []).append(seconds * 1000.0)
+
+    def error(self, kind: str):
+        self.errors[kind] += 1
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Linear interpolation between closest ranks (numpy's default)."""
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    position = (len(sorted_values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 2),
+        "p50": round(percentile(ordered, 0.50), 2),
+        "p95": round(percentile(ordered, 0.95), 2),
+        "p99": round(percentile(ordered, 0.99), 2),
+        "max": round(ordered[-1], 2),
+    }
+
+
+class RssSampler:
+    """Samples the server's resident memory from /proc (Linux) while the run is in progress."""
+    def __init__(self, pid: Optional[int], interval_s: float = 0.1):
+        self.pid = pid
+        self.interval_s = interval_s
+        self.baseline_kb: Optional[int] = self.read_kb()
+        self.peak_kb = self.baseline_kb
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def read_kb(self) -> Optional[int]:
+        if self.pid is None:
+            return None
+        try:
+            with open(f"/proc/{self.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1])
+        except OSError:
+            return None
+        return None
+
+    async def _run(self):
+        while True:
+            rss = self.read_kb()
+            if rss is not None and (self.peak_kb is None or rss > self.peak_kb):
+                self.peak_kb = rss
+            await asyncio.sleep(self.interval_s)
+
+    def start(self):
+        if self.baseline_kb is not None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def report(self, concurrent_calls: int) -> Dict[str, Any]:
+        if self.baseline_kb is None or self.peak_kb is None:
+            return {"server_pid": self.pid, "available": False}
+        growth_mb = (self.peak_kb - self.baseline_kb) / 1024.0
+        return {
+            "server_pid": self.pid,
+            "available": True,
+            "baseline_rss_mb": round(self.baseline_kb / 1024.0, 1),
+            "peak_rss_mb": round(self.peak_kb / 1024.0, 1),
+            "per_call_mb": round(growth_mb / max(1, concurrent_calls), 3),
+        }
+
+
+class LoadTest:
+    def __init__(self, args: argparse.Namespace, scenario: Scenario, client: httpx.AsyncClient):
+        self.args = args
+        self.scenario = scenario
+        self.client = client
+        self.recorder = Recorder()
+        self.ws_base = args.base_url.replace("https://", "wss://").replace("http://", "ws://").rstrip("/")
+        self.turns_per_call = min(args.turns or len(scenario.turns), len(scenario.turns))
+
+    # --- One simulated call ---
+    async def run_call(self, caller_index: int):
+        recorder = self.recorder
+        started = time.perf_counter()
+        try:
+            response = await self.client.post(f"{API_PREFIX}/start-call", json={
+                "customer_name": f"{self.scenario.customer['name']} {caller_index}",
+                "phone_number": self.scenario.customer["phone_number"],
+            })
+        except httpx.HTTPError as e:
+            recorder.error(f"start_call_{type(e).__name__}")
+            return
+        if response.status_code != 201:
+            recorder.error(f"start_call_http_{response.status_code}")
+            return
+        recorder.observe("start_call", time.perf_counter() - started)
+        recorder.counts["calls_started"] += 1
+        call_id = response.json()["call_id"]
+        try:
+            if self.args.mode.startswith("ws"):
+                completed = await self._run_ws_call(call_id)
+            else:
+                completed = await self._run_http_call(call_id)
+        except Exception as e:
+            recorder.error(f"call_{type(e).__name__}")
+            completed = False
+        if completed:
+            recorder.counts["calls_completed"] += 1
+
+    async def _think(self):
+        if self.args.think_ms > 0:
+            await asyncio.sleep(self.args.think_ms / 1000.0)
+
+    async def _run_http_call(self, call_id: str) -> bool:
+        for turn in self.scenario.turns[:self.turns_per_call]:
+            await self._think()
+            started = time.perf_counter()
+            if self.args.mode == "http":
+                response = await self.client.post(f"{API_PREFIX}/respond/{call_id}", json={"message": turn["text"]})
+                result = response.json() if response.status_code == 200 else None
+            elif self.args.mode == "http-audio":
+                response = await self.client.post(
+                    f"{API_PREFIX}/respond-audio/{call_id}",
+                    files={"audio_file": (turn["audio"], self.scenario.audio(turn), "audio/wav")},
+                )
+                result = response.json() if response.status_code == 200 else None
+            else:
+                response, result = await self._stream_http_turn(call_id, turn["text"], started)
+            if response.status_code != 200 or result is None:
+                self.recorder.error(f"turn_http_{response.status_code}")
+                self.recorder.counts["turns_failed"] += 1
+                return False
+            self.recorder.observe("turn", time.perf_counter() - started)
+            self.recorder.counts["turns_completed"] += 1
+            if result.get("should_end_call"):
+                break
+        return True
+
+    async def _stream_http_turn(self, call_id: str, text: str, started: float) -> Tuple[httpx.Response, Optional[Dict[str, Any]]]:
+        result = None
+        async with self.client.stream("POST", f"{API_PREFIX}/respond/{call_id}/stream", json={"message": text}) as response:
+            if response.status_code != 200:
+                await response.aread()
+                return response, None
+            event = None
+            first_text_seen = False
+            async for line in response.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                elif line.startswith("data: "):
+                    if event == "delta" and not first_text_seen:
+                        first_text_seen = True
+                        self.recorder.observe("time_to_first_text", time.perf_counter() - started)
+                    elif event == "done":
+                        result = json.loads(line[len("data: "):])
+        return response, result
+
+    async def _run_ws_call(self, call_id: str) -> bool:
+        connect_started = time.perf_counter()
+        async with websockets.connect( # type: ignore[union-attr]
+            f"{self.ws_base}{API_PREFIX}/ws/voice-chat/{call_id}", max_size=None, open_timeout=self.args.timeout_s
+        ) as ws:
+            greeting = await asyncio.wait_for(ws.recv(), self.args.timeout_s) # Agent's first message (audio or text)
+            if isinstance(greeting, str) and json.loads(greeting).get("type") == "error":
+                self.recorder.error("ws_connect_error")
+                return False
+            self.recorder.observe("greeting", time.perf_counter() - connect_started)
+            for turn in self.scenario.turns[:self.turns_per_call]:
+                await self._think()
+                audio = self.scenario.audio(turn)
+                if self.args.mode == "ws":
+                    await ws.send(audio)
+                else:
+                    for frame in wav_to_pcm16_frames(audio):
+                        await ws.send(frame)
+                        if self.args.realtime:
+                            await asyncio.sleep(STREAM_FRAME_MS / 1000.0)
+                    await ws.send("END_OF_TURN")
+                outcome = await asyncio.wait_for(self._receive_ws_turn(ws, time.perf_counter()), self.args.timeout_s)
+                if outcome is None:
+                    self.recorder.counts["turns_failed"] += 1
+                    return False
+                if outcome:
+                    break
+        return True
+
+    async def _receive_ws_turn(self, ws: Any, sent_at: float) -> Optional[bool]:
+        """Reads one reply up to agent_turn_end. Returns call_ended, or None if the turn failed."""
+        first_audio_seen = first_text_seen = failed = False
+        while True:
+            message = await ws.recv()
+            now = time.perf_counter()
+            if isinstance(message, bytes):
+                if not first_audio_seen:
+                    first_audio_seen = True
+                    self.recorder.observe("time_to_first_audio", now - sent_at)
+                continue
+            data = json.loads(message)
+            kind = data.get("type")
+            if kind == "agent_text_delta" and not first_text_seen:
+                first_text_seen = True
+                self.recorder.observe("time_to_first_text", now - sent_at)
+            elif kind == "user_text":
+                self.recorder.observe("transcript", now - sent_at)
+            elif kind in ("error", "busy"):
+                self.recorder.error(f"ws_{kind}")
+                failed = True
+            elif kind == "agent_turn_end":
+                if failed:
+                    return None
+                self.recorder.observe("turn", now - sent_at)
+                self.recorder.counts["turns_completed"] += 1
+                return bool(data.get("call_ended"))
+
+    # --- The whole run ---
+    async def run(self, server_pid: Optional[int]) -> Dict[str, Any]:
+        args = self.args
+        sampler = RssSampler(server_pid)
+        sampler.start()
+        queue: "asyncio.Queue[int]" = asyncio.Queue()
+        for index in range(args.calls or args.callers):
+            queue.put_nowait(index)
+
+        async def caller(slot: int):
+            if args.ramp_s > 0:
+                await asyncio.sleep(args.ramp_s * slot / args.callers)
+            while not queue.empty():
+                await self.run_call(queue.get_nowait())
+
+        started = time.perf_counter()
+        await asyncio.gather(*(caller(slot) for slot in range(args.callers)))
+        wall_s = time.perf_counter() - started
+        await sampler.stop()
+
+        counts = self.recorder.counts
+        return {
+            "format_version": RESULT_FORMAT_VERSION,
+            "label": args.label,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "config": {
+                "mode": args.mode, "callers": args.callers, "calls": args.calls or args.callers,
+                "turns_per_call": self.turns_per_call, "ramp_s": args.ramp_s, "think_ms": args.think_ms,
+                "realtime": args.realtime, "scenario": self.scenario.name, "base_url": args.base_url,
+                "server_env": args.server_env,
+            },
+            "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count()},
+            "summary": {
+                "wall_s": round(wall_s, 3),
+                "calls_started": counts["calls_started"],
+                "calls_completed": counts["calls_completed"],
+                "turns_completed": counts["turns_completed"],
+                "turns_failed": counts["turns_failed"],
+                "errors": sum(self.recorder.errors.values()),
+                "turns_per_s": round(counts["turns_completed"] / wall_s, 3) if wall_s > 0 else 0.0,
+                "calls_per_s": round(counts["calls_completed"] / wall_s, 3) if wall_s > 0 else 0.0,
+            },
+            "latency_ms": {name: summarize(values) for name, values in sorted(self.recorder.samples.items())},
+            "errors": dict(self.recorder.errors),
+            "memory": sampler.report(args.callers),
+        }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _wait_for_health(client: httpx.AsyncClient, process: Optional[subprocess.Popen], timeout_s: float):
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Server exited during startup (code {process.returncode}).")
+        try:
+            response = await client.get("/health")
+            if response.status_code == 200 and response.json().get("status") == "ok":
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.5)
+    raise TimeoutError(f"Server was not healthy within {timeout_s}s.")
+
+
+def spawn_server(port: int, env_overrides: List[str]) -> subprocess.Popen:
+    """Starts one uvicorn process for the app with the given KEY=VALUE settings (env vars beat .env)."""
+    env = dict(os.environ)
+    for item in env_overrides:
+        key, _, value = item.partition("=")
+        env[key] = value
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+
+
+async def main_async(args: argparse.Namespace) -> Dict[str, Any]:
+    scenario = Scenario(args.scenario, args.fixtures)
+    if args.mode in AUDIO_MODES:
+        scenario.load_audio()
+    if args.mode.startswith("ws") and not WEBSOCKETS_AVAILABLE:
+        raise RuntimeError("The websockets package is required for the ws modes.")
+
+    process = None
+    server_pid = args.server_pid
+    if args.spawn_server:
+        args.base_url = f"http://127.0.0.1:{_free_port()}"
+        process = spawn_server(int(args.base_url.rsplit(":", 1)[1]), args.server_env)
+        server_pid = process.pid
+    limits = httpx.Limits(max_connections=args.callers * 2, max_keepalive_connections=args.callers * 2)
+    try:
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout_s, limits=limits) as client:
+            await _wait_for_health(client, process, args.startup_timeout_s)
+            return await LoadTest(args, scenario, client).run(server_pid)
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="Running server to test.")
+    parser.add_argument("--spawn-server", action="store_true", help="Start a uvicorn server on a free port for the run.")
+    parser.add_argument("--server-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Setting for the spawned server (repeatable), e.g. LLM_MAX_BATCH_SIZE=8.")
+    parser.add_argument("--server-pid", type=int, help="PID of an external server, for memory per call.")
+    parser.add_argument("--mode", choices=MODES, default="http")
+    parser.add_argument("--callers", type=int, default=4, help="Concurrent callers.")
+    parser.add_argument("--calls", type=int, default=0, help="Total calls (default: one per caller).")
+    parser.add_argument("--turns", type=int, default=0, help="Customer turns per call (default: the whole scenario).")
+    parser.add_argument("--ramp-s", type=float, default=0.0, help="Spread the callers' first calls over this many seconds.")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="Pause before each customer turn.")
+    parser.add_argument("--realtime", action="store_true", help="ws-stream: send frames at real-time pace.")
+    parser.add_argument("--scenario", default=os.path.join(SCENARIO_DIR, "sales_call.json"))
+    parser.add_argument("--fixtures", default=FIXTURE_DIR)
+    parser.add_argument("--timeout-s", type=float, default=120.0, help="Per request / per turn timeout.")
+    parser.add_argument("--startup-timeout-s", type=float, default=600.0, help="Wait for /health (model loading).")
+    parser.add_argument("--label", default="", help="Free-form name stored in the result.")
+    parser.add_argument("--out", help="Write the JSON result here (default: stdout).")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    result = asyncio.run(main_async(args))
+    text = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    turn = result["latency_ms"].get("turn")
+    summary = result["summary"]
+    print(
+        f"[{args.mode}] {summary['turns_completed']} turns in {summary['wall_s']}s ({summary['turns_per_s']}/s), "
+        + (f"turn p50 {turn['p50']} ms / p95 {turn['p95']} ms, " if turn else "")
+        + f"{summary['errors']} error(s)", file=sys.stderr,
+    )
+    return 0 if summary["turns_completed"] > 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
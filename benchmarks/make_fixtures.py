@@ -0,0 +1,72 @@
+# benchmarks/make_fixtures.py
+"""
+Records the WAV fixtures of a scenario: every customer line is spoken by the app's own TTS engine
+(pyttsx3) and stored as 16 kHz mono PCM16, the format the streamed WebSocket mode sends.
+
+    python -m benchmarks.make_fixtures --scenario benchmarks/scenarios/sales_call.json
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import wave
+
+import numpy as np
+
+SCENARIO_DIR = os.path.join(os.path.dirname(__file__), "scenarios")
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def pcm16_wav(samples: np.ndarray, sample_rate: int = 16000) -> bytes:
+    """Float samples in [-1, 1] as a mono PCM16 WAV."""
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as writer:
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(sample_rate)
+        writer.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def to_pcm16_wav(audio_bytes: bytes) -> bytes:
+    from app.services.audio_utils import WHISPER_SAMPLE_RATE, decode_audio_for_whisper
+    samples = decode_audio_for_whisper(audio_bytes)
+    if samples is None:
+        raise ValueError("TTS output is not a WAV this project can decode.")
+    return pcm16_wav(samples, WHISPER_SAMPLE_RATE)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", default=os.path.join(SCENARIO_DIR, "sales_call.json"))
+    parser.add_argument("--out-dir", default=FIXTURE_DIR)
+    parser.add_argument("--force", action="store_true", help="Re-record fixtures that already exist.")
+    args = parser.parse_args(argv)
+
+    from app.services.tts_service import get_tts_service
+    tts = get_tts_service()
+    if tts is None or not tts.is_ready():
+        print("TTS engine (pyttsx3) is not available; cannot record fixtures.", file=sys.stderr)
+        return 1
+    with open(args.scenario, encoding="utf-8") as f:
+        scenario = json.load(f)
+    os.makedirs(args.out_dir, exist_ok=True)
+    for turn in scenario["turns"]:
+        path = os.path.join(args.out_dir, turn["audio"])
+        if os.path.exists(path) and not args.force:
+            print(f"exists   {path}")
+            continue
+        audio = tts.synthesize_to_wav_bytes(turn["text"])
+        if not audio:
+            print(f"FAILED   {path}: synthesis returned nothing", file=sys.stderr)
+            return 1
+        with open(path, "wb") as f:
+            f.write(to_pcm16_wav(audio))
+        print(f"recorded {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
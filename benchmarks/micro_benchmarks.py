@@ -0,0 +1,313 @@
+# benchmarks/micro_benchmarks.py
+"""
+Component micro-benchmarks, run in-process against the models this configuration loads:
+
+    llm     LocalQwenLLM's model: prefill tokens/s per prompt length, decode tokens/s per batch size
+    stt     STTService.transcribe_audio: real-time factor per clip length (clips cut from the WAV fixtures)
+    tts     TTSService.synthesize_to_wav_bytes: characters/s and audio seconds/s per text length (cache bypassed)
+    prompt  format_lc_messages_to_qwen_prompt_string per history size
+
+--threads sweeps torch.set_num_threads over the llm and stt suites, to pick the thread count of a node type.
+Every measurement is one entry of "results"; keep a run as the baseline and diff later runs against it:
+
+    python -m benchmarks.micro_benchmarks --threads 1,2,4,8 --out baselines/micro-c6i.2xlarge.json
+    python -m benchmarks.compare baselines/micro-c6i.2xlarge.json current.json --max-regression-pct 10
+
+Model worker processes are disabled here (MODEL_WORKERS=0, TTS_WORKERS=0): this measures the components, not IPC.
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+os.environ["MODEL_WORKERS"] = "0"
+os.environ["TTS_WORKERS"] = "0"
+
+import numpy as np
+
+SUITES = ("llm", "stt", "tts", "prompt")
+RESULT_FORMAT_VERSION = 1
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+TTS_TEXT = (
+    "Thanks for taking the time to talk with me today. Our bootcamp runs for twelve weeks and is fully online, "
+    "so you can learn around your job. You will build real projects with language models, computer vision and "
+    "MLOps, and our team helps you with job placement once you finish. Right now the course is available at a "
+    "special price, and I would be happy to send you the full syllabus by email so you can take a closer look."
+)
+HISTORY_LINES = (
+    ("human", "How long does the course take, and can I do it while working full time?"),
+    ("ai", "It runs for twelve weeks and most students spend about eight hours a week on it, so yes, many work full time."),
+)
+
+
+def measure(fn: Callable[[], Any], repeat: int, warmup: int) -> Dict[str, float]:
+    """Runs fn warmup + repeat times. fn may return the seconds to count (e.g. decode only) instead of its wall time."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        measured = fn()
+        samples.append(measured if isinstance(measured, float) else time.perf_counter() - started)
+    return {"seconds_median": statistics.median(samples), "seconds_min": min(samples)}
+
+
+def _entry(name: str, timing: Dict[str, float], **rates: float) -> Dict[str, Any]:
+    entry: Dict[str, Any] = {"name": name}
+    entry.update({key: float(f"{value:.6g}") for key, value in {**timing, **rates}.items()})
+    return entry
+
+
+def _parse_ints(text: str) -> List[int]:
+    return [int(v) for v in text.split(",") if v.strip()]
+
+
+def _parse_floats(text: str) -> List[float]:
+    return [float(v) for v in text.split(",") if v.strip()]
+
+
+# --- LLM ---
+def bench_llm(llm: Any, args: argparse.Namespace, threads: int) -> List[Dict[str, Any]]:
+    import torch
+    model = llm.model
+    history_ids = llm.encode(" ".join(text for _, text in HISTORY_LINES))
+    def prompt_ids(length: int) -> List[int]:
+        return (llm.system_prefix_ids + history_ids * (length // max(1, len(history_ids)) + 1))[:length]
+
+    results = []
+    for length in args.prompt_tokens:
+        input_ids = torch.tensor([prompt_ids(length)], dtype=torch.long, device=model.device)
+        def prefill():
+            with torch.no_grad():
+                model(input_ids=input_ids, use_cache=True)
+        timing = measure(prefill, args.repeat, args.warmup)
+        results.append(_entry(
+            f"llm.prefill/tokens={length}/threads={threads}", timing,
+            tokens_per_second=length / timing["seconds_median"],
+        ))
+
+    context = torch.tensor([prompt_ids(args.decode_context_tokens)], dtype=torch.long, device=model.device)
+    for batch_size in args.batch_sizes:
+        batch = context.repeat(batch_size, 1)
+        def decode() -> float:
+            # Greedy steps over a KV-cache, always decode_tokens of them (no EOS), timed without the prefill.
+            with torch.no_grad():
+                outputs = model(input_ids=batch, use_cache=True)
+                started = time.perf_counter()
+                for _ in range(args.decode_tokens):
+                    next_ids = outputs.logits[:, -1, :].argmax(dim=-1, keepdim=True)
+                    outputs = model(input_ids=next_ids, past_key_values=outputs.past_key_values, use_cache=True)
+                return time.perf_counter() - started
+        timing = measure(decode, args.repeat, args.warmup)
+        tokens = batch_size * args.decode_tokens
+        results.append(_entry(
+            f"llm.decode/batch={batch_size}/threads={threads}", timing,
+            tokens_per_second=tokens / timing["seconds_median"],
+            sequence_tokens_per_second=args.decode_tokens / timing["seconds_median"],
+        ))
+    return results
+
+
+# --- STT ---
+def load_speech(fixture_dir: str) -> Optional[np.ndarray]:
+    """All WAV fixtures decoded to 16 kHz and joined, the material the clips are cut from."""
+    from app.services.audio_utils import decode_audio_for_whisper
+    pieces = []
+    for path in sorted(glob.glob(os.path.join(fixture_dir, "*.wav"))):
+        with open(path, "rb") as f:
+            samples = decode_audio_for_whisper(f.read())
+        if samples is not None and samples.size:
+            pieces.append(samples)
+    return np.concatenate(pieces) if pieces else None
+
+
+def bench_stt(stt: Any, speech: np.ndarray, args: argparse.Namespace, threads: int) -> List[Dict[str, Any]]:
+    from benchmarks.make_fixtures import pcm16_wav
+    results = []
+    for clip_s in args.clip_seconds:
+        samples = np.resize(speech, int(clip_s * 16000)) # Repeats the fixtures up to the clip length
+        clip = pcm16_wav(samples) # Includes in-memory decoding and, with STT_BATCHING_ENABLED, the batch window
+        timing = measure(lambda: stt.transcribe_audio(clip), args.repeat, args.warmup)
+        results.append(_entry(
+            f"stt.transcribe/audio_s={clip_s:g}/threads={threads}", timing,
+            real_time_factor=timing["seconds_median"] / clip_s,
+        ))
+    return results
+
+
+# --- TTS ---
+def bench_tts(tts: Any, args: argparse.Namespace) -> List[Dict[str, Any]]:
+    from app.services.audio_utils import wav_duration_seconds
+    results = []
+    for chars in args.tts_chars:
+        text = " ".join([TTS_TEXT] * (chars // len(TTS_TEXT) + 1))[:chars + 1].rsplit(" ", 1)[0] # Ends on a whole word
+        fd, path = tempfile.mkstemp(prefix="bench_tts_", suffix=".wav")
+        os.close(fd)
+        audio: Dict[str, Optional[bytes]] = {}
+        def synthesize():
+            audio["wav"] = tts.synthesize_to_wav_bytes(text, filename=path) # An explicit file skips the cache
+        try:
+            timing = measure(synthesize, args.repeat, args.warmup)
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+        audio_s = wav_duration_seconds(audio.get("wav") or b"") or 0.0
+        results.append(_entry(
+            f"tts.synthesize/chars={chars}", timing,
+            chars_per_second=len(text) / timing["seconds_median"],
+            audio_seconds_per_second=audio_s / timing["seconds_median"],
+        ))
+    return results
+
+
+# --- Prompt formatting ---
+def bench_prompt(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+    from app.prompts.sales_prompts import QWEN_SYSTEM_PROMPT_CONTENT, format_lc_messages_to_qwen_prompt_string
+    results = []
+    for size in args.history_sizes:
+        messages = [SystemMessage(content=QWEN_SYSTEM_PROMPT_CONTENT)]
+        for index in range(size):
+            kind, text = HISTORY_LINES[index % len(HISTORY_LINES)]
+            messages.append(HumanMessage(content=text) if kind == "human" else AIMessage(content=text))
+        messages.append(HumanMessage(content="What does it cost?"))
+        # One call takes microseconds, so each sample times a loop of about 50 ms and reports the per-call time.
+        started = time.perf_counter()
+        format_lc_messages_to_qwen_prompt_string(messages)
+        loops = max(1, int(0.05 / max(time.perf_counter() - started, 1e-7)))
+        def run_loop() -> float:
+            started = time.perf_counter()
+            for _ in range(loops):
+                format_lc_messages_to_qwen_prompt_string(messages)
+            return (time.perf_counter() - started) / loops
+        timing = measure(run_loop, args.repeat, args.warmup)
+        results.append(_entry(
+            f"prompt.format/history={size}", timing, calls_per_second=1.0 / timing["seconds_median"],
+        ))
+    return results
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    from app.core.config import settings
+    import torch
+    default_threads = torch.get_num_threads()
+    thread_counts = args.threads or [default_threads]
+    results: List[Dict[str, Any]] = []
+    skipped: Dict[str, str] = {}
+
+    llm = stt = speech = None
+    if "llm" in args.suites:
+        from app.services.llm_service import get_llm_service
+        service = get_llm_service()
+        llm = service.get_langchain_llm_instance() if service and service.is_ready() else None
+        if llm is None or settings.BACKEND_MODE == "fake":
+            skipped["llm"] = "the Qwen model is not loaded (BACKEND_MODE=fake or loading failed)"
+            llm = None
+    if "stt" in args.suites:
+        from app.services.stt_service import get_stt_service
+        stt = get_stt_service()
+        speech = load_speech(args.fixtures)
+        if stt is None or not stt.is_ready():
+            skipped["stt"] = "the Whisper model is not loaded"
+            stt = None
+        elif speech is None:
+            skipped["stt"] = f"no WAV fixtures in {args.fixtures}; record them with python -m benchmarks.make_fixtures"
+            stt = None
+
+    try:
+        for threads in thread_counts:
+            torch.set_num_threads(threads)
+            if llm is not None:
+                results.extend(bench_llm(llm, args, threads))
+            if stt is not None:
+                results.extend(bench_stt(stt, speech, args, threads))
+    finally:
+        torch.set_num_threads(default_threads)
+        if stt is not None:
+            stt.shutdown()
+    if "tts" in args.suites:
+        from app.services.tts_service import get_tts_service
+        tts = get_tts_service()
+        if tts is None or not tts.is_ready():
+            skipped["tts"] = "the TTS engine (pyttsx3) is not available"
+        else:
+            results.extend(bench_tts(tts, args))
+    if "prompt" in args.suites:
+        results.extend(bench_prompt(args))
+
+    return {
+        "format_version": RESULT_FORMAT_VERSION,
+        "label": args.label,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "suites": args.suites, "threads": thread_counts, "repeat": args.repeat, "warmup": args.warmup,
+            "prompt_tokens": args.prompt_tokens, "batch_sizes": args.batch_sizes, "decode_tokens": args.decode_tokens,
+            "decode_context_tokens": args.decode_context_tokens, "clip_seconds": args.clip_seconds,
+            "tts_chars": args.tts_chars, "history_sizes": args.history_sizes,
+        },
+        "environment": {
+            "python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count(),
+            "torch": torch.__version__, "torch_default_threads": default_threads, "backend_mode": settings.BACKEND_MODE,
+            "llm_model": settings.LLM_MODEL_REPO_ID, "whisper_model": settings.WHISPER_MODEL_SIZE,
+        },
+        "results": results,
+        "skipped": skipped,
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suites", default=",".join(SUITES), help=f"Comma-separated subset of {', '.join(SUITES)}.")
+    parser.add_argument("--threads", default="", help="torch thread counts to sweep, e.g. 1,2,4,8 (default: torch's).")
+    parser.add_argument("--repeat", type=int, default=5, help="Measured runs per case; the median is reported.")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured runs before each case.")
+    parser.add_argument("--prompt-tokens", default="128,512,1024", help="Prompt lengths for the prefill cases.")
+    parser.add_argument("--batch-sizes", default="1,2,4,8", help="Batch sizes for the decode cases.")
+    parser.add_argument("--decode-tokens", type=int, default=32, help="Decode steps per decode case.")
+    parser.add_argument("--decode-context-tokens", type=int, default=512, help="Prompt length before decoding.")
+    parser.add_argument("--clip-seconds", default="2,5,15,30", help="Clip lengths for the STT cases.")
+    parser.add_argument("--tts-chars", default="40,160,400", help="Text lengths for the TTS cases.")
+    parser.add_argument("--history-sizes", default="0,8,32,128", help="History messages for the prompt cases.")
+    parser.add_argument("--fixtures", default=FIXTURE_DIR, help="WAV fixtures the STT clips are cut from.")
+    parser.add_argument("--label", default="", help="Free-form name stored in the result, e.g. the node type.")
+    parser.add_argument("--out", help="Write the JSON result here (default: stdout).")
+    args = parser.parse_args(argv)
+    args.suites = [s.strip() for s in args.suites.split(",") if s.strip()]
+    unknown = set(args.suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suite(s): {', '.join(sorted(unknown))}")
+    args.threads = _parse_ints(args.threads)
+    args.prompt_tokens = _parse_ints(args.prompt_tokens)
+    args.batch_sizes = _parse_ints(args.batch_sizes)
+    args.clip_seconds = _parse_floats(args.clip_seconds)
+    args.tts_chars = _parse_ints(args.tts_chars)
+    args.history_sizes = _parse_ints(args.history_sizes)
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    result = run(args)
+    text = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    for entry in result["results"]:
+        rates = ", ".join(f"{k} {v:g}" for k, v in entry.items() if k not in ("name", "seconds_min"))
+        print(f"{entry['name']:<40} {rates}", file=sys.stderr)
+    for suite, reason in result["skipped"].items():
+        print(f"skipped {suite}: {reason}", file=sys.stderr)
+    return 0 if result["results"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+# tests/conftest.py
+"""
+The suite runs the API on the deterministic fake backends (BACKEND_MODE=fake): no model weights, and
+every fake latency scaled to zero. The environment is set here, before anything imports app.core.config.
+"""
+import os
+
+os.environ.update(
+    BACKEND_MODE="fake",
+    FAKE_LATENCY_SCALE="0",
+    LOG_LEVEL="WARNING",
+    SESSION_STORE_BACKEND="memory",
+    GREETING_MODE="template",
+    GREETING_TEMPLATE_CACHE_PATH="",
+    TRACING_ENABLED="false",
+    MODEL_WORKERS="0",
+    TTS_WORKERS="0",
+)
+
+import pytest
+from fastapi.testclient import TestClient
+
+API_PREFIX = "/api/v1/sales"
+
+
+@pytest.fixture(scope="session")
+def client():
+    """One app (with its lifespan: services, greeting templates, TTS prewarm) shared by the API tests."""
+    from app.main import app
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def admission():
+    """A fresh AdmissionController per test, so gate state set by one test never leaks into the next."""
+    from app.core import admission as admission_module
+    admission_module.admission_controller_instance = admission_module.AdmissionController()
+    yield admission_module.admission_controller_instance
+    admission_module.admission_controller_instance = None
+
+
+@pytest.fixture
+def start_call(client: TestClient):
+    """Starts a call through /start-call and returns its call_id."""
+    def start(customer_name: str = "Priya") -> str:
+        response = client.post(f"{API_PREFIX}/start-call", json={"customer_name": customer_name, "phone_number": "555-0100"})
+        assert response.status_code == 201, response.text
+        return response.json()["call_id"]
+    return start
@@ -0,0 +1,33 @@
+# tests/test_admission.py
+from tests.conftest import API_PREFIX
+
+
+def test_turns_beyond_the_per_call_cap_get_429(client, start_call, admission):
+    call_id = start_call()
+    admission._turns_per_call[call_id] = admission.max_turns_per_call # The call already has its turns in flight
+
+    for path in (f"/respond/{call_id}", f"/respond/{call_id}/stream"):
+        response = client.post(f"{API_PREFIX}{path}", json={"message": "Hello?"})
+        assert response.status_code == 429, path
+        assert response.headers["Retry-After"] == "1"
+    assert admission.rejected_call_turns == 2
+    assert admission._turns_per_call[call_id] == admission.max_turns_per_call # Rejections hold nothing
+
+    del admission._turns_per_call[call_id]
+    assert client.post(f"{API_PREFIX}/respond/{call_id}", json={"message": "Hello?"}).status_code == 200
+
+
+def test_full_llm_stage_sheds_turns_and_new_calls_with_503(client, start_call, admission):
+    call_id = start_call()
+    gate = admission.stage("llm")
+    gate.in_flight, gate.max_queue = gate.max_concurrency, 0 # Every slot busy, no room to queue
+
+    response = client.post(f"{API_PREFIX}/respond/{call_id}", json={"message": "Hello?"})
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+    assert admission.stats()["calls_with_turns_in_flight"] == 0 # The per-call count taken before the gate is returned
+
+    response = client.post(f"{API_PREFIX}/start-call", json={"customer_name": "Sam", "phone_number": "555-0199"})
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+    assert gate.rejected_full == 1 and admission.rejected_new_calls == 1
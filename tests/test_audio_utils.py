@@ -0,0 +1,30 @@
+# tests/test_audio_utils.py
+import numpy as np
+import pytest
+
+from app.services.audio_utils import WHISPER_SAMPLE_RATE, resample_audio
+
+
+def _tone(frequency: float, sample_rate: int, seconds: float = 1.0) -> np.ndarray:
+    t = np.arange(int(sample_rate * seconds)) / sample_rate
+    return (0.5 * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+
+def _rms(samples: np.ndarray) -> float:
+    middle = samples[1000:-1000] # Away from the filter's edge effects
+    return float(np.sqrt(np.mean(middle ** 2)))
+
+
+@pytest.mark.parametrize("sample_rate", [44100, 22050, 48000, 8000])
+def test_resample_keeps_speech_band_tones_in_place(sample_rate):
+    resampled = resample_audio(_tone(440.0, sample_rate), sample_rate)
+    expected = _tone(440.0, WHISPER_SAMPLE_RATE)
+    assert resampled.dtype == np.float32 and resampled.size == WHISPER_SAMPLE_RATE
+    assert np.abs(resampled[1000:-1000] - expected[1000:-1000]).max() < 0.01
+
+
+@pytest.mark.parametrize("sample_rate", [44100, 22050, 48000])
+def test_resample_filters_content_above_the_new_nyquist(sample_rate):
+    # 10 kHz would alias to 6 kHz without a low-pass filter.
+    resampled = resample_audio(_tone(10000.0, sample_rate), sample_rate)
+    assert _rms(resampled) < 0.01 * _rms(_tone(10000.0, sample_rate))
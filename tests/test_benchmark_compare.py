@@ -0,0 +1,65 @@
+# tests/test_benchmark_compare.py
+import json
+import math
+
+from benchmarks.compare import compare, compared_metrics, main, regression_pct
+
+
+def _result(turn_p50: float, turns_per_s: float, errors: int = 0):
+    return {
+        "config": {"mode": "http", "callers": 8},
+        "summary": {"turns_per_s": turns_per_s, "errors": errors, "wall_s": 3.0},
+        "latency_ms": {"turn": {"p50": turn_p50, "count": 48}},
+    }
+
+
+def test_regression_pct_direction():
+    assert regression_pct("latency_ms.turn.p50", 100.0, 120.0) == 20.0 # Slower is worse
+    assert regression_pct("latency_ms.turn.p50", 100.0, 80.0) == -20.0
+    assert regression_pct("summary.turns_per_s", 10.0, 8.0) == 20.0 # Less throughput is worse
+    assert regression_pct("summary.turns_per_s", 10.0, 12.0) == -20.0
+
+
+def test_regression_pct_from_a_zero_baseline():
+    assert regression_pct("summary.errors", 0.0, 0.0) is None
+    assert regression_pct("summary.errors", 0.0, 3.0) == math.inf
+    assert regression_pct("summary.turns_per_s", 0.0, 5.0) == -math.inf
+
+
+def test_compared_metrics_skip_counts_and_context():
+    metrics = compared_metrics(_result(100.0, 10.0))
+    assert set(metrics) == {"summary.turns_per_s", "summary.errors", "latency_ms.turn.p50"}
+
+
+def test_compare_flags_only_significant_regressions():
+    rows, failures = compare(_result(100.0, 10.0), _result(130.0, 10.5), max_regression_pct=10.0)
+    statuses = {row["metric"]: row["status"] for row in rows}
+    assert failures == ["latency_ms.turn.p50"]
+    assert statuses == {"latency_ms.turn.p50": "REGRESSED", "summary.errors": "ok", "summary.turns_per_s": "ok"}
+
+    _, failures = compare(_result(100.0, 10.0), _result(130.0, 10.0), max_regression_pct=10.0, min_abs_change=50.0)
+    assert failures == [] # 30 ms is below the absolute threshold
+
+    rows, failures = compare(_result(100.0, 10.0), _result(130.0, 10.0, errors=2), max_regression_pct=10.0, only=["errors"])
+    assert [row["metric"] for row in rows] == ["summary.errors"] and failures == ["summary.errors"]
+
+
+def test_compare_lists_missing_metrics_without_failing():
+    current = _result(100.0, 10.0)
+    current["latency_ms"]["time_to_first_text"] = {"p50": 40.0}
+    rows, failures = compare(_result(100.0, 10.0), current, max_regression_pct=10.0)
+    assert failures == []
+    assert {"metric": "latency_ms.time_to_first_text.p50", "baseline": None, "current": 40.0,
+            "regression_pct": None, "status": "missing"} in rows
+
+
+def test_main_exit_code_gates_on_regressions(tmp_path, capsys):
+    baseline, current = tmp_path / "baseline.json", tmp_path / "current.json"
+    baseline.write_text(json.dumps(_result(100.0, 10.0)))
+    current.write_text(json.dumps(_result(105.0, 10.0)))
+    assert main([str(baseline), str(current), "--max-regression-pct", "10"]) == 0
+    assert "0 regression(s) above 10.0%." in capsys.readouterr().out
+
+    current.write_text(json.dumps(_result(150.0, 10.0)))
+    assert main([str(baseline), str(current), "--max-regression-pct", "10", "--json"]) == 1
+    assert json.loads(capsys.readouterr().out)["regressions"] == ["latency_ms.turn.p50"]
@@ -0,0 +1,130 @@
+# tests/test_call_api.py
+import asyncio
+import json
+from typing import Any, Dict, List, Tuple
+
+from app.services.fake_backends import tone_wav
+from tests.conftest import API_PREFIX
+
+
+def _sse_events(response: Any) -> List[Tuple[str, Dict[str, Any]]]:
+    events, event = [], None
+    for line in response.iter_lines():
+        if line.startswith("event: "):
+            event = line[len("event: "):]
+        elif line.startswith("data: "):
+            events.append((event, json.loads(line[len("data: "):])))
+    return events
+
+
+def test_start_call_greets_by_name_deterministically(client):
+    first = client.post(f"{API_PREFIX}/start-call", json={"customer_name": "Jordan", "phone_number": "555-0101"}).json()
+    second = client.post(f"{API_PREFIX}/start-call", json={"customer_name": "Jordan", "phone_number": "555-0102"}).json()
+    assert first["call_id"] != second["call_id"]
+    assert "Jordan" in first["first_message"]
+    assert first["first_message"] == second["first_message"]
+
+
+def test_respond_records_the_turn(client, start_call):
+    call_id = start_call()
+    response = client.post(f"{API_PREFIX}/respond/{call_id}", json={"message": "How much does the course cost?"})
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["reply"].strip() and body["should_end_call"] is False
+
+    history = client.get(f"{API_PREFIX}/conversation/{call_id}").json()
+    assert [u["speaker"] for u in history["history"]] == ["agent", "customer", "agent"]
+    assert history["history"][1]["text"] == "How much does the course cost?"
+    assert history["history"][2]["text"] == body["reply"]
+    assert history["is_active"] is True
+    # Prompt bookkeeping cached on utterances stays internal.
+    assert all(set(u) == {"speaker", "text", "timestamp"} for u in history["history"])
+
+
+def test_respond_stream_sends_deltas_then_done(client, start_call, admission):
+    call_id = start_call()
+    with client.stream("POST", f"{API_PREFIX}/respond/{call_id}/stream", json={"message": "Tell me more."}) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = _sse_events(response)
+
+    kinds = [kind for kind, _ in events]
+    assert kinds[-1] == "done" and kinds[:-1] and set(kinds[:-1]) == {"delta"}
+    streamed = "".join(data["text"] for _, data in events[:-1]).strip()
+    assert streamed == events[-1][1]["reply"]
+    history = client.get(f"{API_PREFIX}/conversation/{call_id}").json()["history"]
+    assert history[-1]["text"] == streamed
+    # The turn's admission (LLM slot and per-call count) is released once the stream ends.
+    assert admission.stage("llm").in_flight == 0
+    assert admission.stats()["calls_with_turns_in_flight"] == 0
+
+
+def test_respond_stream_unknown_call_is_404(client):
+    response = client.post(f"{API_PREFIX}/respond/no-such-call/stream", json={"message": "Hello?"})
+    assert response.status_code == 404
+
+
+def test_websocket_turn_flow(client, start_call):
+    call_id = start_call()
+    with client.websocket_connect(f"{API_PREFIX}/ws/voice-chat/{call_id}") as websocket:
+        greeting = websocket.receive()
+        assert greeting.get("bytes", b"")[:4] == b"RIFF" # Greeting audio, stitched from the template cache
+
+        websocket.send_bytes(tone_wav(1.0))
+        messages, audio_clips = [], 0
+        while True:
+            message = websocket.receive()
+            if message.get("bytes") is not None:
+                audio_clips += 1
+                continue
+            payload = json.loads(message["text"])
+            messages.append(payload)
+            if payload["type"] in ("agent_turn_end", "error"):
+                break
+
+    kinds = [m["type"] for m in messages]
+    assert kinds[0] == "user_text" and messages[0]["text"]
+    assert "agent_text_delta" in kinds
+    assert messages[-1] == {"type": "agent_turn_end", "call_ended": False}
+    assert audio_clips >= 1
+
+    history = client.get(f"{API_PREFIX}/conversation/{call_id}").json()["history"]
+    assert [u["speaker"] for u in history] == ["agent", "customer", "agent"]
+    assert history[1]["text"] == messages[0]["text"]
+    reply = "".join(m["text"] for m in messages if m["type"] == "agent_text_delta").strip()
+    assert history[2]["text"] == reply
+
+
+def test_websocket_unknown_call_reports_error(client):
+    with client.websocket_connect(f"{API_PREFIX}/ws/voice-chat/no-such-call") as websocket:
+        payload = websocket.receive_json()
+    assert payload["type"] == "error"
+
+
+def test_respond_stream_releases_admission_when_client_leaves_before_the_body(start_call, admission):
+    from app.api.v1.endpoints.call_router import respond_to_call_stream
+    from app.core.conversation_manager import get_conversation_manager
+    from app.models.call_models import RespondRequest
+    from starlette.requests import ClientDisconnect
+
+    call_id = start_call()
+
+    async def disconnect_before_body():
+        response = await respond_to_call_stream(call_id, RespondRequest(message="Hello?"), get_conversation_manager())
+        assert admission.stats()["calls_with_turns_in_flight"] == 1 # Admitted before the stream starts
+
+        async def send(message):
+            raise OSError("client went away")
+
+        async def receive():
+            return {"type": "http.disconnect"}
+
+        try:
+            await response({"type": "http", "asgi": {"spec_version": "2.4"}}, receive, send)
+        except ClientDisconnect:
+            pass
+        # Checked while the loop runs: asyncio.run() would finalize a leaked admission on exit.
+        assert admission.stage("llm").in_flight == 0
+        assert admission.stats()["calls_with_turns_in_flight"] == 0
+
+    asyncio.run(disconnect_before_body())
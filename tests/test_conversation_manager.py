@@ -0,0 +1,22 @@
+# tests/test_conversation_manager.py
+from app.core.conversation_manager import get_conversation_manager
+
+
+def test_sync_turn_passes_prompt_ids_as_generation_kwargs(client, monkeypatch):
+    manager = get_conversation_manager()
+    llm = manager.llm_service.get_langchain_llm_instance()
+    seen = {}
+    original = type(llm)._generate_raw_qwen_response
+
+    def recording(self, prompt, max_new_tokens, cache_key=None, input_ids=None, **kwargs):
+        seen.update(cache_key=cache_key, input_ids=input_ids)
+        return original(self, prompt, max_new_tokens, cache_key=cache_key, input_ids=input_ids, **kwargs)
+
+    monkeypatch.setattr(type(llm), "_generate_raw_qwen_response", recording)
+    call_id, _ = manager.start_new_call("Priya", "555-0100")
+    reply, ended = manager.process_customer_response(call_id, "How long is the course?")
+
+    assert reply and not ended
+    session = manager.get_conversation_history(call_id)
+    assert seen["cache_key"] == session.kv_cache_key
+    assert isinstance(seen["input_ids"], list) and seen["input_ids"] # The prompt the call's CallPromptCache assembled
@@ -0,0 +1,35 @@
+# tests/test_greeting_cache.py
+import asyncio
+
+from app.services.greeting_cache import GREETING_NAME_PLACEHOLDER, GreetingTemplateCache
+
+
+class _RecordingTTS:
+    def __init__(self):
+        self.texts = []
+
+    async def asynthesize_to_wav_bytes(self, text):
+        self.texts.append(text)
+        return None # Makes asynthesize_greeting give up after recording what it would have stitched
+
+
+def _cache(*templates):
+    cache = GreetingTemplateCache(pool_size=len(templates))
+    cache.templates = list(templates)
+    return cache
+
+
+def test_greeting_audio_is_stitched_from_the_matching_template():
+    cache = _cache(f"Hi {GREETING_NAME_PLACEHOLDER}, this is Alex. Got a minute?")
+    tts = _RecordingTTS()
+    asyncio.run(cache.asynthesize_greeting(0, "Priya", "Hi Priya, this is Alex. Got a minute?", tts))
+    assert tts.texts == ["Hi", "Priya", ", this is Alex. Got a minute?"]
+
+
+def test_greeting_audio_is_not_stitched_from_a_different_pool():
+    # E.g. a call recovered after a restart that generated new templates: same index, different text.
+    cache = _cache(f"Hello {GREETING_NAME_PLACEHOLDER}, Alex here from Edvantage AI.")
+    tts = _RecordingTTS()
+    audio = asyncio.run(cache.asynthesize_greeting(0, "Priya", "Hi Priya, this is Alex. Got a minute?", tts))
+    assert audio is None and tts.texts == []
+    assert asyncio.run(cache.asynthesize_greeting(3, "Priya", "Hi Priya", tts)) is None
@@ -0,0 +1,123 @@
+# tests/test_session_store.py
+import threading
+import time
+
+from app.core.session_store import SQLiteSessionStore
+from app.schemas.conversation import CallSession
+
+
+def _store(path, **kwargs) -> SQLiteSessionStore:
+    options = dict(idle_ttl_s=600, ended_ttl_s=600, max_sessions=100, sweep_interval_s=0)
+    options.update(kwargs)
+    return SQLiteSessionStore(str(path), **options)
+
+
+def _session(call_id: str, turns: int = 2) -> CallSession:
+    session = CallSession(call_id=call_id, customer_name="Priya", phone_number="555-0100", kv_cache_key=call_id)
+    session.add_utterance(speaker="agent", text="Hi Priya, this is Alex.")
+    for turn in range(turns):
+        session.add_utterance(speaker="customer", text=f"Question {turn}?")
+        session.add_utterance(speaker="agent", text=f"Answer {turn}.")
+    return session
+
+
+def test_sessions_survive_a_restart(tmp_path):
+    path = tmp_path / "sessions.db"
+    store = _store(path)
+    live = _session("live")
+    live.history_summary, live.summary_upto = "Asked about the price.", 3
+    store.put(live)
+    live.add_utterance(speaker="customer", text="One more thing.") # Only the new utterance is queued
+    store.put(live)
+    ended = _session("ended", turns=0)
+    ended.is_active = False
+    store.put(ended)
+    store.shutdown()
+
+    reopened = _store(path)
+    try:
+        assert reopened.recovered == 1 # Active calls come back into the hot cache
+        restored = reopened.get("live")
+        assert [(u.speaker, u.text) for u in restored.history] == [(u.speaker, u.text) for u in live.history]
+        assert (restored.history_summary, restored.summary_upto) == ("Asked about the price.", 3)
+        assert restored.is_active and restored.customer_name == "Priya"
+        assert reopened.get("ended").is_active is False # Read from disk on a hot-cache miss
+        assert reopened.get("missing") is None
+        assert len(reopened) == 2
+    finally:
+        reopened.shutdown()
+
+
+def test_delete_removes_the_call_from_disk(tmp_path):
+    path = tmp_path / "sessions.db"
+    store = _store(path)
+    store.put(_session("gone"))
+    store.delete("gone")
+    store.shutdown()
+
+    reopened = _store(path)
+    try:
+        assert reopened.get("gone") is None and len(reopened) == 0
+    finally:
+        reopened.shutdown()
+
+
+def test_miss_waits_only_for_the_calls_own_queued_write(tmp_path):
+    store = _store(tmp_path / "sessions.db", max_sessions=1, flush_interval_s=0.5)
+    try:
+        store.put(_session("first"))
+        store.put(_session("second")) # Pushes "first" out of the hot cache before the writer commits it
+
+        started = time.perf_counter()
+        assert store.get("unrelated") is None
+        assert time.perf_counter() - started < 0.25 # Nothing queued for this call: no wait on the writer
+
+        restored = store.get("first") # Waits for its own snapshot, then reads it back
+        assert restored is not None and len(restored.history) == 5
+    finally:
+        store.shutdown()
+
+
+def test_concurrent_puts_give_each_snapshot_its_own_version(tmp_path):
+    store = _store(tmp_path / "sessions.db")
+    session = _session("busy")
+    threads, puts_per_thread = 8, 50
+
+    def put_many():
+        for _ in range(puts_per_thread):
+            store.put(session)
+
+    workers = [threading.Thread(target=put_many) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    try:
+        store.flush()
+        assert store._stored_version("busy") == threads * puts_per_thread
+        assert store.stats()["write_errors"] == 0
+    finally:
+        store.shutdown()
+
+
+def test_turn_lease_orders_a_calls_turns_across_processes(tmp_path):
+    path = tmp_path / "sessions.db"
+    first, second = _store(path, shared=True), _store(path, shared=True) # Two workers on one database
+    try:
+        first.put(_session("shared"))
+        assert first.claim_turn("shared", "worker-0", lease_s=60)
+        assert not second.claim_turn("shared", "worker-1", lease_s=60) # Held by the other worker
+        assert second.claim_turn("other", "worker-1", lease_s=60) # Leases are per call
+        second.release_turn("shared", "worker-1") # Not the owner: no effect
+        assert not second.claim_turn("shared", "worker-1", lease_s=60)
+        first.release_turn("shared", "worker-0")
+        assert second.claim_turn("shared", "worker-1", lease_s=0.05)
+
+        time.sleep(0.1) # The owner died without releasing: its lease runs out
+        assert first.claim_turn("shared", "worker-0", lease_s=60)
+        first.delete("shared")
+        first.flush()
+        assert second.claim_turn("shared", "worker-1", lease_s=60) # Deleting the call drops its lease
+    finally:
+        first.shutdown()
+        second.shutdown()
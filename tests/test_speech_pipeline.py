@@ -0,0 +1,25 @@
+# tests/test_speech_pipeline.py
+from app.services.speech_pipeline import SentenceChunker
+
+
+def _split(deltas):
+    chunker = SentenceChunker()
+    sentences = [sentence for delta in deltas for sentence in chunker.feed(delta)]
+    tail = chunker.flush()
+    return sentences + ([tail] if tail else [])
+
+
+def test_no_ends_a_sentence_unless_a_number_follows():
+    assert _split(["No. I can send it today. "]) == ["No.", "I can send it today."]
+    assert _split(["It is module No. 5 of the course. Any questions?"]) == [
+        "It is module No. 5 of the course.", "Any questions?",
+    ]
+    assert _split(["Dr. Smith teaches it. "]) == ["Dr. Smith teaches it."]
+
+
+def test_no_waits_for_the_next_delta_before_splitting():
+    chunker = SentenceChunker()
+    assert chunker.feed("Module No. ") == [] # "5" or a new sentence may follow
+    assert chunker.feed("5 covers agents. ") == ["Module No. 5 covers agents."]
+    assert chunker.feed("No. ") == []
+    assert chunker.feed("That one is free. ") == ["No.", "That one is free."]
@@ -187,8 +187,15 @@ async def voice_chat_client():
                         elif isinstance(message, str):
                             try:
                                 data = json.loads(message)
-                                logger.info(f"Received JSON from server: {data}")
                                 msg_type = data.get("type")
+                                if msg_type == "agent_text_delta":
+                                    # Reply text streamed while the server is still generating; audio follows.
+                                    print(data.get("text", ""), end="", flush=True)
+                                    continue
+                                if msg_type == "user_text_partial":
+                                    print(f"\r(hearing) {data.get('text', '')}", end="", flush=True)
+                                    continue
+                                logger.info(f"Received JSON from server: {data}")
                                 if msg_type == "user_text":
                                     # Displaying the user's name here would require passing user_name_for_call
                                     # into this scope or fetching it from a shared context if needed.